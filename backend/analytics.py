@@ -0,0 +1,423 @@
+"""
+Circulation analytics answered from daily rollups.
+
+Scanning `loans` for every report grows with the length of the history.
+Instead, four rollup tables (models/analytics.py) keep one row per day and
+book, genre, member or loan duration. A report reads only the days in its
+period.
+
+Rollups are updated incrementally. Every loan change is turned into the
+difference between the loan's contribution before and after it:
+- issuing counts towards the IssueDate
+- returning counts towards the ReturnDate, with the loan's duration
+
+The differences are applied as upserts in the same transaction as the loan
+write:
+- ORM writes (create, update, delete, batch, and the unlinking of loans
+  when a book or member is deleted) are picked up by mapper events on Loan
+  and applied once per flush, one statement per rollup
+- circulation.return_loan, which returns with a Core UPDATE, calls
+  record_change itself
+
+Loans written around the ORM (the benchmark seed, the sqlite shell) are not
+seen. Rebuild the rollups in bulk from `loans` after such writes:
+
+    cd backend
+    python -m analytics --rebuild
+
+A loan counts towards the genre of its book when the change is recorded,
+while a rebuild uses the books' current genres.
+"""
+import argparse
+from dataclasses import dataclass
+from functools import lru_cache
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, delete, event, func, insert, inspect, literal, select, text, union_all, update
+from sqlalchemy.orm import Session, object_session
+from models.analytics import LoanDayBook, LoanDayDuration, LoanDayGenre, LoanDayMember
+from models.book import Book
+from models.loan import Loan
+
+ROLLUP_MODELS = (LoanDayBook, LoanDayGenre, LoanDayMember, LoanDayDuration)
+# Counter columns of each rollup, added to on conflict
+COUNTERS = {
+    LoanDayBook: ("Issued",),
+    LoanDayGenre: ("Issued", "Returned", "LoanDays"),
+    LoanDayMember: ("Issued",),
+    LoanDayDuration: ("Returned",),
+}
+# Genre key for books without a genre and loans without a book
+NO_GENRE = ""
+
+# (rollup model, primary key values) -> {counter: increment}
+Deltas = Dict[Tuple[type, tuple], Dict[str, int]]
+
+
+@dataclass(frozen=True)
+class LoanState:
+    IssueDate: Optional[date]
+    ReturnDate: Optional[date]
+    BookID: Optional[int]
+    MemberID: Optional[int]
+    Genre: str
+
+
+def _add(deltas: Deltas, model, key: tuple, sign: int, **counters):
+    entry = deltas.setdefault((model, key), {})
+    for name, value in counters.items():
+        entry[name] = entry.get(name, 0) + sign * value
+
+
+def loan_deltas(old: Optional[LoanState], new: Optional[LoanState]) -> Deltas:
+    """Rollup increments turning `old`'s contribution into `new`'s (None: no loan)"""
+    deltas: Deltas = {}
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        if state.IssueDate is not None:
+            _add(deltas, LoanDayGenre, (state.IssueDate, state.Genre), sign, Issued=1)
+            if state.BookID is not None:
+                _add(deltas, LoanDayBook, (state.IssueDate, state.BookID), sign, Issued=1)
+            if state.MemberID is not None:
+                _add(deltas, LoanDayMember, (state.IssueDate, state.MemberID), sign, Issued=1)
+        if state.ReturnDate is not None:
+            days = (state.ReturnDate - state.IssueDate).days if state.IssueDate is not None else None
+            _add(deltas, LoanDayGenre, (state.ReturnDate, state.Genre), sign, Returned=1, LoanDays=days or 0)
+            if days is not None:
+                _add(deltas, LoanDayDuration, (state.ReturnDate, days), sign, Returned=1)
+    return {
+        target: counters for target, counters in deltas.items()
+        if any(counters.values())
+    }
+
+
+@lru_cache(maxsize=None)
+def _upsert_statement(model):
+    # INSERT ... ON CONFLICT DO UPDATE, valid on both SQLite and PostgreSQL. Written as text
+    # because SQLAlchemy's on_conflict_do_update() constructs have no cache key and would be
+    # compiled again on every loan write.
+    table = model.__table__
+    keys = [f'"{column.name}"' for column in table.primary_key.columns]
+    columns = [f'"{column.name}"' for column in table.columns]
+    additions = ", ".join(f'"{name}" = {table.name}."{name}" + excluded."{name}"' for name in COUNTERS[model])
+    statement = text(
+        f"INSERT INTO {table.name} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(':' + column.name for column in table.columns)}) "
+        f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {additions}"
+    )
+    return statement.bindparams(*(bindparam(column.name, type_=column.type) for column in table.columns))
+
+
+def _upsert(connection, model, rows: List[dict]):
+    if connection.dialect.name in ("sqlite", "postgresql"):
+        connection.execute(_upsert_statement(model), rows)
+        return
+    keys = [column.name for column in model.__table__.primary_key.columns]
+    for row in rows:
+        updated = connection.execute(
+            update(model)
+            .where(*(getattr(model, key) == row[key] for key in keys))
+            .values({name: getattr(model, name) + row[name] for name in COUNTERS[model]})
+        )
+        if updated.rowcount == 0:
+            connection.execute(insert(model), row)
+
+
+def apply_deltas(connection, deltas: Deltas):
+    rows_by_model: Dict[type, List[dict]] = {}
+    for (model, key), counters in deltas.items():
+        names = [column.name for column in model.__table__.primary_key.columns]
+        row = dict(zip(names, key))
+        row.update({name: counters.get(name, 0) for name in COUNTERS[model]})
+        rows_by_model.setdefault(model, []).append(row)
+    for model, rows in rows_by_model.items():
+        _upsert(connection, model, rows)
+
+
+def book_genre(connection, book_id: Optional[int], book: Optional[Book] = None) -> str:
+    if book_id is None:
+        return NO_GENRE
+    if book is not None and book.BookID == book_id:
+        return book.Genre or NO_GENRE
+    genre = connection.execute(select(Book.Genre).where(Book.BookID == book_id)).scalar()
+    return genre or NO_GENRE
+
+
+def loan_state(connection, issue_date, return_date, book_id, member_id, book: Optional[Book] = None) -> LoanState:
+    return LoanState(issue_date, return_date, book_id, member_id, book_genre(connection, book_id, book))
+
+
+def record_change(connection, old: Optional[LoanState], new: Optional[LoanState]):
+    """Apply one loan change to the rollups, inside the caller's transaction"""
+    deltas = loan_deltas(old, new)
+    if deltas:
+        apply_deltas(connection, deltas)
+
+
+# --- Mapper events: every ORM insert, update and delete of a Loan ---
+
+LOAN_STATE_COLUMNS = ("IssueDate", "ReturnDate", "BookID", "MemberID")
+
+
+def _current(connection, loan: Loan) -> LoanState:
+    # Checkouts attach the loaded book, which saves the genre lookup
+    return loan_state(connection, *(getattr(loan, name) for name in LOAN_STATE_COLUMNS), loan.__dict__.get("book"))
+
+
+def _previous(connection, loan: Loan) -> LoanState:
+    attributes = inspect(loan).attrs
+    values = []
+    for name in LOAN_STATE_COLUMNS:
+        history = attributes[name].history
+        values.append(history.deleted[0] if history.deleted else getattr(loan, name))
+    return loan_state(connection, *values)
+
+
+# A flush that writes several loans (a batch checkout, /api/batch) collects their
+# deltas in the session and applies them in one statement per rollup after the flush
+PENDING_DELTAS = "loan_rollup_deltas"
+
+
+def _queue(loan: Loan, old: Optional[LoanState], new: Optional[LoanState]):
+    pending = object_session(loan).info.setdefault(PENDING_DELTAS, {})
+    for target, counters in loan_deltas(old, new).items():
+        entry = pending.setdefault(target, {})
+        for name, value in counters.items():
+            entry[name] = entry.get(name, 0) + value
+
+
+@event.listens_for(Loan, "after_insert")
+def _loan_inserted(mapper, connection, loan):
+    _queue(loan, None, _current(connection, loan))
+
+
+@event.listens_for(Loan, "after_update")
+def _loan_updated(mapper, connection, loan):
+    attributes = inspect(loan).attrs
+    if any(attributes[name].history.has_changes() for name in LOAN_STATE_COLUMNS):
+        _queue(loan, _previous(connection, loan), _current(connection, loan))
+
+
+@event.listens_for(Loan, "after_delete")
+def _loan_deleted(mapper, connection, loan):
+    _queue(loan, _previous(connection, loan), None)
+
+
+@event.listens_for(Session, "before_flush")
+def _reset_pending(session, flush_context, instances):
+    # Drops what a failed flush left behind
+    session.info.pop(PENDING_DELTAS, None)
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_pending(session, flush_context):
+    pending = session.info.pop(PENDING_DELTAS, None)
+    if pending:
+        deltas = {target: counters for target, counters in pending.items() if any(counters.values())}
+        if deltas:
+            apply_deltas(session.connection(), deltas)
+
+
+# --- Bulk rebuild ---
+
+def _days_between(dialect: str, end, start):
+    if dialect == "postgresql":
+        return end - start
+    return func.cast(func.julianday(end) - func.julianday(start), LoanDayDuration.Days.type)
+
+
+def rebuild_rollups(connection):
+    """Recompute every rollup from `loans` (and the books' current genres), inside the caller's transaction"""
+    days = _days_between(connection.dialect.name, Loan.ReturnDate, Loan.IssueDate)
+    genre = func.coalesce(Book.Genre, NO_GENRE)
+    for model in ROLLUP_MODELS:
+        connection.execute(delete(model))
+
+    connection.execute(insert(LoanDayBook).from_select(
+        ["Day", "BookID", "Issued"],
+        select(Loan.IssueDate, Loan.BookID, func.count())
+        .where(Loan.IssueDate.isnot(None), Loan.BookID.isnot(None))
+        .group_by(Loan.IssueDate, Loan.BookID),
+    ))
+    connection.execute(insert(LoanDayMember).from_select(
+        ["Day", "MemberID", "Issued"],
+        select(Loan.IssueDate, Loan.MemberID, func.count())
+        .where(Loan.IssueDate.isnot(None), Loan.MemberID.isnot(None))
+        .group_by(Loan.IssueDate, Loan.MemberID),
+    ))
+    connection.execute(insert(LoanDayDuration).from_select(
+        ["Day", "Days", "Returned"],
+        select(Loan.ReturnDate, days, func.count())
+        .where(Loan.ReturnDate.isnot(None), Loan.IssueDate.isnot(None))
+        .group_by(Loan.ReturnDate, days),
+    ))
+    events = union_all(
+        select(
+            Loan.IssueDate.label("Day"), genre.label("Genre"),
+            literal(1).label("Issued"), literal(0).label("Returned"), literal(0).label("LoanDays"),
+        ).outerjoin(Book, Book.BookID == Loan.BookID).where(Loan.IssueDate.isnot(None)),
+        select(
+            Loan.ReturnDate, genre, literal(0), literal(1), func.coalesce(days, 0),
+        ).outerjoin(Book, Book.BookID == Loan.BookID).where(Loan.ReturnDate.isnot(None)),
+    ).subquery()
+    connection.execute(insert(LoanDayGenre).from_select(
+        ["Day", "Genre", "Issued", "Returned", "LoanDays"],
+        select(
+            events.c.Day, events.c.Genre,
+            func.sum(events.c.Issued), func.sum(events.c.Returned), func.sum(events.c.LoanDays),
+        ).group_by(events.c.Day, events.c.Genre),
+    ))
+
+
+# --- Reports (AsyncSession; rows are dicts shaped like schemas/analytics.py) ---
+
+def _month(dialect: str, column):
+    if dialect == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    # SQLite stores dates as ISO text, so the month is a prefix (cheaper than strftime per row)
+    return func.substr(column, 1, 7)
+
+
+def _genre_or_none(genre: str) -> Optional[str]:
+    return genre or None
+
+
+async def top_books(db, start: date, end: date, limit: int) -> List[dict]:
+    """The `limit` most borrowed books of every month in [start, end]"""
+    month = _month(db.bind.dialect.name, LoanDayBook.Day)
+    loans = func.sum(LoanDayBook.Issued)
+    ranked = (
+        select(
+            month.label("Month"), LoanDayBook.BookID, loans.label("Loans"),
+            func.row_number().over(partition_by=month, order_by=(loans.desc(), LoanDayBook.BookID)).label("Rank"),
+        )
+        .where(LoanDayBook.Day.between(start, end))
+        .group_by(month, LoanDayBook.BookID)
+        .having(loans > 0)
+        .subquery()
+    )
+    rows = await db.execute(
+        select(ranked.c.Month, ranked.c.Rank, ranked.c.BookID, Book.Title, Book.Genre, ranked.c.Loans)
+        .outerjoin(Book, Book.BookID == ranked.c.BookID)
+        .where(ranked.c.Rank <= limit)
+        .order_by(ranked.c.Month, ranked.c.Rank)
+    )
+    # Same missing-genre value (None) as the other reports, so their rows can be joined
+    return [{**row._mapping, "Genre": _genre_or_none(row.Genre)} for row in rows]
+
+
+async def top_genres(db, start: date, end: date, limit: int) -> List[dict]:
+    """The `limit` most borrowed genres of every month in [start, end]"""
+    month = _month(db.bind.dialect.name, LoanDayGenre.Day)
+    loans = func.sum(LoanDayGenre.Issued)
+    ranked = (
+        select(
+            month.label("Month"), LoanDayGenre.Genre, loans.label("Loans"),
+            func.row_number().over(partition_by=month, order_by=(loans.desc(), LoanDayGenre.Genre)).label("Rank"),
+        )
+        .where(LoanDayGenre.Day.between(start, end))
+        .group_by(month, LoanDayGenre.Genre)
+        .having(loans > 0)
+        .subquery()
+    )
+    rows = await db.execute(
+        select(ranked.c.Month, ranked.c.Rank, ranked.c.Genre, ranked.c.Loans)
+        .where(ranked.c.Rank <= limit)
+        .order_by(ranked.c.Month, ranked.c.Rank)
+    )
+    return [{**row._mapping, "Genre": _genre_or_none(row.Genre)} for row in rows]
+
+
+async def loan_durations(db, start: date, end: date, bucket_days: int) -> List[dict]:
+    """Loans returned in [start, end] by duration, in buckets of `bucket_days` days"""
+    bucket = (LoanDayDuration.Days // bucket_days) * bucket_days
+    returned = func.sum(LoanDayDuration.Returned)
+    rows = await db.execute(
+        select(bucket.label("FromDays"), returned.label("Loans"))
+        .where(LoanDayDuration.Day.between(start, end))
+        .group_by(bucket)
+        .having(returned > 0)
+        .order_by(bucket)
+    )
+    return [
+        {"FromDays": row.FromDays, "ToDays": row.FromDays + bucket_days - 1, "Loans": row.Loans}
+        for row in rows
+    ]
+
+
+async def active_members(db, start: date, end: date) -> List[dict]:
+    """Members who borrowed at least once, and the loans issued, per month in [start, end]"""
+    month = _month(db.bind.dialect.name, LoanDayMember.Day)
+    rows = await db.execute(
+        select(
+            month.label("Month"),
+            func.count(LoanDayMember.MemberID.distinct()).label("ActiveMembers"),
+            func.sum(LoanDayMember.Issued).label("Loans"),
+        )
+        .where(LoanDayMember.Day.between(start, end), LoanDayMember.Issued > 0)
+        .group_by(month)
+        .order_by(month)
+    )
+    return [dict(row._mapping) for row in rows]
+
+
+async def genre_turnover(db, start: date, end: date) -> List[dict]:
+    """Per month and genre: loans issued, loans per book in the genre's current stock, and the
+    average duration of the loans returned"""
+    month = _month(db.bind.dialect.name, LoanDayGenre.Day)
+    stock = {
+        genre or NO_GENRE: count
+        for genre, count in (await db.execute(select(Book.Genre, func.count()).group_by(Book.Genre))).all()
+    }
+    rows = await db.execute(
+        select(
+            month.label("Month"), LoanDayGenre.Genre,
+            func.sum(LoanDayGenre.Issued).label("Loans"),
+            func.sum(LoanDayGenre.Returned).label("Returned"),
+            func.sum(LoanDayGenre.LoanDays).label("LoanDays"),
+        )
+        .where(LoanDayGenre.Day.between(start, end))
+        .group_by(month, LoanDayGenre.Genre)
+        .having(func.sum(LoanDayGenre.Issued) + func.sum(LoanDayGenre.Returned) > 0)
+        .order_by(month, LoanDayGenre.Genre)
+    )
+    report = []
+    for row in rows:
+        books = stock.get(row.Genre, 0)
+        report.append({
+            "Month": row.Month,
+            "Genre": _genre_or_none(row.Genre),
+            "Loans": row.Loans,
+            "Books": books,
+            "Turnover": round(row.Loans / books, 3) if books else None,
+            "AverageLoanDays": round(row.LoanDays / row.Returned, 1) if row.Returned else None,
+        })
+    return report
+
+
+def main(argv=None):
+    from database.database import engine
+    from models import author, member, reminder, user  # noqa: F401 - resolve every mapper
+
+    parser = argparse.ArgumentParser(description="Maintain the circulation rollups")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every rollup from the loans table")
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.error("nothing to do (use --rebuild)")
+
+    with engine.connect() as connection:
+        rebuild_rollups(connection)
+        connection.commit()
+        for model in ROLLUP_MODELS:
+            count = connection.execute(select(func.count()).select_from(model)).scalar()
+            print(f"{model.__tablename__}: {count} rows")
+    # The reports are cached under the loans version, like after any loan write; the shared
+    # sqlite backend carries the bump to the running workers
+    from cache import response_cache
+
+    response_cache.invalidate("loans")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,114 @@
-from dotenv import load_dotenv
-load_dotenv()
+import os
+import sys
+
+
+def load_env_file():
+    # Same lookup as load_dotenv() (the nearest .env from here upwards), but python-dotenv
+    # is only imported when there is a file to read; hosted deploys set the environment directly
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+            return
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return
+        directory = parent
+
+
+load_env_file()
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database.database import Base, engine
-from models.user import User  # noqa: F401 - ensure users table is created
-from routers import authors, books, members, loans, auth, instagram
-from sqlalchemy import text
+from fastapi.responses import ORJSONResponse
+from database.database import engine, async_engine, async_read_engine
+from database.migrations import prepare_schema
+from routers import authors, books, members, loans, auth, search, stats, bulk, batch, metrics, analytics
+from metrics import MetricsMiddleware
+from pagination import NEXT_CURSOR_HEADER
+
+
+async def instagram_feed():
+    """
+    Returns recent Instagram media for display on the website.
+    Configure INSTAGRAM_ACCESS_TOKEN and INSTAGRAM_USER_ID in backend .env.
+    """
+    # Imported on the first request, which also starts the feed refresher (see routers/instagram.py)
+    from routers import instagram
+
+    return await instagram.get_instagram_feed()
+
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+def create_app() -> FastAPI:
+    """Build the API. Optional subsystems (the Instagram feed, the reminder scheduler)
+    are imported only when they are first used or enabled."""
+    # Compares the schema version with the latest migration; DDL only runs when it is behind
+    # (see database/migrations.py)
+    prepare_schema(engine)
 
+    # Route return values are rendered with orjson instead of json.dumps
+    app = FastAPI(title="Buecheria API", default_response_class=ORJSONResponse)
 
-def ensure_books_cover_url_column():
-    with engine.connect() as connection:
-        columns = connection.execute(text("PRAGMA table_info(books)")).fetchall()
-        column_names = {column[1] for column in columns}
-        if "CoverUrl" not in column_names:
-            connection.execute(text("ALTER TABLE books ADD COLUMN CoverUrl VARCHAR"))
-            connection.commit()
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER],
+    )
+    # Added last so it wraps CORS too and times the whole request
+    app.add_middleware(MetricsMiddleware)
 
+    #Register routers
+    app.include_router(auth.router, prefix="/api", tags=["Auth"])
+    # Registered before the entity routers so /books/export isn't taken for /books/{book_id}
+    app.include_router(bulk.router, prefix="/api", tags=["Bulk"])
+    app.include_router(authors.router, prefix="/api", tags=["Authors"])
+    app.include_router(books.router, prefix="/api", tags=["Books"])
+    app.include_router(members.router, prefix="/api", tags=["Members"])
+    app.include_router(loans.router, prefix="/api", tags=["Loans"])
+    app.include_router(search.router, prefix="/api", tags=["Search"])
+    app.include_router(stats.router, prefix="/api", tags=["Stats"])
+    app.include_router(analytics.router, prefix="/api", tags=["Analytics"])
+    app.include_router(batch.router, prefix="/api", tags=["Batch"])
+    app.add_api_route("/api/instagram-feed", instagram_feed, methods=["GET"], tags=["Instagram"])
+    # Scraped by Prometheus at the conventional path, outside /api
+    app.include_router(metrics.router, tags=["Metrics"])
 
-ensure_books_cover_url_column()
+    # Overdue/due-soon reminders run in-process when enabled (or via `python -m reminders`)
+    app.state.reminder_scheduler = None
+    if os.getenv("REMINDER_SCHEDULER") == "1":
+        from reminders import ReminderScheduler
+        app.state.reminder_scheduler = ReminderScheduler()
 
-app = FastAPI(title="Buecheria API")
+    @app.on_event("startup")
+    def start_background_workers():
+        if app.state.reminder_scheduler is not None:
+            app.state.reminder_scheduler.start()
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    @app.on_event("shutdown")
+    def stop_background_workers():
+        instagram = sys.modules.get("routers.instagram")
+        if instagram is not None:
+            instagram.feed_cache.stop()
+        if app.state.reminder_scheduler is not None:
+            app.state.reminder_scheduler.stop()
 
+    @app.on_event("shutdown")
+    async def dispose_async_engines():
+        # Close pooled aiosqlite/asyncpg connections so worker shutdown doesn't hang
+        await async_engine.dispose()
+        await async_read_engine.dispose()
 
-#Register routers
-app.include_router(auth.router, prefix="/api", tags=["Auth"])
-app.include_router(authors.router, prefix="/api", tags=["Authors"])
-app.include_router(books.router, prefix="/api", tags=["Books"])
-app.include_router(members.router, prefix="/api", tags=["Members"])
-app.include_router(loans.router, prefix="/api", tags=["Loans"])
-app.include_router(instagram.router, prefix="/api", tags=["Instagram"])
+    @app.get("/")
+    def home():
+        return {"message": "Welcome to the Library API"}
 
+    return app
 
-@app.get("/")
-def home():
-    return {"message": "Welcome to the Library API"}
 
+app = create_app()
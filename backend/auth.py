@@ -1,13 +1,37 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
+from typing import Dict, List, Optional, Tuple
 from fastapi import HTTPException, status
+from sqlalchemy import delete, insert, select
 
 # Secret key for JWT (in production, use environment variable)
 SECRET_KEY = "your-secret-key-change-this-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Verified tokens kept in memory (LRU), so repeat requests skip decoding and the HMAC check
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 10000))
+# Revocations live in the token_revocations table, shared by all workers. Each worker reads
+# the new rows at most this often, so a revocation reaches the others within this delay
+# (0: on every request)
+REVOCATION_SYNC_SECONDS = float(os.environ.get("REVOCATION_SYNC_SECONDS", 1))
+
+# scrypt cost parameters for stored passwords (16 MiB of memory per hash)
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+PASSWORD_SCHEME = "scrypt"
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -15,21 +39,207 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    
+
     # Convert datetime to Unix timestamp (integer) for JWT exp claim
-    to_encode.update({"exp": int(expire.timestamp())})
+    # (iat lets revoke_subject reject tokens issued before a revocation, and
+    # jti keeps two logins in the same second from sharing a revocable token)
+    to_encode.update({"exp": int(expire.timestamp()), "iat": int(time.time()), "jti": secrets.token_hex(8)})
+    from jose import jwt  # with its cryptography backend, only needed once a token is issued or checked
+
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """Bounded LRU of verified token payloads keyed by token digest, plus this worker's
+    copy of the revocations in the `token_revocations` table"""
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        # token digest -> exp (kept until the token would have expired anyway)
+        self._revoked_tokens: Dict[str, float] = {}
+        # subject -> Unix second from which its tokens are valid again
+        self._revoked_subjects: Dict[str, int] = {}
+        # Highest RevocationID applied, and when the table was last read (monotonic)
+        self._last_revocation_id = 0
+        self._synced_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> Optional[dict]:
+        with self._lock:
+            payload = self._entries.get(digest)
+            if payload is None:
+                return None
+            if payload["exp"] <= time.time():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return payload
+
+    def put(self, digest: str, payload: dict):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[digest] = payload
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def is_revoked(self, digest: str, payload: dict) -> bool:
+        with self._lock:
+            if digest in self._revoked_tokens:
+                return True
+            revoked_before = self._revoked_subjects.get(payload.get("sub"))
+            # iat is a whole second: a token issued in the revocation's second stays valid,
+            # so logging in again right after "revoke my tokens" works
+            return revoked_before is not None and payload.get("iat", 0) < revoked_before
+
+    def apply(self, revocation_id: int, digest: Optional[str], subject: Optional[str], revoked_at: int, expires_at: int):
+        """Record one revocation row and evict the cached tokens it covers"""
+        with self._lock:
+            self._last_revocation_id = max(self._last_revocation_id, revocation_id)
+            if digest is not None:
+                self._revoked_tokens[digest] = expires_at
+                self._entries.pop(digest, None)
+            if subject is not None:
+                self._revoked_subjects[subject] = max(self._revoked_subjects.get(subject, 0), revoked_at)
+                for key in [key for key, payload in self._entries.items() if payload.get("sub") == subject]:
+                    del self._entries[key]
+
+    def sync_due(self) -> bool:
+        """Whether REVOCATION_SYNC_SECONDS have passed since the table was last read"""
+        return self._synced_at is None or time.monotonic() - self._synced_at >= REVOCATION_SYNC_SECONDS
+
+    def sync(self, force: bool = False):
+        """Apply the revocations other workers stored since the last read, at most once
+        per REVOCATION_SYNC_SECONDS (blocking database I/O: call it off the event loop)"""
+        with self._lock:
+            if not force and not self.sync_due():
+                return
+            self._synced_at = time.monotonic()
+        for row in _load_revocations(self._last_revocation_id):
+            self.apply(*row)
+        with self._lock:
+            # Expired tokens fail verification on their own, so forget their revocations
+            wall_clock = time.time()
+            self._revoked_tokens = {key: exp for key, exp in self._revoked_tokens.items() if exp > wall_clock}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def _load_revocations(after_id: int) -> List[tuple]:
+    from database.database import engine
+    from models.revocation import TokenRevocation
+
+    with engine.connect() as connection:
+        return connection.execute(
+            select(
+                TokenRevocation.RevocationID, TokenRevocation.TokenDigest, TokenRevocation.Subject,
+                TokenRevocation.RevokedAt, TokenRevocation.ExpiresAt,
+            )
+            .where(TokenRevocation.RevocationID > after_id, TokenRevocation.ExpiresAt > int(time.time()))
+            .order_by(TokenRevocation.RevocationID)
+        ).all()
+
+
+def _store_revocation(digest: Optional[str], subject: Optional[str], expires_at: int):
+    """Insert a revocation row (pruning expired ones) and apply it to this worker at once"""
+    from database.database import engine
+    from models.revocation import TokenRevocation
+
+    revoked_at = int(time.time())
+    with engine.begin() as connection:
+        connection.execute(delete(TokenRevocation).where(TokenRevocation.ExpiresAt <= revoked_at))
+        revocation_id = connection.execute(
+            insert(TokenRevocation)
+            .values(TokenDigest=digest, Subject=subject, RevokedAt=revoked_at, ExpiresAt=expires_at)
+            .returning(TokenRevocation.RevocationID)
+        ).scalar_one()
+    token_cache.apply(revocation_id, digest, subject, revoked_at, expires_at)
+
+
+def _credentials_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
 def verify_token(token: str) -> dict:
-    """Verify and decode a JWT token"""
+    """Verify and decode a JWT token (answered from the token cache when possible).
+
+    Does no I/O: callers run token_cache.sync() first to pick up the revocations made by
+    other workers; applying one evicts the tokens it covers, so a cache hit is still valid.
+    """
+    digest = token_digest(token)
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return payload
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
+        raise _credentials_error()
+    if "exp" not in payload or token_cache.is_revoked(digest, payload):
+        raise _credentials_error()
+    token_cache.put(digest, payload)
+    return payload
+
+
+def revoke_token(token: str):
+    """Reject this token from now on, even though its signature and exp are still valid"""
+    token_cache.sync()
+    payload = verify_token(token)
+    _store_revocation(token_digest(token), None, int(payload["exp"]))
+
+
+def revoke_user_tokens(username: str):
+    """Reject every token issued to `username` before the current second"""
+    _store_revocation(None, username, int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+def hash_password(password: str) -> str:
+    """Salted scrypt hash in the form scrypt$n$r$p$salt$hash (slow on purpose: call it off the event loop)"""
+    salt = secrets.token_bytes(16)
+    derived = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+    encode = lambda raw: base64.b64encode(raw).decode()
+    return f"{PASSWORD_SCHEME}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${encode(salt)}${encode(derived)}"
+
+
+def verify_password(password: str, stored: str) -> Tuple[bool, bool]:
+    """Check a password against its stored form; returns (matches, needs_rehash).
+
+    Stored values that aren't scrypt hashes are legacy plain-text passwords;
+    they still verify, and report that they should be rehashed.
+    """
+    if not stored.startswith(f"{PASSWORD_SCHEME}$"):
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+    try:
+        _, n, r, p, salt, expected = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        expected = base64.b64decode(expected, validate=True)
+        derived = hashlib.scrypt(
+            password.encode(), salt=base64.b64decode(salt, validate=True), n=n, r=r, p=p, maxmem=256 * r * (n + p)
         )
+    except (binascii.Error, ValueError):
+        # A malformed stored hash fails the check instead of the request
+        return False, False
+    matches = hmac.compare_digest(derived, expected)
+    return matches, matches and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
 
+if __name__ == "__main__":
+    # Print the hash to store in users.Password: python auth.py <password>
+    print(hash_password(sys.argv[1]))
@@ -0,0 +1,77 @@
+"""
+Compare two benchmark reports written by benchmarks.run.
+
+    python -m benchmarks.compare before.json after.json --fail-above 10
+
+Prints per-scenario p50/p95/p99 latency and throughput with the relative
+change. Exits with status 1 when any scenario's p95 got slower by more
+than --fail-above percent, so it can gate a CI job.
+"""
+import argparse
+import json
+import sys
+from typing import Optional
+
+
+def change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    if before in (None, 0) or after is None:
+        return None
+    return (after - before) / before * 100
+
+
+def format_cell(before, after) -> str:
+    delta = change(before, after)
+    if delta is None:
+        return f"{before} -> {after}"
+    return f"{before} -> {after} ({delta:+.1f}%)"
+
+
+def compare(before: dict, after: dict, fail_above: Optional[float]):
+    regressions = []
+    rows = []
+    for name in sorted(set(before["endpoints"]) | set(after["endpoints"])):
+        old, new = before["endpoints"].get(name), after["endpoints"].get(name)
+        if old is None or new is None:
+            rows.append((name, "only in " + ("after" if old is None else "before")))
+            continue
+        cells = [
+            f"{key} {format_cell(old['latency_ms'][key], new['latency_ms'][key])} ms"
+            for key in ("p50", "p95", "p99")
+        ]
+        cells.append(f"{format_cell(old['throughput_rps'], new['throughput_rps'])} req/s")
+        rows.append((name, "  ".join(cells)))
+        delta = change(old["latency_ms"]["p95"], new["latency_ms"]["p95"])
+        if fail_above is not None and delta is not None and delta > fail_above:
+            regressions.append((name, delta))
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--fail-above", type=float, help="fail if a p95 latency grew by more than this percent")
+    args = parser.parse_args(argv)
+
+    with open(args.before) as handle:
+        before = json.load(handle)
+    with open(args.after) as handle:
+        after = json.load(handle)
+
+    print(f"before: {before['meta'].get('commit')} ({before['meta'].get('timestamp')})")
+    print(f"after:  {after['meta'].get('commit')} ({after['meta'].get('timestamp')})")
+    if before["meta"].get("catalogue") != after["meta"].get("catalogue"):
+        print("warning: the reports were run against different catalogues", file=sys.stderr)
+    rows, regressions = compare(before, after, args.fail_above)
+    width = max((len(name) for name, _ in rows), default=0)
+    for name, text in rows:
+        print(f"{name:<{width}}  {text}")
+
+    if regressions:
+        for name, delta in regressions:
+            print(f"regression: {name} p95 {delta:+.1f}%", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Before/after report for the index revision in database/indexes.py.
+
+    python -m benchmarks.seed --size 100k --output /tmp/bench-100k.db
+    python -m benchmarks.indexes --db /tmp/bench-100k.db --output indexes.json
+
+Two copies of --db are made: "before" with the previous index set
+(downgrade_indexes) and "after" with the current one (sync_indexes). For
+each copy the report records:
+- the index list and the file size
+- the EXPLAIN QUERY PLAN of every access path in ACCESS_PATHS and its
+  best time over --repeat runs
+- the write throughput of the write paths in WRITE_PATHS, one transaction
+  per statement with the app's SQLite settings (WAL, synchronous=NORMAL)
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TODAY = date.today().isoformat()
+
+# The lookups behind the routes, in the SQL the ORM emits (columns trimmed to *)
+ACCESS_PATHS = {
+    "books.page": ('SELECT * FROM books WHERE AuthorID IS NOT NULL ORDER BY BookID LIMIT 51', ()),
+    "books.genre_available": (
+        "SELECT * FROM books WHERE AuthorID IS NOT NULL AND Genre = ? AND Available = 1 "
+        "ORDER BY BookID LIMIT 51", ("Lyrik",),
+    ),
+    "books.genre_available_by_title": (
+        "SELECT * FROM books WHERE AuthorID IS NOT NULL AND Genre = ? AND Available = 1 "
+        "ORDER BY Title, BookID LIMIT 51", ("Lyrik",),
+    ),
+    "books.unavailable": (
+        "SELECT * FROM books WHERE AuthorID IS NOT NULL AND Available = 0 ORDER BY BookID LIMIT 51", (),
+    ),
+    "books.by_title": ("SELECT * FROM books WHERE AuthorID IS NOT NULL ORDER BY Title, BookID LIMIT 51", ()),
+    "books.by_published": (
+        "SELECT * FROM books WHERE AuthorID IS NOT NULL ORDER BY PublicationDate DESC, BookID DESC LIMIT 51", (),
+    ),
+    "books.by_author": ("SELECT * FROM books WHERE AuthorID = ?", (42,)),
+    "books.by_isbn": ("SELECT BookID FROM books WHERE Isbn IN (?)", ("9780000000420",)),
+    "stats.available_books": ("SELECT count(*) FROM books WHERE Available = 1", ()),
+    "stats.open_loans": ("SELECT count(*) FROM loans WHERE ReturnDate IS NULL", ()),
+    "stats.overdue_loans": ("SELECT count(*) FROM loans WHERE ReturnDate IS NULL AND DueDate < ?", (TODAY,)),
+    "stats.members_by_status": ("SELECT MembershipStatus, count(*) FROM members GROUP BY MembershipStatus", ()),
+    "loans.overdue": (
+        "SELECT * FROM loans WHERE ReturnDate IS NULL AND DueDate < ? ORDER BY DueDate, LoanID LIMIT 50", (TODAY,),
+    ),
+    "loans.member_open": ("SELECT * FROM loans WHERE MemberID = ? AND ReturnDate IS NULL", (7,)),
+    "loans.member_all": ("SELECT * FROM loans WHERE MemberID = ?", (7,)),
+    "loans.book_open": ("SELECT * FROM loans WHERE BookID = ? AND ReturnDate IS NULL", (42,)),
+    "loans.book_all": ("SELECT * FROM loans WHERE BookID = ?", (42,)),
+    "members.by_email": ("SELECT Email FROM members WHERE Email IN (?)", ("member7@example.org",)),
+    "users.login": ("SELECT * FROM users WHERE Username = ?", ("bench",)),
+}
+
+
+def _book(i):
+    return (f"Index bench {i}", 1 + i % 100, f"idx-{i}", "2001-01-01", "Roman", 1)
+
+
+def _member(i):
+    return ("Bench", "Index", f"Straße {i}", f"idx-{i}@example.org", "+49 30 1", "1990-01-01", TODAY, "Member")
+
+
+def _loan(i):
+    return (1 + i % 1000, 1 + i % 100, TODAY, (date.today() + timedelta(days=14)).isoformat())
+
+
+# name -> (statement, parameters for the i-th write)
+WRITE_PATHS = {
+    "insert_book": (
+        "INSERT INTO books (Title, AuthorID, Isbn, PublicationDate, Genre, Available) VALUES (?, ?, ?, ?, ?, ?)",
+        _book,
+    ),
+    "insert_member": (
+        "INSERT INTO members (LastName, FirstName, Address, Email, Phone, BirthDate, JoinDate, MembershipStatus) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        _member,
+    ),
+    "insert_loan": ("INSERT INTO loans (BookID, MemberID, IssueDate, DueDate) VALUES (?, ?, ?, ?)", _loan),
+    "checkout_book": ("UPDATE books SET Available = 0 WHERE BookID = ? AND Available IS 1", lambda i: (1 + i,)),
+    "return_loan": (
+        "UPDATE loans SET ReturnDate = ? WHERE LoanID = ? AND ReturnDate IS NULL", lambda i: (TODAY, 1 + i * 7),
+    ),
+    "update_member": ("UPDATE members SET Phone = ?, Address = ? WHERE MemberID = ?", lambda i: ("+49", f"W {i}", 1 + i)),
+}
+
+
+def describe(connection: sqlite3.Connection, repeat: int) -> dict:
+    indexes = [
+        row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL ORDER BY name"
+        )
+    ]
+    paths = {}
+    for name, (statement, params) in ACCESS_PATHS.items():
+        plan = [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {statement}", params)]
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            connection.execute(statement, params).fetchall()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        paths[name] = {"plan": plan, "best_ms": round(best * 1000, 3)}
+    return {"indexes": indexes, "index_count": len(indexes), "access_paths": paths}
+
+
+def measure_writes(connection: sqlite3.Connection, writes: int) -> dict:
+    results = {}
+    for name, (statement, params) in WRITE_PATHS.items():
+        started = time.perf_counter()
+        for i in range(writes):
+            connection.execute("BEGIN")
+            connection.execute(statement, params(i))
+            connection.execute("COMMIT")
+        elapsed = time.perf_counter() - started
+        results[name] = {"writes": writes, "per_second": round(writes / elapsed, 1)}
+    return results
+
+
+def run(db_path: str, writes: int, repeat: int) -> dict:
+    from sqlalchemy import create_engine
+    from database.indexes import downgrade_indexes, sync_indexes
+    from models import analytics, author, book, loan, member, reminder, revocation, user  # noqa: F401 - register all tables
+
+    workdir = tempfile.mkdtemp(prefix="buecheria-indexes-")
+    report = {}
+    try:
+        for label, change in (("before", downgrade_indexes), ("after", sync_indexes)):
+            path = os.path.join(workdir, f"{label}.db")
+            shutil.copyfile(db_path, path)
+            engine = create_engine(f"sqlite:///{path}")
+            change(engine)
+            engine.dispose()
+
+            connection = sqlite3.connect(path, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("ANALYZE")
+            connection.execute("VACUUM")
+            result = describe(connection, repeat)
+            result["file_bytes"] = os.path.getsize(path)
+            result["writes"] = measure_writes(connection, writes)
+            connection.close()
+            report[label] = result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report["write_speedup"] = {
+        name: round(report["after"]["writes"][name]["per_second"] / report["before"]["writes"][name]["per_second"], 2)
+        for name in WRITE_PATHS
+    }
+    report["plan_changes"] = {
+        name: {"before": report["before"]["access_paths"][name]["plan"], "after": path["plan"]}
+        for name, path in report["after"]["access_paths"].items()
+        if path["plan"] != report["before"]["access_paths"][name]["plan"]
+    }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare query plans and write throughput across the index revision")
+    parser.add_argument("--db", required=True, help="database created by benchmarks.seed")
+    parser.add_argument("--writes", type=int, default=2000, help="single-statement transactions per write path")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per access path (best time is kept)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    report = {"db": os.path.abspath(args.db), **run(os.path.abspath(args.db), args.writes, args.repeat)}
+    for name, speedup in report["write_speedup"].items():
+        print(f"{name:<16} {speedup}x writes/s", file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,677 @@
+"""
+Drive every API endpoint and report latency, throughput and memory as JSON.
+
+    python -m benchmarks.seed --size 10k --output /tmp/bench.db
+    python -m benchmarks.run --db /tmp/bench.db --output before.json
+    python -m benchmarks.run --db /tmp/bench.db --url http://127.0.0.1:8000 --server-pid 1234
+
+Without --url the ASGI app from app.py runs in this process against a copy
+of --db, so every run starts from the same seeded rows. Requests go through
+httpx's ASGI transport, so there is no network in the measurement. With
+--url the same scenarios are sent over HTTP to a server started on the same
+database. --db is still needed then, to pick existing IDs.
+
+Each scenario sends --requests requests from --concurrency concurrent
+clients after --warmup unmeasured ones. Unpaged list and export scenarios
+are "heavy" and use --heavy-requests instead. Scenarios that need the
+network (cover downloads) run only with --include-network.
+
+Peak RSS is read from /proc/<pid>/status (VmHWM) and reset before each
+scenario through /proc/<pid>/clear_refs. It is the in-process app's peak,
+or the server's with --server-pid. Compare two reports with
+`python -m benchmarks.compare`.
+"""
+import argparse
+import asyncio
+import fnmatch
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+import httpx
+from benchmarks.seed import BENCH_PASSWORD, GENRES, LAST_NAMES, TITLE_WORDS
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGE_SIZE = 50
+# Settings that change the numbers, recorded with every report
+REPORTED_ENV = (
+    "RESPONSE_CACHE_BACKEND", "DB_POOL", "DB_POOL_SIZE", "SQLITE_JOURNAL_MODE", "SQLITE_SYNCHRONOUS",
+    "SQLITE_MMAP_SIZE", "SQLITE_CACHE_SIZE", "TOKEN_CACHE_SIZE", "SLOW_QUERY_MS", "SERIALIZATION_MODE",
+)
+
+
+@dataclass
+class Context:
+    client: httpx.AsyncClient
+    rng: random.Random
+    counts: Dict[str, int]
+    available_books: List[int]
+    admin_headers: Dict[str, str] = field(default_factory=dict)
+    sequence: itertools.count = field(default_factory=itertools.count)
+
+    def unique(self) -> str:
+        return f"{os.getpid()}-{next(self.sequence)}"
+
+    def author_id(self) -> int:
+        return self.rng.randrange(1, self.counts["authors"] + 1)
+
+    def book_id(self) -> int:
+        return self.rng.randrange(1, self.counts["books"] + 1)
+
+    def member_id(self) -> int:
+        return self.rng.randrange(1, self.counts["members"] + 1)
+
+    def loan_id(self) -> int:
+        return self.rng.randrange(1, self.counts["loans"] + 1)
+
+    def take_available_book(self) -> int:
+        return self.available_books.pop(self.rng.randrange(len(self.available_books)))
+
+    async def json(self, method: str, url: str, **kwargs):
+        """Unmeasured request used to set up a scenario"""
+        response = await self.client.request(method, url, headers=self.admin_headers, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+
+# A scenario builds one request: (method, url, httpx keyword arguments)
+Build = Callable[[Context], Awaitable[tuple]]
+
+
+@dataclass
+class Scenario:
+    name: str
+    route: str
+    build: Build
+    heavy: bool = False
+    network: bool = False
+
+
+SCENARIOS: List[Scenario] = []
+
+
+def scenario(name: str, route: str, heavy: bool = False, network: bool = False):
+    def register(build: Build) -> Build:
+        SCENARIOS.append(Scenario(name, route, build, heavy, network))
+        return build
+    return register
+
+
+def author_data(ctx: Context) -> dict:
+    return {"LastName": f"Bench {ctx.unique()}", "FirstName": ctx.rng.choice(LAST_NAMES), "BirthDate": "1970"}
+
+
+def book_data(ctx: Context) -> dict:
+    return {
+        "Title": f"{ctx.rng.choice(TITLE_WORDS)} {ctx.unique()}",
+        "AuthorID": ctx.author_id(),
+        "Isbn": f"bench-{ctx.unique()}",
+        "PublicationDate": "2001-01-01",
+        "Genre": ctx.rng.choice(GENRES),
+    }
+
+
+def member_data(ctx: Context) -> dict:
+    return {
+        "LastName": ctx.rng.choice(LAST_NAMES),
+        "FirstName": "Bench",
+        "Address": "Benchstraße 1",
+        "Email": f"bench-{ctx.unique()}@example.org",
+        "Phone": "+49 30 1234567",
+        "BirthDate": "1990-01-01",
+        "JoinDate": date.today().isoformat(),
+        "MembershipStatus": "Member",
+    }
+
+
+def loan_data(ctx: Context) -> dict:
+    today = date.today().isoformat()
+    return {"MemberID": ctx.member_id(), "BookID": ctx.book_id(), "LoanDate": today, "DueDate": today}
+
+
+def ndjson(rows) -> dict:
+    return {
+        "content": "".join(json.dumps(row) + "\n" for row in rows),
+        "headers": {"Content-Type": "application/x-ndjson"},
+    }
+
+
+# --- Auth ---
+
+@scenario("auth.login", "POST /api/login")
+async def _(ctx):
+    return "POST", "/api/login", {"json": {"username": "bench-user", "password": BENCH_PASSWORD}}
+
+
+@scenario("auth.protected", "GET /api/protected")
+async def _(ctx):
+    return "GET", "/api/protected", {"headers": ctx.admin_headers}
+
+
+@scenario("auth.adminonly", "GET /api/adminonly")
+async def _(ctx):
+    return "GET", "/api/adminonly", {"headers": ctx.admin_headers}
+
+
+@scenario("auth.logout", "POST /api/logout")
+async def _(ctx):
+    # Each logout revokes its token, so log in a fresh one first
+    token = (await ctx.json("POST", "/api/login", json={"username": "bench", "password": BENCH_PASSWORD}))
+    return "POST", "/api/logout", {"headers": {"Authorization": f"Bearer {token['access_token']}"}}
+
+
+@scenario("auth.revoke_tokens", "POST /api/users/{username}/revoke-tokens")
+async def _(ctx):
+    return "POST", "/api/users/bench-user/revoke-tokens", {"headers": ctx.admin_headers}
+
+
+# --- Authors ---
+
+@scenario("authors.list", "GET /api/authors", heavy=True)
+async def _(ctx):
+    return "GET", "/api/authors", {}
+
+
+@scenario("authors.get", "GET /api/authors/{author_id}")
+async def _(ctx):
+    return "GET", f"/api/authors/{ctx.author_id()}", {}
+
+
+@scenario("authors.create", "POST /api/authors")
+async def _(ctx):
+    return "POST", "/api/authors", {"json": author_data(ctx)}
+
+
+@scenario("authors.update", "PUT /api/authors/{author_id}")
+async def _(ctx):
+    return "PUT", f"/api/authors/{ctx.author_id()}", {"json": {"BirthDate": "1950"}}
+
+
+@scenario("authors.delete", "DELETE /api/authors/{author_id}")
+async def _(ctx):
+    author = await ctx.json("POST", "/api/authors", json=author_data(ctx))
+    return "DELETE", f"/api/authors/{author['AuthorID']}", {}
+
+
+# --- Books ---
+
+@scenario("books.list", "GET /api/books", heavy=True)
+async def _(ctx):
+    return "GET", "/api/books", {}
+
+
+@scenario("books.page", "GET /api/books")
+async def _(ctx):
+    return "GET", f"/api/books?limit={PAGE_SIZE}", {}
+
+
+@scenario("books.page_sorted", "GET /api/books")
+async def _(ctx):
+    return "GET", f"/api/books?sort=-published&limit={PAGE_SIZE}", {}
+
+
+@scenario("books.page_filtered", "GET /api/books")
+async def _(ctx):
+    return "GET", f"/api/books?genre={ctx.rng.choice(GENRES)}&available=true&limit={PAGE_SIZE}", {}
+
+
+@scenario("books.page_fields", "GET /api/books")
+async def _(ctx):
+    return "GET", f"/api/books?fields=BookID,Title&limit={PAGE_SIZE}", {}
+
+
+@scenario("books.stream", "GET /api/books?stream=1", heavy=True)
+async def _(ctx):
+    return "GET", "/api/books?stream=1", {}
+
+
+@scenario("books.get", "GET /api/books/{book_id}")
+async def _(ctx):
+    return "GET", f"/api/books/{ctx.book_id()}", {}
+
+
+@scenario("books.cover", "GET /api/books/{book_id}/cover", network=True)
+async def _(ctx):
+    return "GET", f"/api/books/{ctx.book_id()}/cover?size=small", {}
+
+
+@scenario("books.create", "POST /api/books")
+async def _(ctx):
+    return "POST", "/api/books", {"json": book_data(ctx)}
+
+
+@scenario("books.update", "PUT /api/books/{book_id}")
+async def _(ctx):
+    return "PUT", f"/api/books/{ctx.book_id()}", {"json": {"Genre": ctx.rng.choice(GENRES)}}
+
+
+@scenario("books.delete", "DELETE /api/books/{book_id}")
+async def _(ctx):
+    book = await ctx.json("POST", "/api/books", json=book_data(ctx))
+    return "DELETE", f"/api/books/{book['BookID']}", {}
+
+
+# --- Members ---
+
+@scenario("members.list", "GET /api/members", heavy=True)
+async def _(ctx):
+    return "GET", "/api/members", {}
+
+
+@scenario("members.get", "GET /api/members/{member_id}")
+async def _(ctx):
+    return "GET", f"/api/members/{ctx.member_id()}", {}
+
+
+@scenario("members.create", "POST /api/members")
+async def _(ctx):
+    return "POST", "/api/members", {"json": member_data(ctx)}
+
+
+@scenario("members.update", "PUT /api/members/{member_id}")
+async def _(ctx):
+    return "PUT", f"/api/members/{ctx.member_id()}", {"json": {"Phone": "+49 30 7654321"}}
+
+
+@scenario("members.delete", "DELETE /api/members/{member_id}")
+async def _(ctx):
+    member = await ctx.json("POST", "/api/members", json=member_data(ctx))
+    return "DELETE", f"/api/members/{member['MemberID']}", {}
+
+
+# --- Loans ---
+
+@scenario("loans.list", "GET /api/loans", heavy=True)
+async def _(ctx):
+    return "GET", "/api/loans", {}
+
+
+@scenario("loans.stream", "GET /api/loans?stream=1", heavy=True)
+async def _(ctx):
+    return "GET", "/api/loans?stream=1", {}
+
+
+@scenario("loans.overdue", "GET /api/loans/overdue")
+async def _(ctx):
+    return "GET", f"/api/loans/overdue?limit={PAGE_SIZE}", {}
+
+
+@scenario("loans.member_history", "GET /api/members/{member_id}/loans")
+async def _(ctx):
+    return "GET", f"/api/members/{ctx.member_id()}/loans", {}
+
+
+@scenario("loans.book_history", "GET /api/books/{book_id}/loans")
+async def _(ctx):
+    return "GET", f"/api/books/{ctx.book_id()}/loans?status=returned", {}
+
+
+@scenario("loans.get", "GET /api/loans/{loan_id}")
+async def _(ctx):
+    return "GET", f"/api/loans/{ctx.loan_id()}", {}
+
+
+@scenario("loans.create", "POST /api/loans")
+async def _(ctx):
+    return "POST", "/api/loans", {"json": loan_data(ctx)}
+
+
+@scenario("loans.checkout", "POST /api/loans/checkout")
+async def _(ctx):
+    return "POST", "/api/loans/checkout", {"json": {"MemberID": ctx.member_id(), "BookID": ctx.take_available_book()}}
+
+
+@scenario("loans.checkout_batch", "POST /api/loans/checkout/batch")
+async def _(ctx):
+    book_ids = [ctx.take_available_book() for _ in range(5)]
+    return "POST", "/api/loans/checkout/batch", {"json": {"MemberID": ctx.member_id(), "BookIDs": book_ids}}
+
+
+@scenario("loans.return", "POST /api/loans/{loan_id}/return")
+async def _(ctx):
+    loan = await ctx.json("POST", "/api/loans/checkout", json={
+        "MemberID": ctx.member_id(), "BookID": ctx.take_available_book(),
+    })
+    return "POST", f"/api/loans/{loan['LoanID']}/return", {"json": {}}
+
+
+@scenario("loans.update", "PUT /api/loans/{loan_id}")
+async def _(ctx):
+    return "PUT", f"/api/loans/{ctx.loan_id()}", {"json": {"DueDate": date.today().isoformat()}}
+
+
+@scenario("loans.delete", "DELETE /api/loans/{loan_id}")
+async def _(ctx):
+    loan = await ctx.json("POST", "/api/loans", json=loan_data(ctx))
+    return "DELETE", f"/api/loans/{loan['LoanID']}", {}
+
+
+# --- Bulk import/export ---
+
+@scenario("bulk.authors_export", "GET /api/authors/export", heavy=True)
+async def _(ctx):
+    return "GET", "/api/authors/export?format=csv", {}
+
+
+@scenario("bulk.books_export", "GET /api/books/export", heavy=True)
+async def _(ctx):
+    return "GET", "/api/books/export?format=jsonl", {}
+
+
+@scenario("bulk.members_export", "GET /api/members/export", heavy=True)
+async def _(ctx):
+    return "GET", "/api/members/export?format=csv", {}
+
+
+@scenario("bulk.authors_import", "POST /api/authors/import")
+async def _(ctx):
+    return "POST", "/api/authors/import", ndjson(author_data(ctx) for _ in range(20))
+
+
+@scenario("bulk.books_import", "POST /api/books/import")
+async def _(ctx):
+    return "POST", "/api/books/import", ndjson(book_data(ctx) for _ in range(20))
+
+
+@scenario("bulk.members_import", "POST /api/members/import")
+async def _(ctx):
+    return "POST", "/api/members/import", ndjson(member_data(ctx) for _ in range(20))
+
+
+# --- Everything else ---
+
+@scenario("search", "GET /api/search")
+async def _(ctx):
+    return "GET", f"/api/search?q={ctx.rng.choice(TITLE_WORDS)[:3]}+{ctx.rng.choice(LAST_NAMES)}", {}
+
+
+@scenario("stats", "GET /api/stats")
+async def _(ctx):
+    return "GET", "/api/stats", {}
+
+
+@scenario("analytics.top_books", "GET /api/analytics/top-books")
+async def _(ctx):
+    # A different limit per request, so the response cache doesn't answer most of them
+    return "GET", f"/api/analytics/top-books?limit={ctx.rng.randint(1, 20)}", {}
+
+
+@scenario("analytics.genre_turnover", "GET /api/analytics/genre-turnover")
+async def _(ctx):
+    return "GET", f"/api/analytics/genre-turnover?end={date.today() - timedelta(days=ctx.rng.randint(0, 30))}", {}
+
+
+@scenario("batch", "POST /api/batch")
+async def _(ctx):
+    book = book_data(ctx)
+    book["AuthorID"] = "$author"
+    return "POST", "/api/batch", {"json": {"Operations": [
+        {"Op": "create", "Entity": "authors", "Ref": "author", "Data": author_data(ctx)},
+        {"Op": "create", "Entity": "books", "Data": book},
+        {"Op": "update", "Entity": "members", "ID": ctx.member_id(), "Data": {"Phone": "+49 30 1111111"}},
+    ]}}
+
+
+@scenario("instagram.feed", "GET /api/instagram-feed")
+async def _(ctx):
+    return "GET", "/api/instagram-feed", {}
+
+
+@scenario("metrics", "GET /metrics")
+async def _(ctx):
+    return "GET", "/metrics", {}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _proc_status(pid: int, key: str) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as handle:
+            for line in handle:
+                if line.startswith(key + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss(pid: int):
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as handle:
+            handle.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss(pid: int) -> Optional[int]:
+    """Peak resident set size in bytes since the last reset_peak_rss"""
+    value = _proc_status(pid, "VmHWM")
+    if value is None and pid == os.getpid():
+        # No procfs: fall back to the process-lifetime peak (KiB on Linux, bytes on macOS)
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        value = maxrss if sys.platform == "darwin" else maxrss * 1024
+    return value
+
+
+async def run_scenario(ctx: Context, entry: Scenario, requests: int, concurrency: int, warmup: int, pid: int):
+    for _ in range(warmup):
+        method, url, kwargs = await entry.build(ctx)
+        await ctx.client.request(method, url, **kwargs)
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    received = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal received
+        # The shared iterator hands out the request budget across workers
+        for _ in remaining:
+            try:
+                method, url, kwargs = await entry.build(ctx)
+                started = time.perf_counter()
+                response = await ctx.client.request(method, url, **kwargs)
+                latencies.append(time.perf_counter() - started)
+            except (httpx.HTTPError, IndexError) as exc:
+                errors[type(exc).__name__] += 1
+                continue
+            statuses[str(response.status_code)] += 1
+            received += len(response.content)
+
+    reset_peak_rss(pid)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    as_ms = lambda seconds: None if seconds is None else round(seconds * 1000, 3)
+    failed = sum(count for status, count in statuses.items() if not status.startswith("2")) + sum(errors.values())
+    return {
+        "route": entry.route,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": failed,
+        "status": dict(statuses),
+        "exceptions": dict(errors),
+        "latency_ms": {
+            "p50": as_ms(percentile(latencies, 0.50)),
+            "p95": as_ms(percentile(latencies, 0.95)),
+            "p99": as_ms(percentile(latencies, 0.99)),
+            "mean": as_ms(sum(latencies) / len(latencies)) if latencies else None,
+            "max": as_ms(latencies[-1]) if latencies else None,
+        },
+        "throughput_rps": round(len(latencies) / wall, 2) if wall > 0 else None,
+        "bytes_per_request": round(received / len(latencies)) if latencies else None,
+        "peak_rss_bytes": peak_rss(pid),
+    }
+
+
+def read_fixture(db_path: str):
+    """Row counts and the IDs of books that can be checked out, read straight from the seeded file"""
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        counts = {
+            table: connection.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+            for table in ("authors", "books", "members", "loans")
+        }
+        available = [row[0] for row in connection.execute("SELECT BookID FROM books WHERE Available = 1")]
+    finally:
+        connection.close()
+    return counts, available
+
+
+def git_revision() -> Dict[str, object]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--", "."], cwd=BACKEND_DIR, capture_output=True, text=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def select_scenarios(patterns: Optional[List[str]], include_network: bool) -> List[Scenario]:
+    return [
+        entry for entry in SCENARIOS
+        if (include_network or not entry.network)
+        and (not patterns or any(fnmatch.fnmatch(entry.name, pattern) for pattern in patterns))
+    ]
+
+
+@asynccontextmanager
+async def open_client(args, db_path: str):
+    if args.url:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+            yield client
+        return
+
+    # DATABASE_URL is read when database.database is first imported, so set it before importing the app
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.pop("READ_DATABASE_URL", None)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from app import app
+
+    # The ASGI transport sends no lifespan events, so run the startup/shutdown hooks here
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            yield client
+    finally:
+        await app.router.shutdown()
+
+
+async def run(args) -> dict:
+    scenarios = select_scenarios(args.endpoints, args.include_network)
+    db_path = os.path.abspath(args.db)
+    counts, available = read_fixture(db_path)
+    workdir = None
+    if not args.url:
+        # Work on a copy, so write scenarios never change the seeded file
+        workdir = tempfile.mkdtemp(prefix="buecheria-bench-")
+        shutil.copyfile(db_path, os.path.join(workdir, "bench.db"))
+        db_path = os.path.join(workdir, "bench.db")
+    pid = args.server_pid if args.url else os.getpid()
+
+    results = {}
+    try:
+        async with open_client(args, db_path) as client:
+            ctx = Context(client=client, rng=random.Random(args.seed), counts=counts, available_books=available)
+            token = await ctx.json("POST", "/api/login", json={"username": "bench", "password": BENCH_PASSWORD})
+            ctx.admin_headers = {"Authorization": f"Bearer {token['access_token']}"}
+            for entry in scenarios:
+                requests = args.heavy_requests if entry.heavy else args.requests
+                concurrency = min(args.concurrency, requests)
+                results[entry.name] = await run_scenario(ctx, entry, requests, concurrency, args.warmup, pid)
+                if not args.quiet:
+                    latency = results[entry.name]["latency_ms"]
+                    print(
+                        f"{entry.name:<24} p50 {latency['p50']} ms  p95 {latency['p95']} ms  "
+                        f"p99 {latency['p99']} ms  {results[entry.name]['throughput_rps']} req/s",
+                        file=sys.stderr,
+                    )
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "mode": "http" if args.url else "in-process",
+            "url": args.url,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "catalogue": counts,
+            "requests": args.requests,
+            "heavy_requests": args.heavy_requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "env": {name: os.environ[name] for name in REPORTED_ENV if name in os.environ},
+        },
+        "endpoints": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the API endpoints")
+    parser.add_argument("--db", required=True, help="database created by benchmarks.seed")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--server-pid", type=int, help="PID of the --url server, for peak RSS")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--heavy-requests", type=int, default=10, help="measured requests per heavy scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--endpoints", nargs="*", help="scenario name patterns, e.g. 'books.*' search")
+    parser.add_argument("--include-network", action="store_true", help="also run scenarios that fetch covers")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--list", action="store_true", help="list the scenarios and exit")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for entry in SCENARIOS:
+            flags = " (heavy)" if entry.heavy else " (network)" if entry.network else ""
+            print(f"{entry.name:<24} {entry.route}{flags}")
+        return
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Seed an SQLite database with a synthetic, reproducible catalogue.
+
+    python -m benchmarks.seed --size 100k --output /tmp/bench-100k.db
+
+The schema comes from the ORM models, so it matches what the app creates.
+Rows are then written straight through sqlite3 `executemany` in large
+transactions, with journaling and fsync switched off. The FTS table and
+its triggers are added once the rows are in, so the search index is
+built in one pass instead of one trigger per book. The same --size,
+--seed and --today always produce the same rows.
+
+Two users are created for the authenticated endpoints:
+- bench / bench (admin)
+- bench-user / bench (user)
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from sqlalchemy import create_engine, text
+
+# Number of books per size; the other tables scale with it
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+BOOKS_PER_AUTHOR = 10
+BOOKS_PER_MEMBER = 20
+LOANS_PER_BOOK = 1
+# Share of loans still open, and of those the share already past DueDate
+OPEN_LOAN_RATE = 0.05
+OVERDUE_RATE = 0.4
+BATCH_SIZE = 50_000
+BENCH_PASSWORD = "bench"
+BENCH_USERS = (("bench", "admin"), ("bench-user", "user"))
+
+GENRES = (
+    "Roman", "Krimi", "Sachbuch", "Fantasy", "Science-Fiction", "Biografie",
+    "Lyrik", "Kinderbuch", "Geschichte", "Philosophie", "Reise", "Kochbuch",
+)
+FIRST_NAMES = (
+    "Anna", "Ben", "Clara", "David", "Emma", "Felix", "Greta", "Hannah", "Ilse", "Jonas",
+    "Karl", "Lena", "Marie", "Noah", "Olga", "Paul", "Rosa", "Simon", "Theo", "Ute",
+)
+LAST_NAMES = (
+    "Albrecht", "Bauer", "Becker", "Braun", "Fischer", "Hartmann", "Hoffmann", "Koch",
+    "Krause", "Lange", "Meyer", "Neumann", "Richter", "Schmidt", "Schneider", "Schulz",
+    "Wagner", "Weber", "Werner", "Wolf", "Zimmermann",
+)
+TITLE_WORDS = (
+    "Nacht", "Stadt", "Meer", "Wald", "Licht", "Schatten", "Reise", "Haus", "Garten",
+    "Winter", "Sommer", "Zeit", "Stimme", "Brief", "Spiegel", "Fluss", "Insel", "Stern",
+    "Weg", "Traum", "Feuer", "Glas", "Vogel", "Berg",
+)
+STREETS = ("Hauptstraße", "Bahnhofstraße", "Gartenweg", "Lindenallee", "Schulstraße", "Kirchplatz")
+
+
+def catalogue_counts(books: int) -> dict:
+    return {
+        "authors": max(1, books // BOOKS_PER_AUTHOR),
+        "books": books,
+        "members": max(1, books // BOOKS_PER_MEMBER),
+        "loans": books * LOANS_PER_BOOK,
+    }
+
+
+def _random_date(rng: random.Random, start: date, days: int) -> str:
+    return (start + timedelta(days=rng.randrange(days))).isoformat()
+
+
+def _isbn13(number: int) -> str:
+    digits = f"978{number:09d}"
+    check = (10 - sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digits)) % 10) % 10
+    return digits + str(check)
+
+
+def generate_authors(rng: random.Random, count: int):
+    for author_id in range(1, count + 1):
+        yield (
+            author_id,
+            rng.choice(LAST_NAMES),
+            rng.choice(FIRST_NAMES),
+            str(rng.randrange(1900, 2000)),
+        )
+
+
+def generate_books(rng: random.Random, count: int, authors: int, loaned: set):
+    for book_id in range(1, count + 1):
+        title = " ".join(rng.sample(TITLE_WORDS, rng.randrange(1, 4)))
+        yield (
+            book_id,
+            f"{title} {book_id}",
+            rng.randrange(1, authors + 1),
+            _isbn13(book_id),
+            _random_date(rng, date(1900, 1, 1), 45_000),
+            rng.choice(GENRES),
+            0 if book_id in loaned else 1,
+        )
+
+
+def generate_members(rng: random.Random, count: int):
+    for member_id in range(1, count + 1):
+        yield (
+            member_id,
+            rng.choice(LAST_NAMES),
+            rng.choice(FIRST_NAMES),
+            f"{rng.choice(STREETS)} {rng.randrange(1, 200)}, {rng.randrange(10000, 99999)} Berlin",
+            f"member{member_id}@example.org",
+            f"+49 30 {rng.randrange(1_000_000, 9_999_999)}",
+            _random_date(rng, date(1940, 1, 1), 25_000),
+            _random_date(rng, date(2010, 1, 1), 5_000),
+            "Admin" if member_id == 1 else "Member",
+        )
+
+
+def plan_loans(rng: random.Random, count: int, books: int, members: int, today: date):
+    """Return the loan rows and the set of books that are currently lent out"""
+    open_loans = int(count * OPEN_LOAN_RATE)
+    open_books = rng.sample(range(1, books + 1), min(open_loans, books))
+    rows = []
+    # Returned loans in the past, then the open ones (one per lent-out book)
+    for _ in range(count - len(open_books)):
+        issued = today - timedelta(days=rng.randrange(30, 3_000))
+        rows.append((
+            rng.randrange(1, books + 1), rng.randrange(1, members + 1),
+            issued, issued + timedelta(days=14), issued + timedelta(days=rng.randrange(1, 28)),
+        ))
+    for book_id in open_books:
+        overdue = rng.random() < OVERDUE_RATE
+        issued = today - timedelta(days=rng.randrange(15, 60) if overdue else rng.randrange(0, 14))
+        rows.append((book_id, rng.randrange(1, members + 1), issued, issued + timedelta(days=14), None))
+    rows.sort(key=lambda row: row[2])
+    loans = (
+        (loan_id, book_id, member_id, issued.isoformat(), due.isoformat(), returned and returned.isoformat())
+        for loan_id, (book_id, member_id, issued, due, returned) in enumerate(rows, start=1)
+    )
+    return loans, set(open_books)
+
+
+def _insert(connection: sqlite3.Connection, table: str, columns, rows):
+    placeholders = ", ".join("?" for _ in columns)
+    statement = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})'
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            connection.executemany(statement, batch)
+            batch = []
+    connection.executemany(statement, batch)
+
+
+def create_schema(path: str):
+    # Imported here so DATABASE_URL can still be set by the caller before database.database loads
+    from database.database import Base
+    from models import analytics, author, book, loan, member, reminder, revocation, user  # noqa: F401 - register all tables
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+
+def finish_schema(path: str):
+    # The search index is built after the bulk insert (its triggers would slow it down),
+    # then the remaining revisions are recorded so the app starts without migrating
+    from database.migrations import migrate
+
+    engine = create_engine(f"sqlite:///{path}")
+    migrate(engine)
+    with engine.connect() as connection:
+        connection.execute(text("ANALYZE"))
+        connection.commit()
+    engine.dispose()
+
+
+def seed(path: str, books: int, seed_value: int = 42, today: date = None) -> dict:
+    """Create `path` from scratch and fill it; returns the row counts"""
+    from auth import hash_password
+
+    today = today or date.today()
+    rng = random.Random(seed_value)
+    counts = catalogue_counts(books)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    create_schema(path)
+
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=OFF")
+    connection.execute("PRAGMA synchronous=OFF")
+    connection.execute("BEGIN")
+    loans, loaned = plan_loans(rng, counts["loans"], books, counts["members"], today)
+    _insert(connection, "authors", ("AuthorID", "LastName", "FirstName", "BirthDate"),
+            generate_authors(rng, counts["authors"]))
+    _insert(connection, "books",
+            ("BookID", "Title", "AuthorID", "Isbn", "PublicationDate", "Genre", "Available"),
+            generate_books(rng, books, counts["authors"], loaned))
+    _insert(connection, "members",
+            ("MemberID", "LastName", "FirstName", "Address", "Email", "Phone", "BirthDate", "JoinDate",
+             "MembershipStatus"),
+            generate_members(rng, counts["members"]))
+    _insert(connection, "loans", ("LoanID", "BookID", "MemberID", "IssueDate", "DueDate", "ReturnDate"), loans)
+    _insert(connection, "users", ("Username", "Password", "Role"),
+            ((username, hash_password(BENCH_PASSWORD), role) for username, role in BENCH_USERS))
+    connection.execute("COMMIT")
+    connection.close()
+
+    finish_schema(path)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a benchmark database")
+    parser.add_argument("--size", default="10k", help=f"one of {', '.join(SIZES)} or a number of books")
+    parser.add_argument("--output", required=True, help="SQLite file to create (replaced if it exists)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--today", type=date.fromisoformat, help="date loans are relative to (default: today)")
+    args = parser.parse_args(argv)
+
+    books = SIZES.get(args.size.lower()) or int(args.size)
+    started = time.perf_counter()
+    counts = seed(args.output, books, args.seed, args.today)
+    elapsed = time.perf_counter() - started
+    summary = ", ".join(f"{count} {table}" for table, count in counts.items())
+    print(f"Seeded {args.output} with {summary} in {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
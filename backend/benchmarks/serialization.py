@@ -0,0 +1,122 @@
+"""
+Compare the ORM and column-select serialization paths of the list routes.
+
+    python -m benchmarks.seed --size 100k --output /tmp/bench-100k.db
+    python -m benchmarks.serialization --db /tmp/bench-100k.db --repeat 3
+
+Runs the full GET /books and GET /loans bodies both ways:
+- "orm": select ORM objects with eager loads, then cache.dump_json
+  against List[BookResponse] / List[LoanResponse]
+- "rows": the column select, record building, TypeAdapter validation and
+  orjson rendering from serialization.py
+
+Each path's query and serialize times are reported separately (best of
+--repeat) as JSON. The run fails if the two bodies differ.
+End to end, `SERIALIZATION_MODE=orm python -m benchmarks.run ...` against a
+default run shows the same difference on the books.list/loans.list scenarios.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def time_path(fetch, render, repeat: int):
+    best = None
+    body = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        data = await fetch()
+        fetched = time.perf_counter()
+        body = render(data)
+        rendered = time.perf_counter()
+        timings = {"query_s": fetched - started, "serialize_s": rendered - fetched, "total_s": rendered - started}
+        if best is None or timings["total_s"] < best["total_s"]:
+            best = timings
+    return {key: round(value, 4) for key, value in best.items()}, body
+
+
+async def run(repeat: int) -> dict:
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from app import app  # noqa: F401 - configures every mapper
+    from cache import dump_json
+    from database.database import AsyncReadSessionLocal, async_engine, async_read_engine
+    from models.book import Book
+    from models.loan import Loan
+    from routers.loans import LOAN_RESPONSE_OPTIONS
+    from schemas.book import BookResponse
+    from schemas.loan import LoanResponse
+    from serialization import (
+        BookRecord, LoanRecord, book_records, book_rows_statement, loan_records, loan_rows_statement,
+        render_records,
+    )
+
+    # The same statement GET /books builds without filters or paging
+    books_query = select(Book).where(Book.AuthorID.isnot(None)).order_by(Book.BookID)
+    cases = {
+        "books": (
+            lambda db: db.scalars(books_query.options(selectinload(Book.author))),
+            lambda result: dump_json(List[BookResponse], result.all()),
+            lambda db: db.execute(book_rows_statement(books_query)),
+            lambda result: render_records(BookRecord, book_records(result)),
+        ),
+        "loans": (
+            lambda db: db.scalars(select(Loan).options(*LOAN_RESPONSE_OPTIONS)),
+            lambda result: dump_json(List[LoanResponse], result.all()),
+            lambda db: db.execute(loan_rows_statement()),
+            lambda result: render_records(LoanRecord, loan_records(result)),
+        ),
+    }
+
+    results = {}
+    try:
+        for name, (orm_fetch, orm_render, rows_fetch, rows_render) in cases.items():
+            async with AsyncReadSessionLocal() as db:
+                orm, orm_body = await time_path(lambda: orm_fetch(db), orm_render, repeat)
+            async with AsyncReadSessionLocal() as db:
+                rows, rows_body = await time_path(lambda: rows_fetch(db), rows_render, repeat)
+            if orm_body != rows_body:
+                raise SystemExit(f"{name}: the ORM and rows bodies differ")
+            results[name] = {
+                "rows": len(json.loads(rows_body)),
+                "bytes": len(rows_body),
+                "orm": orm,
+                "rows_path": rows,
+                "speedup": round(orm["total_s"] / rows["total_s"], 2),
+            }
+            print(f"{name}: orm {orm['total_s']}s, rows {rows['total_s']}s ({results[name]['speedup']}x)",
+                  file=sys.stderr)
+    finally:
+        await async_engine.dispose()
+        await async_read_engine.dispose()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark list serialization paths")
+    parser.add_argument("--db", required=True, help="database created by benchmarks.seed")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    os.environ.pop("READ_DATABASE_URL", None)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    report = {"db": os.path.abspath(args.db), "repeat": args.repeat, "lists": asyncio.run(run(args.repeat))}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Cold-start profile: import-time breakdown and time to first request.
+
+    python -m benchmarks.seed --size 10k --output /tmp/bench.db
+    python -m benchmarks.startup --db /tmp/bench.db --output startup.json
+    python -m benchmarks.startup --db /tmp/bench.db --baseline startup.json --fail-above 15
+
+Each run is a fresh interpreter started against a copy of --db, so nothing
+is shared between runs. The interpreter first imports httpx, which is not
+part of the app, and then times:
+- import_s: `import app`, which includes the schema version check
+- startup_s: the lifespan startup handlers
+- first_request_s: the first response to --path through the ASGI transport
+- time_to_first_request_s: the sum of the three
+
+The report holds the median and max of --runs runs. It also holds one
+extra `python -X importtime` run, broken down into the app's direct
+imports and the slowest modules by self time. With --baseline the exit
+status is 1 when the median time to first request grew by more than
+--fail-above percent.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMINGS = ("import_s", "startup_s", "first_request_s", "time_to_first_request_s")
+
+PROBE = """
+import asyncio, json, sys, time
+import httpx
+
+started = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+
+
+async def first_request():
+    await module.app.router.startup()
+    ready = time.perf_counter()
+    transport = httpx.ASGITransport(app=module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+        response = await client.get(sys.argv[1])
+    answered = time.perf_counter()
+    await module.app.router.shutdown()
+    return ready, answered, response.status_code
+
+
+ready, answered, status = asyncio.run(first_request())
+print(json.dumps({
+    "import_s": imported - started,
+    "startup_s": ready - imported,
+    "first_request_s": answered - ready,
+    "time_to_first_request_s": answered - started,
+    "status": status,
+}))
+"""
+
+
+def _environment(db_path: str) -> Dict[str, str]:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", PYTHONPATH=BACKEND_DIR)
+    env.pop("READ_DATABASE_URL", None)
+    return env
+
+
+def probe(db_path: str, path: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, path], cwd=BACKEND_DIR, env=_environment(db_path),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_profile(db_path: str, top: int) -> dict:
+    """Parse `python -X importtime -c "import app"` into the app's direct imports and the slowest modules"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"], cwd=BACKEND_DIR,
+        env=_environment(db_path), capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = (part for part in line.replace("import time:", "|", 1).split("|"))
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append({"module": name.strip(), "depth": depth,
+                        "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+
+    app_entry = next(module for module in modules if module["module"] == "app" and module["depth"] == 0)
+    # importtime lists a module's imports before the module itself
+    app_index = modules.index(app_entry)
+    start = app_index
+    while start > 0 and modules[start - 1]["depth"] > 0:
+        start -= 1
+    direct = [module for module in modules[start:app_index] if module["depth"] == 1]
+    return {
+        "total_ms": app_entry["cumulative_ms"],
+        "app_self_ms": app_entry["self_ms"],
+        "direct_imports": sorted(
+            ({"module": module["module"], "cumulative_ms": module["cumulative_ms"]} for module in direct),
+            key=lambda module: -module["cumulative_ms"],
+        ),
+        "slowest_self": sorted(
+            ({"module": module["module"], "self_ms": module["self_ms"]} for module in modules),
+            key=lambda module: -module["self_ms"],
+        )[:top],
+    }
+
+
+def summarize(runs: List[dict]) -> dict:
+    return {
+        key: {
+            "median_ms": round(statistics.median(run[key] for run in runs) * 1000, 1),
+            "max_ms": round(max(run[key] for run in runs) * 1000, 1),
+        }
+        for key in TIMINGS
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the app's cold start")
+    parser.add_argument("--db", required=True, help="database created by benchmarks.seed")
+    parser.add_argument("--runs", type=int, default=7, help="fresh interpreters to time")
+    parser.add_argument("--path", default="/api/books?limit=20", help="the first request")
+    parser.add_argument("--top", type=int, default=25, help="modules listed by self time")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="an earlier report to compare time to first request with")
+    parser.add_argument("--fail-above", type=float, default=10.0, help="allowed growth over --baseline, percent")
+    args = parser.parse_args(argv)
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from benchmarks.run import git_revision
+
+    workdir = tempfile.mkdtemp(prefix="buecheria-startup-")
+    try:
+        db_path = os.path.join(workdir, "startup.db")
+        shutil.copyfile(args.db, db_path)
+        # The first run also brings an older database to the current schema; it is not timed
+        probe(db_path, args.path)
+        runs = [probe(db_path, args.path) for _ in range(args.runs)]
+        profile = import_profile(db_path, args.top)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "db": os.path.abspath(args.db),
+            "path": args.path,
+            "runs": args.runs,
+            "statuses": sorted({run["status"] for run in runs}),
+        },
+        "timings": summarize(runs),
+        "imports": profile,
+    }
+    for key, value in report["timings"].items():
+        print(f"{key:<24} median {value['median_ms']} ms, max {value['max_ms']} ms", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        before = baseline["timings"]["time_to_first_request_s"]["median_ms"]
+        after = report["timings"]["time_to_first_request_s"]["median_ms"]
+        delta = (after - before) / before * 100
+        print(f"time to first request: {before} -> {after} ms ({delta:+.1f}%)", file=sys.stderr)
+        if delta > args.fail_above:
+            print(f"regression: time to first request grew more than {args.fail_above}%", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
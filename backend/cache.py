@@ -0,0 +1,318 @@
+"""
+Response cache for the read endpoints.
+
+Serialized JSON bodies are stored per route path and query string. Each
+cached route declares the entities it reads (e.g. books embed authors, so
+the book routes depend on ("books", "authors")). Every entity table has a
+monotonically increasing version that is part of the cache key; write
+handlers call `response_cache.invalidate(...)` to bump it, which makes all
+entries that depend on that entity unreachable at once.
+
+The same versions drive conditional GETs: responses carry an ETag and
+Last-Modified derived from them, and a matching If-None-Match is answered
+with 304 before any query runs.
+
+Backends (chosen with RESPONSE_CACHE_BACKEND):
+- "memory": in-process LRU bounded by RESPONSE_CACHE_MAX_BYTES (default
+  with a single worker)
+- "sqlite": a shared SQLite file at RESPONSE_CACHE_PATH, so several
+  uvicorn/gunicorn workers see the same entries and invalidations
+  (default with more than one worker)
+- "none": bodies are not stored; versions are still kept in-process so
+  ETags keep working
+
+"memory" and "none" keep the versions in one process, so with several
+workers a write would not invalidate the other workers' entries and ETags.
+They are refused when the server is configured with more than one worker
+(see configured_workers).
+"""
+import argparse
+import json
+import os
+import secrets
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+CachedResponse = Tuple[bytes, Dict[str, str]]
+# (version, unix time of the last bump) for one entity table
+Version = Tuple[int, float]
+
+
+class MemoryCacheBackend:
+    """Thread-safe in-process LRU cache bounded by total body size"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._size = 0
+        self._versions: Dict[str, Version] = {}
+        self._lock = threading.Lock()
+        # Versions restart at 0 with the process, so ETags are scoped to this epoch
+        self.epoch = secrets.token_hex(4)
+        self.started_at = time.time()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, body: bytes, headers: Dict[str, str]):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[0])
+            self._entries[key] = (body, dict(headers))
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (evicted_body, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted_body)
+
+    def versions(self, names: Iterable[str]) -> Dict[str, Version]:
+        with self._lock:
+            return {name: self._versions.get(name, (0, self.started_at)) for name in names}
+
+    def bump(self, names: Iterable[str]):
+        now = time.time()
+        with self._lock:
+            for name in names:
+                version, _ = self._versions.get(name, (0, now))
+                self._versions[name] = (version + 1, now)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class SQLiteCacheBackend:
+    """Cache stored in a separate SQLite file that all worker processes share.
+
+    Entries are evicted oldest-first once their total size exceeds max_bytes.
+    """
+
+    # Run the size-bound eviction once every this many writes
+    PRUNE_EVERY = 50
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, body BLOB NOT NULL, headers TEXT NOT NULL, "
+                "size INTEGER NOT NULL, stored_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_entries_stored_at ON entries (stored_at)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS versions ("
+                "name TEXT PRIMARY KEY, version INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            # The epoch is created with the file: if the file is deleted the
+            # versions restart, but ETags issued before can no longer match
+            connection.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?), ('started_at', ?)",
+                (secrets.token_hex(4), repr(time.time())),
+            )
+            meta = dict(connection.execute("SELECT key, value FROM meta"))
+        self.epoch = meta["epoch"]
+        self.started_at = float(meta["started_at"])
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        row = self._connection().execute(
+            "SELECT body, headers FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return bytes(row[0]), json.loads(row[1])
+
+    def set(self, key: str, body: bytes, headers: Dict[str, str]):
+        if len(body) > self.max_bytes:
+            return
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO entries (key, body, headers, size, stored_at) VALUES (?, ?, ?, ?, ?)",
+            (key, body, json.dumps(headers), len(body), time.time()),
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune(connection)
+
+    def _prune(self, connection: sqlite3.Connection):
+        connection.execute(
+            "DELETE FROM entries WHERE stored_at <= ("
+            "  SELECT stored_at FROM ("
+            "    SELECT stored_at, SUM(size) OVER (ORDER BY stored_at DESC) AS running FROM entries"
+            "  ) WHERE running > ? ORDER BY stored_at DESC LIMIT 1"
+            ")",
+            (self.max_bytes,),
+        )
+
+    def versions(self, names: Iterable[str]) -> Dict[str, Version]:
+        names = list(names)
+        placeholders = ", ".join("?" for _ in names)
+        rows = self._connection().execute(
+            f"SELECT name, version, updated_at FROM versions WHERE name IN ({placeholders})", names
+        ).fetchall()
+        found = {name: (version, updated_at) for name, version, updated_at in rows}
+        return {name: found.get(name, (0, self.started_at)) for name in names}
+
+    def bump(self, names: Iterable[str]):
+        connection = self._connection()
+        now = time.time()
+        for name in names:
+            connection.execute(
+                "INSERT INTO versions (name, version, updated_at) VALUES (?, 1, ?) "
+                "ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+                (name, now),
+            )
+
+    def clear(self):
+        self._connection().execute("DELETE FROM entries")
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_type) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+
+def dump_json(response_type, data) -> bytes:
+    """Validate ORM objects against a response model type and render them as JSON bytes"""
+    adapter = _adapter(response_type)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" refer to the same representation here
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def invalidate(self, *entities: str):
+        """Bump the versions of the given entities, retiring every cached response and ETag that depends on them"""
+        self.backend.bump(entities)
+
+    async def respond(
+        self,
+        request: Request,
+        entities: Tuple[str, ...],
+        response_type,
+        build: Callable[[Dict[str, str]], Awaitable[object]],
+        variant: str = "",
+    ) -> Response:
+        """Serve the JSON for this request as 304, from the cache, or build, serialize and store it.
+
+        `await build(headers)` returns the ORM objects to serialize as `response_type`,
+        or the already rendered JSON bytes, and may add response headers (e.g. the
+        next-page cursor) to `headers`. `variant` goes into the ETag and the cache key;
+        set it when the body depends on more than the URL and the entity versions
+        (e.g. a period that ends today).
+        """
+        # Snapshot versions before building: a write that lands meanwhile
+        # bumps them, so the entry stored below is never served afterwards.
+        versions = self.backend.versions(entities)
+        etag = '"{}-{}{}"'.format(
+            self.backend.epoch,
+            ".".join(str(versions[name][0]) for name in entities),
+            f"-{variant}" if variant else "",
+        )
+        validators = {
+            "ETag": etag,
+            "Last-Modified": formatdate(max(updated_at for _, updated_at in versions.values()), usegmt=True),
+            # Let browsers keep the body but revalidate it on every poll
+            "Cache-Control": "no-cache",
+        }
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=validators)
+
+        key = "|".join([
+            request.url.path,
+            "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items())),
+            etag,
+        ])
+        cached = self.backend.get(key)
+        if cached is not None:
+            body, headers = cached
+            return Response(content=body, media_type="application/json", headers={**headers, **validators})
+
+        headers: Dict[str, str] = {}
+        data = await build(headers)
+        body = data if isinstance(data, bytes) else dump_json(response_type, data)
+        self.backend.set(key, body, headers)
+        return Response(content=body, media_type="application/json", headers={**headers, **validators})
+
+
+def configured_workers(argv: Optional[List[str]] = None, environ: Optional[Mapping[str, str]] = None) -> int:
+    """Worker processes the server was started with: --workers/-w on a uvicorn or gunicorn
+    command line (their workers inherit it), else WEB_CONCURRENCY, which both use as the default"""
+    argv = sys.argv if argv is None else argv
+    environ = os.environ if environ is None else environ
+    if argv and any(server in os.path.basename(os.path.dirname(argv[0])) + os.path.basename(argv[0])
+                    for server in ("uvicorn", "gunicorn")):
+        parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+        parser.add_argument("-w", "--workers", type=int)
+        try:
+            workers = parser.parse_known_args(argv[1:])[0].workers
+        except SystemExit:
+            workers = None
+        if workers is not None:
+            return workers
+    return int(environ.get("WEB_CONCURRENCY") or 1)
+
+
+def create_backend_from_env():
+    """Build the cache backend selected by the RESPONSE_CACHE_* environment variables"""
+    workers = configured_workers()
+    kind = os.environ.get("RESPONSE_CACHE_BACKEND", "sqlite" if workers > 1 else "memory").lower()
+    max_bytes = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    if kind in ("memory", "none") and workers > 1:
+        raise ValueError(
+            f"RESPONSE_CACHE_BACKEND={kind} keeps cache versions per process and would serve stale "
+            f"responses with {workers} workers; use RESPONSE_CACHE_BACKEND=sqlite"
+        )
+    if kind == "none":
+        return MemoryCacheBackend(max_bytes=0)
+    if kind == "sqlite":
+        path = os.environ.get(
+            "RESPONSE_CACHE_PATH",
+            os.path.join(tempfile.gettempdir(), "buecheria_response_cache.db"),
+        )
+        return SQLiteCacheBackend(path, max_bytes=max_bytes)
+    if kind == "memory":
+        return MemoryCacheBackend(max_bytes=max_bytes)
+    raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {kind}")
+
+
+response_cache = ResponseCache(create_backend_from_env())
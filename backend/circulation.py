@@ -0,0 +1,113 @@
+"""
+Loan checkout and return, each in one short transaction.
+
+A checkout claims the books with a conditional
+`UPDATE books SET Available = false WHERE ... AND Available = true` before
+inserting the loans, so two desks checking out the same copy at once can't
+both succeed: the second UPDATE matches no row and the request fails with
+409. The UPDATE runs first so that SQLite takes its write lock up front
+instead of upgrading a read transaction later. A return marks the loan
+returned and the book available in the same way.
+
+The loaded book, author and member objects are attached to the new loans,
+so the response is serialized without reloading anything after the commit.
+"""
+import os
+from dataclasses import replace
+from datetime import date, timedelta
+from typing import List, Optional, Sequence
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from models.book import Book
+from models.loan import Loan
+from models.member import Member
+from analytics import NO_GENRE, LoanState, record_change
+
+# Loan period used when a checkout gives no DueDate
+LOAN_PERIOD_DAYS = int(os.getenv("LOAN_PERIOD_DAYS", "14"))
+
+
+async def checkout_books(
+    db: AsyncSession,
+    member_id: int,
+    book_ids: Sequence[int],
+    loan_date: Optional[date] = None,
+    due_date: Optional[date] = None,
+) -> List[Loan]:
+    """Lend all `book_ids` to the member, or none of them"""
+    loan_date = loan_date or date.today()
+    due_date = due_date or loan_date + timedelta(days=LOAN_PERIOD_DAYS)
+    if due_date < loan_date:
+        raise HTTPException(status_code=400, detail="DueDate must not be before LoanDate")
+    book_ids = list(dict.fromkeys(book_ids))
+
+    claimed = set(
+        (await db.scalars(
+            update(Book)
+            .where(Book.BookID.in_(book_ids), Book.Available.is_(True))
+            .values(Available=False)
+            .returning(Book.BookID)
+        )).all()
+    )
+    if len(claimed) < len(book_ids):
+        await db.rollback()
+        existing = set((await db.scalars(select(Book.BookID).where(Book.BookID.in_(book_ids)))).all())
+        missing = [book_id for book_id in book_ids if book_id not in existing]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Books not found: {', '.join(map(str, missing))}")
+        unavailable = [book_id for book_id in book_ids if book_id not in claimed]
+        raise HTTPException(status_code=409, detail=f"Books not available: {', '.join(map(str, unavailable))}")
+
+    member = await db.get(Member, member_id)
+    if member is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Member not found")
+
+    books = (await db.scalars(
+        select(Book).options(joinedload(Book.author)).where(Book.BookID.in_(book_ids))
+        .execution_options(populate_existing=True)
+    )).all()
+    books_by_id = {book.BookID: book for book in books}
+    loans = [
+        Loan(book=books_by_id[book_id], member=member, IssueDate=loan_date, DueDate=due_date)
+        for book_id in book_ids
+    ]
+    db.add_all(loans)
+    await db.commit()
+    return loans
+
+
+async def return_loan(db: AsyncSession, loan_id: int, return_date: Optional[date] = None) -> Loan:
+    """Mark the loan returned and its book available again"""
+    return_date = return_date or date.today()
+    returned = (await db.execute(
+        update(Loan)
+        .where(Loan.LoanID == loan_id, Loan.ReturnDate.is_(None))
+        .values(ReturnDate=return_date)
+        .returning(Loan.BookID, Loan.MemberID, Loan.IssueDate)
+    )).first()
+    if returned is None:
+        await db.rollback()
+        if await db.get(Loan, loan_id) is None:
+            raise HTTPException(status_code=404, detail="Loan not found")
+        raise HTTPException(status_code=409, detail="Loan already returned")
+
+    genre = None
+    if returned.BookID is not None:
+        genre = (await db.execute(
+            update(Book).where(Book.BookID == returned.BookID).values(Available=True).returning(Book.Genre)
+        )).scalar()
+
+    # A Core UPDATE passes the Loan mapper events by, so the rollups are updated here
+    state = LoanState(returned.IssueDate, None, returned.BookID, returned.MemberID, genre or NO_GENRE)
+    await db.run_sync(lambda session: record_change(session.connection(), state, replace(state, ReturnDate=return_date)))
+    loan = (await db.scalars(
+        select(Loan)
+        .options(joinedload(Loan.book).joinedload(Book.author), joinedload(Loan.member))
+        .where(Loan.LoanID == loan_id)
+        .execution_options(populate_existing=True)
+    )).first()
+    await db.commit()
+    return loan
@@ -0,0 +1,233 @@
+"""
+Book-cover thumbnails served from a local, content-addressed disk cache.
+
+The first request for a book's cover downloads the source image, which is
+the book's CoverUrl or else the Open Library cover for its ISBN. That
+image is resized once into every size in COVER_SIZES, and the results are
+stored as
+
+    <COVER_CACHE_DIR>/<sha256 of source bytes>[:2]/<sha256>-<size>.jpg
+
+A small index file per source URL records which digest it resolved to, so
+later requests never touch the network. Sources that can't be fetched are
+remembered for MISSING_RETRY_SECONDS before being tried again.
+Concurrent requests for the same source share one download.
+
+COVER_ORIGIN replaces the Open Library host, e.g. with a local fixture server.
+
+CoverUrl is supplied by clients, so downloads are restricted to http(s)
+and to public addresses: every connection, redirects included, resolves the
+host first and refuses loopback, private, link-local and other non-global
+addresses. Only the COVER_ORIGIN host, which the operator configures, is
+exempt. Proxy environment variables are not used for cover downloads.
+"""
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+# Thumbnail bounding boxes (width, height); covers keep their aspect ratio
+COVER_SIZES = {
+    "small": (64, 96),
+    "medium": (240, 360),
+    "large": (480, 720),
+}
+COVER_ORIGIN = os.environ.get("COVER_ORIGIN", "https://covers.openlibrary.org").rstrip("/")
+COVER_CACHE_DIR = os.environ.get(
+    "COVER_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "covers")
+)
+# Browsers may reuse a thumbnail for this long without asking again
+COVER_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+MISSING_RETRY_SECONDS = 24 * 60 * 60
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT_SECONDS = 10
+MISSING = "missing"
+FETCH_SCHEMES = ("http", "https")
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def cover_source_url(cover_url: Optional[str], isbn: Optional[str]) -> Optional[str]:
+    """The image a book's cover is made from, as the frontend chose it before"""
+    if cover_url:
+        return cover_url
+    normalized = re.sub(r"[^0-9X]", "", (isbn or "").upper())
+    if not normalized:
+        return None
+    return f"{COVER_ORIGIN}/b/isbn/{normalized}-L.jpg?default=false"
+
+
+def _thumbnail_path(digest: str, size: str) -> str:
+    return os.path.join(COVER_CACHE_DIR, digest[:2], f"{digest}-{size}.jpg")
+
+
+def _index_path(source_url: str) -> str:
+    return os.path.join(COVER_CACHE_DIR, "sources", hashlib.sha256(source_url.encode()).hexdigest())
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(path), delete=False) as handle:
+        handle.write(data)
+    os.replace(handle.name, path)
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def _connect_public(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """socket.create_connection that refuses hosts resolving to non-public addresses"""
+    host, port = address
+    if host.lower() == urlsplit(COVER_ORIGIN).hostname:
+        return socket.create_connection(address, timeout, source_address)
+    candidates = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    refused = [sockaddr[0] for *_, sockaddr in candidates if not _is_public(sockaddr[0])]
+    if refused:
+        raise OSError(f"Refusing to fetch a cover from {host} ({refused[0]})")
+    # Connect to the addresses just checked, not to a second lookup of the name
+    error = OSError(f"Could not connect to {host}")
+    for family, type_, proto, _, sockaddr in candidates:
+        sock = socket.socket(family, type_, proto)
+        try:
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as exc:
+            error = exc
+            sock.close()
+    raise error
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _connect_public
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _connect_public
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _WebRedirectHandler(urllib.request.HTTPRedirectHandler):
+    max_redirections = 3
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if urlsplit(newurl).scheme.lower() not in FETCH_SCHEMES:
+            return None
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def _build_opener() -> urllib.request.OpenerDirector:
+    # Unlike urllib.request.build_opener: no file:, ftp:, data: or proxy handlers
+    opener = urllib.request.OpenerDirector()
+    for handler in (
+        _PublicHTTPHandler(),
+        _PublicHTTPSHandler(),
+        _WebRedirectHandler(),
+        urllib.request.HTTPDefaultErrorHandler(),
+        urllib.request.HTTPErrorProcessor(),
+    ):
+        opener.add_handler(handler)
+    return opener
+
+
+_opener = _build_opener()
+
+
+def _fetch(source_url: str) -> Optional[bytes]:
+    if urlsplit(source_url).scheme.lower() not in FETCH_SCHEMES:
+        return None
+    request = urllib.request.Request(source_url, headers={"User-Agent": "buecheria-covers/1.0"})
+    try:
+        with _opener.open(request, timeout=FETCH_TIMEOUT_SECONDS) as resp:
+            data = resp.read(MAX_SOURCE_BYTES + 1)
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+    return data if data and len(data) <= MAX_SOURCE_BYTES else None
+
+
+def _render_thumbnails(source: bytes, digest: str) -> bool:
+    # Pillow is imported with the first cover that has to be rendered, not at startup
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(io.BytesIO(source)) as image:
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            for size, box in COVER_SIZES.items():
+                thumbnail = image.copy()
+                thumbnail.thumbnail(box, Image.LANCZOS)
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, "JPEG", quality=82, optimize=True, progressive=True)
+                _write_atomic(_thumbnail_path(digest, size), buffer.getvalue())
+    except (OSError, Image.DecompressionBombError):
+        return False
+    return True
+
+
+def _read_index(index_path: str, size: str) -> Optional[str]:
+    """The digest (or MISSING) recorded for a source, or None if it has to be fetched (again)"""
+    try:
+        with open(index_path) as handle:
+            entry = handle.read().strip()
+    except OSError:
+        return None
+    if entry == MISSING:
+        if time.time() - os.path.getmtime(index_path) > MISSING_RETRY_SECONDS:
+            return None
+    elif not os.path.exists(_thumbnail_path(entry, size)):
+        # Thumbnails were cleaned up; render them again
+        return None
+    return entry
+
+
+def get_cover_thumbnail(source_url: str, size: str) -> Optional[str]:
+    """Return the path of the `size` thumbnail for `source_url`, creating it if needed (blocking)"""
+    index_path = _index_path(source_url)
+    entry = _read_index(index_path, size)
+    if entry is None:
+        with _locks_guard:
+            lock = _locks.setdefault(index_path, threading.Lock())
+        with lock:
+            # Another request may have finished the download while we waited
+            entry = _read_index(index_path, size)
+            if entry is None:
+                source = _fetch(source_url)
+                digest = hashlib.sha256(source).hexdigest() if source else None
+                if digest is None or not _render_thumbnails(source, digest):
+                    digest = MISSING
+                _write_atomic(index_path, digest.encode())
+                entry = digest
+        with _locks_guard:
+            _locks.pop(index_path, None)
+
+    return None if entry == MISSING else _thumbnail_path(entry, size)
@@ -0,0 +1,156 @@
+"""
+Index revision for existing databases.
+
+`Base.metadata.create_all` only creates indexes together with a new table,
+so databases created before an index change keep their old set.
+`sync_indexes` brings a database in line with the models:
+- drops the indexes in OBSOLETE_INDEXES. These are single-column indexes
+  no query uses, indexes duplicating the primary key, and indexes made
+  redundant by a composite one.
+- creates every index declared on the models that is missing
+  (ADDED_INDEXES and any other new ones)
+- refreshes the planner statistics on SQLite, since SQLite only picks
+  partial and composite indexes reliably with them
+
+    python -m database.indexes              # apply to DATABASE_URL
+    python -m database.indexes --dry-run    # only list the changes
+    python -m database.indexes --downgrade  # restore the previous index set
+
+Migration revision 4 (database/migrations.py) applies the same changes.
+`python -m benchmarks.indexes` measures both sets: query plans, query
+times and write throughput.
+"""
+import argparse
+from typing import Dict, List, Tuple
+from sqlalchemy import inspect, text
+from database.database import Base
+
+# Indexes removed by this revision: name -> (table, columns, unique)
+OBSOLETE_INDEXES: Dict[str, Tuple[str, Tuple[str, ...], bool]] = {
+    # Duplicates of the primary key (the rowid on SQLite)
+    "ix_authors_AuthorID": ("authors", ("AuthorID",), True),
+    "ix_books_BookID": ("books", ("BookID",), True),
+    "ix_members_MemberID": ("members", ("MemberID",), False),
+    "ix_loans_LoanID": ("loans", ("LoanID",), False),
+    "ix_users_UserID": ("users", ("UserID",), False),
+    "ix_reminder_jobs_JobID": ("reminder_jobs", ("JobID",), False),
+    # Never filtered or sorted on
+    "ix_authors_LastName": ("authors", ("LastName",), False),
+    "ix_authors_FirstName": ("authors", ("FirstName",), False),
+    "ix_authors_BirthDate": ("authors", ("BirthDate",), False),
+    "ix_members_LastName": ("members", ("LastName",), False),
+    "ix_members_FirstName": ("members", ("FirstName",), False),
+    "ix_members_Address": ("members", ("Address",), False),
+    "ix_members_Phone": ("members", ("Phone",), False),
+    "ix_members_BirthDate": ("members", ("BirthDate",), False),
+    "ix_members_JoinDate": ("members", ("JoinDate",), False),
+    "ix_users_Role": ("users", ("Role",), False),
+    "ix_loans_IssueDate": ("loans", ("IssueDate",), False),
+    # Open-loan queries use the partial indexes; returned loans are only read by member or book
+    "ix_loans_DueDate": ("loans", ("DueDate",), False),
+    "ix_loans_ReturnDate": ("loans", ("ReturnDate",), False),
+    # Leading columns of a composite index (ix_books_Genre stays: it keeps BookID order)
+    "ix_books_Available": ("books", ("Available",), False),
+    "ix_loans_MemberID": ("loans", ("MemberID",), False),
+    "ix_reminder_jobs_LoanID": ("reminder_jobs", ("LoanID",), False),
+}
+
+# Indexes introduced by this revision (dropped again by downgrade)
+ADDED_INDEXES = ("ix_books_genre_available_title", "ix_loans_member_return", "ix_loans_open_book")
+
+
+def _existing_indexes(connection, table: str) -> List[str]:
+    return [index["name"] for index in inspect(connection).get_indexes(table)]
+
+
+def plan_changes(connection) -> Tuple[List[str], list]:
+    """Return (obsolete index names to drop, model Index objects to create)"""
+    existing_tables = set(inspect(connection).get_table_names())
+    drop, create = [], []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = set(_existing_indexes(connection, table.name))
+        drop.extend(
+            name for name, (table_name, _, _) in OBSOLETE_INDEXES.items()
+            if table_name == table.name and name in existing
+        )
+        create.extend(index for index in table.indexes if index.name not in existing)
+    return drop, create
+
+
+def _analyze(connection):
+    if connection.dialect.name in ("sqlite", "postgresql"):
+        connection.execute(text("ANALYZE"))
+
+
+def apply_index_changes(connection, dry_run: bool = False) -> Tuple[List[str], List[str]]:
+    """Drop obsolete indexes and create missing model indexes on `connection` without committing;
+    returns (dropped, created) names"""
+    drop, create = plan_changes(connection)
+    if not dry_run and (drop or create):
+        for name in drop:
+            connection.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+        for index in create:
+            index.create(bind=connection)
+        _analyze(connection)
+    return drop, [index.name for index in create]
+
+
+def sync_indexes(engine, dry_run: bool = False) -> Tuple[List[str], List[str]]:
+    """apply_index_changes in a transaction of its own"""
+    with engine.connect() as connection:
+        changes = apply_index_changes(connection, dry_run=dry_run)
+        connection.commit()
+    return changes
+
+
+def downgrade_indexes(engine) -> Tuple[List[str], List[str]]:
+    """Restore the index set from before this revision; returns (dropped, created) names"""
+    dropped, created = [], []
+    with engine.connect() as connection:
+        existing_tables = set(inspect(connection).get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = set(_existing_indexes(connection, table.name))
+            for index in table.indexes:
+                if index.name in ADDED_INDEXES and index.name in existing:
+                    connection.execute(text(f'DROP INDEX IF EXISTS "{index.name}"'))
+                    dropped.append(index.name)
+            for name, (table_name, columns, unique) in OBSOLETE_INDEXES.items():
+                if table_name == table.name and name not in existing:
+                    quoted = ", ".join(f'"{column}"' for column in columns)
+                    kind = "UNIQUE INDEX" if unique else "INDEX"
+                    connection.execute(text(f'CREATE {kind} "{name}" ON {table_name} ({quoted})'))
+                    created.append(name)
+        if dropped or created:
+            _analyze(connection)
+        connection.commit()
+    return dropped, created
+
+
+def main(argv=None):
+    from database.database import engine
+    from models import analytics, author, book, loan, member, reminder, revocation, user  # noqa: F401 - register all tables
+
+    parser = argparse.ArgumentParser(description="Bring the database indexes in line with the models")
+    parser.add_argument("--dry-run", action="store_true", help="list the changes without applying them")
+    parser.add_argument("--downgrade", action="store_true", help="restore the index set from before this revision")
+    args = parser.parse_args(argv)
+
+    if args.downgrade:
+        dropped, created = downgrade_indexes(engine)
+    else:
+        dropped, created = sync_indexes(engine, dry_run=args.dry_run)
+    prefix = "would " if args.dry_run else ""
+    for name in dropped:
+        print(f"{prefix}drop   {name}")
+    for name in created:
+        print(f"{prefix}create {name}")
+    if not dropped and not created:
+        print("Indexes are up to date")
+
+
+if __name__ == "__main__":
+    main()
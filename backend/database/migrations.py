@@ -0,0 +1,224 @@
+"""
+Versioned schema migrations.
+
+Schema changes are numbered revisions in MIGRATIONS. The `schema_migrations`
+table records each one that has been applied, so at startup a worker only
+reads the highest applied version and compares it with HEAD (one indexed
+SELECT, however many revisions exist). DDL runs only when the database is
+behind, and then only in one process at a time:
+
+- `migrate` takes a database-wide lock first: BEGIN IMMEDIATE on SQLite
+  (the write lock), pg_advisory_xact_lock on PostgreSQL. It re-reads the
+  version under the lock, so a worker that waited on another one finds
+  nothing left to do.
+- the pending revisions and their version rows are committed in that one
+  transaction, so a failing revision leaves the schema untouched
+
+Run the migrations before deploying:
+
+    cd backend
+    python -m database.migrations           # apply pending revisions
+    python -m database.migrations --status  # show the current and pending revisions
+
+With MIGRATE_ON_STARTUP=0 a worker that finds the database behind refuses
+to start instead of migrating it. The default (1) lets the first worker
+migrate, which keeps a fresh checkout working without the extra step.
+
+Revision 1 creates the tables as the models currently declare them, so a
+new database already has the columns and indexes of later revisions. Those
+revisions therefore check what exists before altering anything. The same
+checks let databases created before this module existed (with no
+`schema_migrations` table) be brought to HEAD.
+"""
+import argparse
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from database.database import Base
+from database.indexes import apply_index_changes
+from database.search import ensure_search_index
+
+VERSION_TABLE = "schema_migrations"
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
+# How long a worker waits for another one's migration before giving up
+LOCK_TIMEOUT_SECONDS = int(os.getenv("MIGRATION_LOCK_TIMEOUT", "300"))
+# Any constant shared by all workers; names the PostgreSQL advisory lock
+ADVISORY_LOCK_KEY = 0x62756563
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable  # called with the locked Connection; must not commit
+
+
+def import_models():
+    # Every model has to be imported for its table to be in Base.metadata
+    # and for the ORM relationships to resolve
+    from models import analytics, author, book, loan, member, reminder, revocation, user  # noqa: F401
+
+
+def _create_tables(connection):
+    import_models()
+    Base.metadata.create_all(bind=connection)
+
+
+def _add_books_cover_url(connection):
+    column_names = {column["name"] for column in inspect(connection).get_columns("books")}
+    if "CoverUrl" not in column_names:
+        # Quoted so the mixed-case name matches the ORM column on PostgreSQL too
+        connection.execute(text('ALTER TABLE books ADD COLUMN "CoverUrl" VARCHAR'))
+
+
+def _add_loan_history_indexes(connection):
+    # Keyset pages of /members/{id}/loans and /books/{id}/loans; ix_loans_book_issue
+    # also covers the lookups by BookID alone that ix_loans_BookID served
+    from models.loan import Loan
+
+    existing = {index["name"] for index in inspect(connection).get_indexes("loans")}
+    for index in Loan.__table__.indexes:
+        if index.name in ("ix_loans_member_issue", "ix_loans_book_issue") and index.name not in existing:
+            index.create(bind=connection)
+    connection.execute(text('DROP INDEX IF EXISTS "ix_loans_BookID"'))
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("ANALYZE loans"))
+
+
+def _add_loan_rollups(connection):
+    # Daily rollup tables behind the analytics reports, filled from the existing loans
+    from analytics import ROLLUP_MODELS, rebuild_rollups
+
+    import_models()
+    Base.metadata.create_all(bind=connection, tables=[model.__table__ for model in ROLLUP_MODELS])
+    rebuild_rollups(connection)
+
+
+def _add_token_revocations(connection):
+    # Revocations shared by all workers instead of each worker's memory (see auth.py)
+    from models.revocation import TokenRevocation
+
+    TokenRevocation.__table__.create(bind=connection, checkfirst=True)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create tables", _create_tables),
+    Migration(2, "books.CoverUrl column", _add_books_cover_url),
+    Migration(3, "books_fts search index and triggers", ensure_search_index),
+    Migration(4, "index revision (database/indexes.py)", apply_index_changes),
+    Migration(5, "loan history indexes", _add_loan_history_indexes),
+    Migration(6, "daily loan rollups (analytics.py)", _add_loan_rollups),
+    Migration(7, "token_revocations table", _add_token_revocations),
+    # Revision 3 left PostgreSQL without an index; ensure_search_index now builds one there
+    Migration(8, "books_fts search table on PostgreSQL", ensure_search_index),
+]
+HEAD = MIGRATIONS[-1].version
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def _create_version_table(connection):
+    connection.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ('
+        '"Version" INTEGER PRIMARY KEY, "Name" VARCHAR NOT NULL, "AppliedAt" TIMESTAMP NOT NULL)'
+    ))
+
+
+def _read_version(connection) -> int:
+    return connection.execute(text(f'SELECT MAX("Version") FROM {VERSION_TABLE}')).scalar() or 0
+
+
+def current_version(engine) -> int:
+    """The highest applied revision, 0 for a database that has never been migrated"""
+    with engine.connect() as connection:
+        try:
+            return _read_version(connection)
+        except (OperationalError, ProgrammingError):
+            # No version table yet
+            connection.rollback()
+            return 0
+
+
+def _lock(connection, deadline: float):
+    """Take the migration lock inside the connection's transaction"""
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+    elif dialect == "sqlite":
+        # Waits busy_timeout per attempt; a long migration elsewhere can outlast that
+        while True:
+            try:
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+                return
+            except OperationalError as exc:
+                if "locked" not in str(exc) or time.monotonic() > deadline:
+                    raise
+                connection.rollback()
+                time.sleep(0.5)
+
+
+def migrate(engine, target: Optional[int] = None) -> List[Migration]:
+    """Apply the pending revisions up to `target` (default HEAD) under the migration lock;
+    returns the revisions this call applied"""
+    target = HEAD if target is None else target
+    deadline = time.monotonic() + LOCK_TIMEOUT_SECONDS
+    with engine.connect() as connection:
+        _lock(connection, deadline)
+        _create_version_table(connection)
+        version = _read_version(connection)
+        pending = [migration for migration in MIGRATIONS if version < migration.version <= target]
+        for migration in pending:
+            migration.apply(connection)
+            connection.execute(
+                text(f'INSERT INTO {VERSION_TABLE} ("Version", "Name", "AppliedAt") VALUES (:version, :name, :at)'),
+                {"version": migration.version, "name": migration.name, "at": time.strftime("%Y-%m-%d %H:%M:%S")},
+            )
+        connection.commit()
+    return pending
+
+
+def prepare_schema(engine):
+    """Startup check: return at once when the database is at HEAD, otherwise migrate it
+    (MIGRATE_ON_STARTUP=1) or raise SchemaOutOfDate"""
+    version = current_version(engine)
+    if version == HEAD:
+        return
+    if version > HEAD:
+        raise SchemaOutOfDate(f"Database schema is at revision {version}, newer than this code ({HEAD})")
+    if not MIGRATE_ON_STARTUP:
+        raise SchemaOutOfDate(
+            f"Database schema is at revision {version}, the app needs {HEAD}; run `python -m database.migrations`"
+        )
+    migrate(engine)
+
+
+def main(argv=None):
+    from database.database import engine
+
+    parser = argparse.ArgumentParser(description="Apply the pending schema migrations")
+    parser.add_argument("--status", action="store_true", help="show the current and pending revisions only")
+    parser.add_argument("--target", type=int, help="stop at this revision (default: the latest)")
+    args = parser.parse_args(argv)
+
+    version = current_version(engine)
+    if args.status:
+        print(f"current revision: {version} (head: {HEAD})")
+        for migration in MIGRATIONS:
+            if migration.version > version:
+                print(f"pending {migration.version:>3}  {migration.name}")
+        return
+
+    applied = migrate(engine, args.target)
+    for migration in applied:
+        print(f"applied {migration.version:>3}  {migration.name}")
+    if not applied:
+        print(f"Already at revision {current_version(engine)}")
+
+
+if __name__ == "__main__":
+    main()
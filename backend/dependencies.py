@@ -1,12 +1,16 @@
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from auth import verify_token
+from auth import token_cache, verify_token
 
 security = HTTPBearer()
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Dependency to get current authenticated user from JWT token"""
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Dependency to get current authenticated user from JWT token (cached verification; see auth.verify_token)"""
     token = credentials.credentials
+    if token_cache.sync_due():
+        # Reading other workers' revocations is blocking database I/O: keep it off the event loop
+        await run_in_threadpool(token_cache.sync)
     payload = verify_token(token)
     username: str = payload.get("sub")
     role: str = payload.get("role", "user")
@@ -0,0 +1,74 @@
+"""
+Sparse fieldsets (?fields=) and relationship expansion (?expand=) for list endpoints.
+
+`?fields=` names the response fields to return; `?expand=` names the related
+records to embed. Routers translate the pair into load_only/eager-load options,
+so unrequested columns and relations are never queried, and serialize with a
+response model trimmed to the same shape (built once per combination).
+
+Without either parameter the full response is returned. When only `fields`
+is given, nothing is expanded unless `expand` asks for it.
+"""
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple, Type
+from fastapi import HTTPException
+from pydantic import BaseModel, ConfigDict, Field, computed_field
+
+
+def parse_names(value: Optional[str], allowed: Iterable[str], param: str) -> Optional[Tuple[str, ...]]:
+    """Split a comma-separated parameter into names, rejecting unknown ones with a 400"""
+    if value is None:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {param}: {', '.join(unknown)} (allowed: {', '.join(allowed)})",
+        )
+    return names
+
+
+def parse_fieldset(
+    fields: Optional[str],
+    expand: Optional[str],
+    allowed_fields: Tuple[str, ...],
+    allowed_expansions: Tuple[str, ...],
+) -> Optional[Tuple[Tuple[str, ...], Tuple[str, ...]]]:
+    """Return (fields, expansions) for the request, or None when it asks for the full response"""
+    if fields is None and expand is None:
+        return None
+    field_names = parse_names(fields, allowed_fields, "fields") or allowed_fields
+    expansions = parse_names(expand, allowed_expansions, "expand") or ()
+    return field_names, expansions
+
+
+@lru_cache(maxsize=None)
+def sparse_model(
+    model: Type[BaseModel],
+    fields: Tuple[str, ...],
+    hidden: Tuple[str, ...] = (),
+    relations: Tuple[Tuple[str, Type[BaseModel], bool], ...] = (),
+) -> Type[BaseModel]:
+    """A response model with only `fields` of `model` (plain or computed).
+
+    `hidden` fields are read but not serialized (inputs of computed fields).
+    `relations` are (name, model, hidden) triples embedded as nested models.
+    Validators are not copied, so use this for models that don't declare any.
+    """
+    annotations = {}
+    namespace = {"model_config": ConfigDict(from_attributes=True), "__module__": model.__module__}
+    for name, info in model.model_fields.items():
+        if name in fields or name in hidden:
+            annotations[name] = info.annotation
+            namespace[name] = Field(info.default, exclude=name not in fields)
+    for name, decorator in model.__pydantic_decorators__.computed_fields.items():
+        if name in fields:
+            namespace[name] = computed_field(
+                decorator.info.wrapped_property, return_type=decorator.info.return_type
+            )
+    for name, related, exclude in relations:
+        annotations[name] = Optional[related]
+        namespace[name] = Field(None, exclude=exclude)
+    namespace["__annotations__"] = annotations
+    return type(f"{model.__name__}Fields", (BaseModel,), namespace)
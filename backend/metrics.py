@@ -0,0 +1,233 @@
+"""
+Request and database metrics in the Prometheus text exposition format.
+
+`MetricsMiddleware` records, per route template (e.g. /api/books/{book_id}):
+- request counts by status
+- latency and response-size histograms
+- the number of requests in flight
+
+`instrument_engine` hooks SQLAlchemy cursor events to time every query.
+Queries are attributed to the request that issued them through a
+ContextVar, so `db_queries_per_request` shows N+1 patterns as routes with
+high query counts. Queries slower than SLOW_QUERY_MS are logged to the
+"slow_query" logger. Everything is served by GET /metrics.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+from sqlalchemy import event
+
+slow_query_logger = logging.getLogger("slow_query")
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self.values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(key, list(counts), total, count) for key, (counts, total, count) in self.values.items()]
+        samples = []
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append((f"{self.name}_bucket", key, (("le", le),), cumulative))
+            samples.append((f"{self.name}_sum", key, (), total))
+            samples.append((f"{self.name}_count", key, (), count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels, extra)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter("http_requests_total", "HTTP requests by route and status"))
+REQUEST_LATENCY = registry.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency by route", LATENCY_BUCKETS)
+)
+RESPONSE_SIZE = registry.register(
+    Histogram("http_response_size_bytes", "HTTP response body size by route", SIZE_BUCKETS)
+)
+IN_PROGRESS = registry.register(Gauge("http_requests_in_progress", "HTTP requests currently being served"))
+QUERIES = registry.register(Counter("db_queries_total", "SQL statements executed by route"))
+QUERY_LATENCY = registry.register(
+    Histogram("db_query_duration_seconds", "SQL statement latency by route", LATENCY_BUCKETS)
+)
+QUERIES_PER_REQUEST = registry.register(
+    Histogram("db_queries_per_request", "SQL statements issued per HTTP request", QUERY_COUNT_BUCKETS)
+)
+SLOW_QUERIES = registry.register(
+    Counter("db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS by route")
+)
+
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "query_seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+# Stats of the HTTP request being served in the current context (None outside requests)
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    elapsed = time.perf_counter() - started
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+    # Queries run inside the endpoint, after routing has set scope["route"]
+    route = _route_template(stats.scope) if stats is not None else "background"
+    QUERIES.inc(route=route)
+    QUERY_LATENCY.observe(elapsed, route=route)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc(route=route)
+        slow_query_logger.warning("%.1f ms [%s] %s", elapsed * 1000, route, " ".join(statement.split()))
+
+
+def _handle_error(exception_context):
+    # Drop the start time pushed for a statement that failed
+    stack = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if stack:
+        stack.pop()
+
+
+def instrument_engine(engine):
+    """Time every statement run through `engine` (pass `.sync_engine` for async engines)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    # Unmatched paths share one label so scanners can't blow up the series count
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, size, status and query counts per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status = {"code": 500}
+        size = {"bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                size["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        IN_PROGRESS.inc(method=method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_PROGRESS.dec(method=method)
+            route = _route_template(scope)
+            REQUESTS.inc(method=method, route=route, status=str(status["code"]))
+            REQUEST_LATENCY.observe(elapsed, method=method, route=route)
+            RESPONSE_SIZE.observe(size["bytes"], method=method, route=route)
+            QUERIES_PER_REQUEST.observe(stats.queries, method=method, route=route)
+            current_request.reset(token)
@@ -0,0 +1,44 @@
+from database.database import Base
+from sqlalchemy import Column, Integer, String, Date
+
+# Daily circulation rollups maintained by analytics.py. They hold no foreign
+# keys, so they can be cleared and rebuilt without touching the loans.
+
+
+class LoanDayBook(Base):
+    __tablename__ = "loan_rollup_books"
+
+    # Loans issued per book and IssueDate
+    Day = Column(Date, primary_key=True)
+    BookID = Column(Integer, primary_key=True)
+    Issued = Column(Integer, nullable=False, default=0)
+
+
+class LoanDayGenre(Base):
+    __tablename__ = "loan_rollup_genres"
+
+    # Loans issued (by IssueDate) and returned (by ReturnDate) per genre;
+    # "" collects books without a genre and loans without a book
+    Day = Column(Date, primary_key=True)
+    Genre = Column(String, primary_key=True)
+    Issued = Column(Integer, nullable=False, default=0)
+    Returned = Column(Integer, nullable=False, default=0)
+    LoanDays = Column(Integer, nullable=False, default=0)  # summed durations of the returned loans
+
+
+class LoanDayMember(Base):
+    __tablename__ = "loan_rollup_members"
+
+    # Loans issued per member and IssueDate (distinct members per period = active members)
+    Day = Column(Date, primary_key=True)
+    MemberID = Column(Integer, primary_key=True)
+    Issued = Column(Integer, nullable=False, default=0)
+
+
+class LoanDayDuration(Base):
+    __tablename__ = "loan_rollup_durations"
+
+    # Loans returned per ReturnDate and duration in days
+    Day = Column(Date, primary_key=True)
+    Days = Column(Integer, primary_key=True)
+    Returned = Column(Integer, nullable=False, default=0)
@@ -5,10 +5,10 @@ from sqlalchemy.orm import relationship
 class Author(Base):
     __tablename__ = "authors"
 
-    AuthorID = Column(Integer, primary_key=True, unique=True, index=True)
-    LastName = Column(String, index=True)
-    FirstName = Column(String, index=True)
-    BirthDate = Column(String, index=True)
+    AuthorID = Column(Integer, primary_key=True)
+    LastName = Column(String)
+    FirstName = Column(String)
+    BirthDate = Column(String)
 
     # One-to-many relationship (Author -> Books)
     books = relationship("Book", back_populates="author")
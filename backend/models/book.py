@@ -1,17 +1,22 @@
 from database.database import Base
-from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 
 class Book(Base):
     __tablename__ = "books"
+    # GET /books?genre=&available= paged in Title order; ix_books_Genre (Genre, rowid)
+    # still serves the same filters in the default BookID order without a sort
+    __table_args__ = (
+        Index("ix_books_genre_available_title", "Genre", "Available", "Title"),
+    )
 
-    BookID = Column(Integer, primary_key=True, unique=True, index=True)
+    BookID = Column(Integer, primary_key=True)
     Title = Column(String, index=True)
     AuthorID = Column(Integer, ForeignKey("authors.AuthorID"), index=True)
     Isbn = Column(String, unique=True, index=True)
     PublicationDate = Column(Date, index=True)
     Genre = Column(String, index=True)
-    Available = Column(Boolean, default=True, index=True)
+    Available = Column(Boolean, default=True)
     CoverUrl = Column(String)
 
     # Many-to-one relationship (Books -> Author)
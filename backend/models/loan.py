@@ -1,20 +1,44 @@
 from database.database import Base
-from sqlalchemy import Column, Integer, Date, ForeignKey
+from sqlalchemy import Column, Integer, Date, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
+from models.reminder import ReminderJob  # noqa: F401 - target of Loan.reminder_jobs
 
 class Loan(Base):
     __tablename__ = "loans"
+    __table_args__ = (
+        # Partial index over open loans only: overdue lists and reminder scans
+        # range over DueDate without touching returned loans
+        Index(
+            "ix_loans_open_due_date", "DueDate", "LoanID",
+            sqlite_where=text('"ReturnDate" IS NULL'),
+            postgresql_where=text('"ReturnDate" IS NULL'),
+        ),
+        # A member's loans, open or returned (also serves lookups by MemberID alone)
+        Index("ix_loans_member_return", "MemberID", "ReturnDate"),
+        # Loan histories of a member or a book, paged by IssueDate (see routers/loans.py);
+        # the book one also serves every lookup by BookID alone
+        Index("ix_loans_member_issue", "MemberID", "IssueDate", "LoanID"),
+        Index("ix_loans_book_issue", "BookID", "IssueDate", "LoanID"),
+        # The open loan of a book, if any
+        Index(
+            "ix_loans_open_book", "BookID",
+            sqlite_where=text('"ReturnDate" IS NULL'),
+            postgresql_where=text('"ReturnDate" IS NULL'),
+        ),
+    )
 
-    LoanID = Column(Integer, primary_key=True, index=True)
-    BookID = Column(Integer, ForeignKey("books.BookID"), index=True)
-    MemberID = Column(Integer, ForeignKey("members.MemberID"), index=True)
-    IssueDate = Column(Date, index=True)
-    DueDate = Column(Date, index=True)
-    ReturnDate = Column(Date,index=True)
+    LoanID = Column(Integer, primary_key=True)
+    BookID = Column(Integer, ForeignKey("books.BookID"))
+    MemberID = Column(Integer, ForeignKey("members.MemberID"))
+    IssueDate = Column(Date)
+    DueDate = Column(Date)
+    ReturnDate = Column(Date)
 
     # Relationships
     book = relationship("Book", back_populates="loans")
     member = relationship("Member", back_populates="loans")
+    # Deleted with the loan: reminder_jobs.LoanID references loans, and foreign keys are enforced on PostgreSQL
+    reminder_jobs = relationship("ReminderJob", back_populates="loan", cascade="all, delete-orphan")
 
     # Compatibility property: expose LoanDate for Pydantic schemas expecting that name
     @property
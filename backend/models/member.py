@@ -6,14 +6,14 @@ from sqlalchemy.orm import relationship
 class Member(Base):
     __tablename__ = "members"
 
-    MemberID = Column(Integer, primary_key=True, index=True)
-    LastName = Column(String, index=True)
-    FirstName = Column(String, index=True)
-    Address = Column(String, index=True)
+    MemberID = Column(Integer, primary_key=True)
+    LastName = Column(String)
+    FirstName = Column(String)
+    Address = Column(String)
     Email = Column(String, unique=True, index=True)
-    Phone = Column(String, index=True)
-    BirthDate = Column(Date, index=True)
-    JoinDate = Column(Date, default=date.today, index=True)
+    Phone = Column(String)
+    BirthDate = Column(Date)
+    JoinDate = Column(Date, default=date.today)
     MembershipStatus = Column(String, index=True)
 
     # One-to-many relationship (Member -> Loans)
@@ -0,0 +1,34 @@
+from database.database import Base
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
+
+class ReminderJob(Base):
+    __tablename__ = "reminder_jobs"
+    # One reminder per loan, kind and due date: rescans never enqueue twice,
+    # but an extended loan gets reminded again for its new due date
+    __table_args__ = (
+        UniqueConstraint("LoanID", "Kind", "DueDate", name="uq_reminder_jobs_loan_kind_due"),
+        Index("ix_reminder_jobs_pending", "Status", "NextAttemptAt"),
+    )
+
+    JobID = Column(Integer, primary_key=True)
+    LoanID = Column(Integer, ForeignKey("loans.LoanID"), nullable=False)
+    Kind = Column(String, nullable=False)  # "due_soon" or "overdue"
+    DueDate = Column(Date, nullable=False)
+    Status = Column(String, nullable=False, default="pending")  # pending, sent, failed, cancelled
+    Attempts = Column(Integer, nullable=False, default=0)
+    NextAttemptAt = Column(DateTime, nullable=False)
+    LastError = Column(String)
+    CreatedAt = Column(DateTime, nullable=False)
+    SentAt = Column(DateTime)
+
+    loan = relationship("Loan", back_populates="reminder_jobs")
+
+
+class ReminderScanState(Base):
+    __tablename__ = "reminder_scan_state"
+
+    # Highest DueDate and LoanID already scanned for each reminder kind
+    Kind = Column(String, primary_key=True)
+    ScannedThrough = Column(Date, nullable=False)
+    LastLoanID = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,14 @@
+from database.database import Base
+from sqlalchemy import Column, Integer, String
+
+class TokenRevocation(Base):
+    __tablename__ = "token_revocations"
+
+    # Revocations shared by every worker (see auth.py): one token (TokenDigest)
+    # or every token of a user issued before RevokedAt (Subject). Rows are
+    # pruned once ExpiresAt, the end of the longest-lived affected token, has passed.
+    RevocationID = Column(Integer, primary_key=True)
+    TokenDigest = Column(String)
+    Subject = Column(String)
+    RevokedAt = Column(Integer, nullable=False)  # Unix seconds
+    ExpiresAt = Column(Integer, nullable=False)  # Unix seconds
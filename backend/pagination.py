@@ -0,0 +1,78 @@
+import base64
+import binascii
+import json
+from datetime import date
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+
+# Upper bound for the `limit` query parameter on paginated list endpoints
+MAX_PAGE_SIZE = 500
+
+# Response header carrying the cursor for the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    """Encode the sort key, last sort value and last primary key into an opaque token"""
+    payload = {"s": sort, "id": row_id}
+    if isinstance(value, date):
+        payload["d"] = value.isoformat()
+    else:
+        payload["v"] = value
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# Largest primary key a cursor may carry (a 64-bit signed integer on every backend)
+MAX_CURSOR_ID = 2 ** 63 - 1
+
+
+def decode_cursor(token: str, sort: str, column=None):
+    """Decode a cursor token into (value, row_id); reject tokens issued for another sort
+    and values that don't fit `column`, the sort column (None when sorting by ID)"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["s"] != sort:
+            raise ValueError("cursor was issued for a different sort")
+        value = date.fromisoformat(payload["d"]) if "d" in payload else payload.get("v")
+        # The value is bound against the sort column, so it has to be of the column's type
+        # (or None for NULL); anything else would fail in the database instead of here
+        expected = column.type.python_type if column is not None else type(None)
+        if value is not None and not isinstance(value, expected):
+            raise ValueError("cursor value does not match the sort column")
+        row_id = payload["id"]
+        if not isinstance(row_id, int) or isinstance(row_id, bool) or abs(row_id) > MAX_CURSOR_ID:
+            raise ValueError("cursor ID is not an integer")
+        return value, row_id
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+def keyset_order(column, id_column, descending: bool):
+    """ORDER BY clause matching keyset_filter (NULLs first ascending, last descending)"""
+    if column is None:
+        return [id_column.desc() if descending else id_column.asc()]
+    if descending:
+        return [column.desc().nulls_last(), id_column.desc()]
+    return [column.asc().nulls_first(), id_column.asc()]
+
+
+def keyset_filter(column, id_column, value, row_id: int, descending: bool):
+    """WHERE clause selecting the rows strictly after (value, row_id) in keyset_order"""
+    if column is None:
+        return id_column < row_id if descending else id_column > row_id
+    if descending:
+        if value is None:
+            return and_(column.is_(None), id_column < row_id)
+        return or_(
+            column < value,
+            and_(column == value, id_column < row_id),
+            column.is_(None),
+        )
+    if value is None:
+        return or_(and_(column.is_(None), id_column > row_id), column.isnot(None))
+    return or_(column > value, and_(column == value, id_column > row_id))
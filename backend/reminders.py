@@ -0,0 +1,331 @@
+"""
+Overdue and due-soon loan reminders.
+
+A scan reads open loans through the partial index `ix_loans_open_due_date`
+and enqueues one `reminder_jobs` row per loan, kind and due date. Scans are
+incremental: `reminder_scan_state` remembers, per kind, the last due date
+and loan ID already covered, so each run only looks at loans that became
+due since then (plus loans created since then). Enqueueing ignores rows
+that already exist, so overlapping scans are harmless.
+
+Jobs are then handed to a sender. A job is claimed by pushing its
+NextAttemptAt forward with a conditional UPDATE. If a worker dies
+mid-send, the job comes back once that lease expires. Failed sends are
+retried with exponential backoff until REMINDER_MAX_ATTEMPTS is reached.
+
+Senders are pluggable through REMINDER_SENDER:
+- "log" (the default) only writes the reminder to the log
+- "smtp" sends an e-mail
+- "package.module:factory" loads a custom sender
+
+The scheduler runs in-process when REMINDER_SCHEDULER=1, or as a
+separate worker:
+
+    cd backend
+    python -m reminders            # scan and send every REMINDER_SCAN_INTERVAL seconds
+    python -m reminders --once     # a single scan and send pass
+"""
+import argparse
+import importlib
+import logging
+import os
+import smtplib
+import sys
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from email.message import EmailMessage
+from typing import Optional, Tuple
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session, joinedload
+from database.database import SessionLocal
+from models.loan import Loan
+from models.reminder import ReminderJob, ReminderScanState
+
+# Imported so the relationships of Loan (and of Book) resolve when run as a worker
+from models.author import Author  # noqa: F401
+from models.book import Book  # noqa: F401
+from models.member import Member  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+# A loan is "due soon" this many days before its DueDate
+DUE_SOON_DAYS = int(os.getenv("REMINDER_DUE_SOON_DAYS", "2"))
+SCAN_INTERVAL_SECONDS = int(os.getenv("REMINDER_SCAN_INTERVAL", "300"))
+MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "5"))
+# Retry delays double from RETRY_BASE_SECONDS up to RETRY_MAX_SECONDS
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 6 * 60 * 60
+# How long a claimed job stays invisible to other workers
+SEND_LEASE_SECONDS = 300
+# Jobs handed to the sender per pass
+SEND_BATCH_SIZE = 100
+# Loans read and enqueued per insert
+SCAN_BATCH_SIZE = 500
+
+
+@dataclass
+class Reminder:
+    JobID: int
+    Kind: str
+    LoanID: int
+    DueDate: date
+    MemberName: str
+    Email: Optional[str]
+    BookTitle: Optional[str]
+
+
+class LogSender:
+    """Writes reminders to the log instead of sending them (local development)"""
+
+    def send(self, reminder: Reminder):
+        logger.info(
+            "Reminder %s for loan %s: %s <%s>, %r due %s",
+            reminder.Kind, reminder.LoanID, reminder.MemberName, reminder.Email,
+            reminder.BookTitle, reminder.DueDate,
+        )
+
+
+class SmtpSender:
+    """Sends reminders by e-mail using SMTP_HOST/SMTP_PORT/SMTP_USER/SMTP_PASSWORD and REMINDER_FROM"""
+
+    def __init__(self):
+        self.host = os.environ["SMTP_HOST"]
+        self.port = int(os.getenv("SMTP_PORT", "587"))
+        self.user = os.getenv("SMTP_USER")
+        self.password = os.getenv("SMTP_PASSWORD")
+        self.sender = os.getenv("REMINDER_FROM", self.user or "library@localhost")
+
+    def send(self, reminder: Reminder):
+        if not reminder.Email:
+            raise ValueError("Member has no e-mail address")
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = reminder.Email
+        if reminder.Kind == "overdue":
+            message["Subject"] = f"Overdue: {reminder.BookTitle}"
+            body = f"was due on {reminder.DueDate:%d.%m.%Y}. Please return it as soon as possible."
+        else:
+            message["Subject"] = f"Due soon: {reminder.BookTitle}"
+            body = f"is due on {reminder.DueDate:%d.%m.%Y}."
+        message.set_content(f"Hello {reminder.MemberName},\n\n\"{reminder.BookTitle}\" {body}\n")
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            smtp.starttls()
+            if self.user:
+                smtp.login(self.user, self.password or "")
+            smtp.send_message(message)
+
+
+def load_sender(spec: Optional[str] = None):
+    """Build the sender named by `spec` or REMINDER_SENDER"""
+    spec = spec or os.getenv("REMINDER_SENDER", "log")
+    if spec == "log":
+        return LogSender()
+    if spec == "smtp":
+        return SmtpSender()
+    module_name, _, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)()
+
+
+def _insert_ignoring_duplicates(db: Session, rows):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        dialect_insert = None
+    if dialect_insert is not None:
+        db.execute(dialect_insert(ReminderJob).on_conflict_do_nothing(), rows)
+        return
+    existing = set(db.execute(
+        select(ReminderJob.LoanID, ReminderJob.Kind, ReminderJob.DueDate)
+        .where(ReminderJob.LoanID.in_([row["LoanID"] for row in rows]))
+    ).all())
+    rows = [row for row in rows if (row["LoanID"], row["Kind"], row["DueDate"]) not in existing]
+    if rows:
+        db.execute(insert(ReminderJob), rows)
+
+
+def _enqueue(db: Session, query, kind: str, now: datetime) -> int:
+    count = 0
+    result = db.execute(query.execution_options(yield_per=SCAN_BATCH_SIZE))
+    for batch in result.partitions():
+        _insert_ignoring_duplicates(db, [
+            {
+                "LoanID": loan_id, "Kind": kind, "DueDate": due_date, "Status": "pending",
+                "Attempts": 0, "NextAttemptAt": now, "CreatedAt": now,
+            }
+            for loan_id, due_date in batch
+        ])
+        count += len(batch)
+    return count
+
+
+def scan_due_loans(db: Session, today: Optional[date] = None) -> int:
+    """Enqueue reminders for loans that became overdue or due soon since the last scan.
+
+    Returns the number of loans found; ones that already had a job are skipped.
+    """
+    today = today or date.today()
+    now = datetime.utcnow()
+    last_loan_id = db.scalar(select(func.max(Loan.LoanID))) or 0
+    windows = {
+        "overdue": (None, today - timedelta(days=1)),
+        "due_soon": (today, today + timedelta(days=DUE_SOON_DAYS)),
+    }
+    enqueued = 0
+    for kind, (earliest, through) in windows.items():
+        state = db.get(ReminderScanState, kind)
+        base = (
+            select(Loan.LoanID, Loan.DueDate)
+            .where(Loan.ReturnDate.is_(None), Loan.DueDate <= through)
+            .order_by(Loan.DueDate, Loan.LoanID)
+        )
+        if earliest is not None:
+            base = base.where(Loan.DueDate >= earliest)
+        if state is None:
+            enqueued += _enqueue(db, base, kind, now)
+            state = ReminderScanState(Kind=kind, ScannedThrough=through, LastLoanID=last_loan_id)
+            db.add(state)
+        else:
+            # Loans whose due date entered the window since the last scan ...
+            enqueued += _enqueue(db, base.where(Loan.DueDate > state.ScannedThrough), kind, now)
+            # ... and loans created since then with a due date already inside it
+            enqueued += _enqueue(
+                db,
+                base.where(Loan.DueDate <= state.ScannedThrough, Loan.LoanID > state.LastLoanID),
+                kind,
+                now,
+            )
+            state.ScannedThrough = max(state.ScannedThrough, through)
+            state.LastLoanID = last_loan_id
+        db.commit()
+    return enqueued
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def _claim(db: Session, job: ReminderJob, now: datetime) -> bool:
+    """Lease the job to this worker; False if another worker got it first"""
+    claimed = db.execute(
+        update(ReminderJob)
+        .where(
+            ReminderJob.JobID == job.JobID,
+            ReminderJob.Status == "pending",
+            ReminderJob.NextAttemptAt == job.NextAttemptAt,
+        )
+        .values(NextAttemptAt=now + timedelta(seconds=SEND_LEASE_SECONDS), Attempts=ReminderJob.Attempts + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return claimed == 1
+
+
+def send_pending_reminders(db: Session, sender, now: Optional[datetime] = None) -> Tuple[int, int]:
+    """Hand due jobs to `sender`; returns (sent, failed) for this pass"""
+    now = now or datetime.utcnow()
+    jobs = db.scalars(
+        select(ReminderJob)
+        .where(ReminderJob.Status == "pending", ReminderJob.NextAttemptAt <= now)
+        .order_by(ReminderJob.NextAttemptAt)
+        .limit(SEND_BATCH_SIZE)
+    ).all()
+    sent = failed = 0
+    for job in jobs:
+        if not _claim(db, job, now):
+            continue
+        loan = db.scalars(
+            select(Loan).options(joinedload(Loan.member), joinedload(Loan.book)).where(Loan.LoanID == job.LoanID)
+        ).first()
+        if loan is None or loan.ReturnDate is not None or loan.DueDate != job.DueDate:
+            # Returned or extended since the job was queued
+            job.Status = "cancelled"
+            db.commit()
+            continue
+
+        member = loan.member
+        reminder = Reminder(
+            JobID=job.JobID,
+            Kind=job.Kind,
+            LoanID=loan.LoanID,
+            DueDate=job.DueDate,
+            MemberName=f"{member.FirstName} {member.LastName}" if member else "",
+            Email=member.Email if member else None,
+            BookTitle=loan.book.Title if loan.book else None,
+        )
+        try:
+            sender.send(reminder)
+        except Exception as exc:
+            logger.warning("Reminder job %s failed (attempt %s): %s", job.JobID, job.Attempts, exc)
+            job.LastError = str(exc)[:500]
+            if job.Attempts >= MAX_ATTEMPTS:
+                job.Status = "failed"
+                failed += 1
+            else:
+                job.NextAttemptAt = now + retry_delay(job.Attempts)
+        else:
+            job.Status = "sent"
+            job.SentAt = datetime.utcnow()
+            job.LastError = None
+            sent += 1
+        db.commit()
+    return sent, failed
+
+
+class ReminderScheduler:
+    """Runs a scan and a send pass every `interval` seconds on a daemon thread"""
+
+    def __init__(self, sender=None, interval: int = SCAN_INTERVAL_SECONDS, session_factory=SessionLocal):
+        self.sender = sender or load_sender()
+        self.interval = interval
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self):
+        with self.session_factory() as db:
+            enqueued = scan_due_loans(db)
+            sent, failed = send_pending_reminders(db, self.sender)
+        logger.info("Reminders: %s enqueued, %s sent, %s failed", enqueued, sent, failed)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Reminder pass failed")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enqueue and send loan reminders")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    parser.add_argument("--interval", type=int, default=SCAN_INTERVAL_SECONDS, help="seconds between passes")
+    parser.add_argument("--sender", help="log, smtp or package.module:factory (default: REMINDER_SENDER)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    scheduler = ReminderScheduler(load_sender(args.sender), interval=args.interval)
+    if args.once:
+        scheduler.run_once()
+    else:
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+from datetime import date
+from typing import Awaitable, Callable, List, Literal, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import analytics
+from cache import response_cache
+from database.database import get_async_read_db
+from schemas.analytics import ActiveMembersRow, GenreTurnoverRow, LoanDurationBucket, TopBookRow, TopGenreRow
+from streaming import CSV_MEDIA_TYPE, csv_line
+
+router = APIRouter()
+
+# The reports read only the rollup tables (see analytics.py), plus book titles and genre stock
+ANALYTICS_CACHE_DEPENDENCIES = ("loans", "books")
+# Months covered when ?start= is omitted, including the current one
+DEFAULT_REPORT_MONTHS = 12
+
+ReportFormat = Literal["json", "csv"]
+
+
+def report_period(start: Optional[date] = None, end: Optional[date] = None) -> Tuple[date, date]:
+    """?start= and ?end= (inclusive); by default the last DEFAULT_REPORT_MONTHS months up to today"""
+    end = end or date.today()
+    if start is None:
+        months = end.year * 12 + end.month - DEFAULT_REPORT_MONTHS
+        start = date(months // 12, months % 12 + 1, 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return start, end
+
+
+async def report_response(
+    request: Request,
+    period: Tuple[date, date],
+    fmt: ReportFormat,
+    name: str,
+    row_type,
+    build: Callable[[], Awaitable[List[dict]]],
+) -> Response:
+    if fmt == "csv":
+        columns = list(row_type.model_fields)
+        body = csv_line(columns) + b"".join(csv_line(row[column] for column in columns) for row in await build())
+        return Response(
+            content=body,
+            media_type=CSV_MEDIA_TYPE,
+            headers={"Content-Disposition": f'attachment; filename="{name}.csv"'},
+        )
+
+    async def build_json(headers):
+        return await build()
+    # The resolved period is part of the ETag and cache key: without ?end= it moves with today's date
+    variant = "{}..{}".format(*period)
+    return await response_cache.respond(
+        request, ANALYTICS_CACHE_DEPENDENCIES, List[row_type], build_json, variant=variant,
+    )
+
+
+# Endpoint to read the most borrowed books of every month (?format=csv for a download)
+@router.get("/analytics/top-books", response_model=List[TopBookRow])
+async def read_top_books(
+    request: Request,
+    period: Tuple[date, date] = Depends(report_period),
+    limit: int = Query(10, ge=1, le=100),
+    fmt: ReportFormat = Query("json", alias="format"),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    return await report_response(
+        request, period, fmt, "top-books", TopBookRow, lambda: analytics.top_books(db, *period, limit),
+    )
+
+
+# Endpoint to read the most borrowed genres of every month
+@router.get("/analytics/top-genres", response_model=List[TopGenreRow])
+async def read_top_genres(
+    request: Request,
+    period: Tuple[date, date] = Depends(report_period),
+    limit: int = Query(5, ge=1, le=100),
+    fmt: ReportFormat = Query("json", alias="format"),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    return await report_response(
+        request, period, fmt, "top-genres", TopGenreRow, lambda: analytics.top_genres(db, *period, limit),
+    )
+
+
+# Endpoint to read how long the loans returned in the period lasted, in buckets of ?bucket= days
+@router.get("/analytics/loan-durations", response_model=List[LoanDurationBucket])
+async def read_loan_durations(
+    request: Request,
+    period: Tuple[date, date] = Depends(report_period),
+    bucket: int = Query(7, ge=1, le=365),
+    fmt: ReportFormat = Query("json", alias="format"),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    return await report_response(
+        request, period, fmt, "loan-durations", LoanDurationBucket, lambda: analytics.loan_durations(db, *period, bucket),
+    )
+
+
+# Endpoint to read the number of members who borrowed something, per month
+@router.get("/analytics/active-members", response_model=List[ActiveMembersRow])
+async def read_active_members(
+    request: Request,
+    period: Tuple[date, date] = Depends(report_period),
+    fmt: ReportFormat = Query("json", alias="format"),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    return await report_response(
+        request, period, fmt, "active-members", ActiveMembersRow, lambda: analytics.active_members(db, *period),
+    )
+
+
+# Endpoint to read loans per book in stock, per month and genre
+@router.get("/analytics/genre-turnover", response_model=List[GenreTurnoverRow])
+async def read_genre_turnover(
+    request: Request,
+    period: Tuple[date, date] = Depends(report_period),
+    fmt: ReportFormat = Query("json", alias="format"),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    return await report_response(
+        request, period, fmt, "genre-turnover", GenreTurnoverRow, lambda: analytics.genre_turnover(db, *period),
+    )
@@ -1,29 +1,46 @@
+from functools import lru_cache
 from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from schemas.auth import LoginRequest, TokenResponse
-from auth import create_access_token
-from dependencies import get_current_user, get_current_admin
-from database.database import get_db
+from auth import create_access_token, hash_password, revoke_token, revoke_user_tokens, verify_password
+from dependencies import get_current_user, get_current_admin, security
+from database.database import get_async_db
 from models.user import User
 from datetime import timedelta
 
 router = APIRouter()
 
 
+@lru_cache(maxsize=None)
+def dummy_password_hash() -> str:
+    # Verified against for unknown usernames, so they take as long as wrong passwords
+    return hash_password("not-a-real-password")
+
+
 @router.post("/login", response_model=TokenResponse)
-def login(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login(login_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """Login endpoint that returns JWT token. Users are stored in the `users` table."""
     try:
         username = login_data.username
         password = login_data.password
 
-        user = db.query(User).filter(User.Username == username).first()
-        if not user or user.Password != password:
+        user = (await db.scalars(select(User).where(User.Username == username))).first()
+        stored = user.Password if user else await run_in_threadpool(dummy_password_hash)
+        # scrypt is slow on purpose, so it runs in the worker pool instead of on the event loop
+        matches, needs_rehash = await run_in_threadpool(verify_password, password, stored)
+        if not user or not matches:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        if needs_rehash:
+            # Upgrade plain-text (or weaker) stored passwords on successful login
+            user.Password = await run_in_threadpool(hash_password, password)
+            await db.commit()
 
         access_token_expires = timedelta(minutes=30)
         access_token = create_access_token(
@@ -50,6 +67,21 @@ def login(login_data: LoginRequest, db: Session = Depends(get_db)):
             detail=f"Internal server error: {str(e)}"
         )
 
+@router.post("/logout")
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Revoke the presented token"""
+    # Written to the shared token_revocations table, off the event loop
+    await run_in_threadpool(revoke_token, credentials.credentials)
+    return {"message": "Logged out"}
+
+
+@router.post("/users/{username}/revoke-tokens")
+async def revoke_tokens(username: str, current_user: dict = Depends(get_current_admin)):
+    """Admin-only: revoke every token issued to a user so far"""
+    await run_in_threadpool(revoke_user_tokens, username)
+    return {"message": f"Tokens of {username} revoked"}
+
+
 @router.get("/protected")
 def protected_route(current_user: dict = Depends(get_current_user)):
     """Example protected route - requires authentication"""
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List
-from database.database import get_db
+from cache import response_cache
+from database.database import get_async_db, get_async_read_db
 from models.author import Author
 from schemas.author import AuthorResponse, AuthorCreate, AuthorUpdate
 
@@ -9,38 +12,42 @@ router = APIRouter()
 
 # Endpoint to read all authors
 @router.get("/authors", response_model=List[AuthorResponse])
-def read_authors(db: Session = Depends(get_db)):
-    authors = db.query(Author).all()
-    return authors
+async def read_authors(request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    async def build(headers):
+        return (await db.scalars(select(Author))).all()
+    return await response_cache.respond(request, ("authors",), List[AuthorResponse], build)
 
 
 # Endpoint to read specific author by ID
 @router.get("/authors/{author_id}", response_model=AuthorResponse)
-def read_author(author_id: int, db: Session = Depends(get_db)):
-    author = db.query(Author).filter(Author.AuthorID == author_id).first()
-    if author is None:
-        raise HTTPException(status_code=404, detail="Author not found")
-    return author
+async def read_author(author_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    async def build(headers):
+        author = await db.get(Author, author_id)
+        if author is None:
+            raise HTTPException(status_code=404, detail="Author not found")
+        return author
+    return await response_cache.respond(request, ("authors",), AuthorResponse, build)
 
 
 # Endpoint to create new author
 @router.post("/authors", response_model=AuthorResponse)
-def create_author(author: AuthorCreate, db: Session = Depends(get_db)):
+async def create_author(author: AuthorCreate, db: AsyncSession = Depends(get_async_db)):
     db_author = Author(
         LastName=author.LastName, 
         FirstName=author.FirstName, 
         BirthDate=author.BirthDate
     )
     db.add(db_author)
-    db.commit()
-    db.refresh(db_author)
+    await db.commit()
+    await db.refresh(db_author)
+    response_cache.invalidate("authors")
     return db_author
 
 
 # Endpoint to update an existing author
 @router.put("/authors/{author_id}", response_model=AuthorResponse)
-def update_author(author_id: int, author: AuthorUpdate, db: Session = Depends(get_db)):
-    db_author = db.query(Author).filter(Author.AuthorID == author_id).first()
+async def update_author(author_id: int, author: AuthorUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_author = await db.get(Author, author_id)
     if db_author is None:
         raise HTTPException(status_code=404, detail="Author not found")
     
@@ -48,19 +55,22 @@ def update_author(author_id: int, author: AuthorUpdate, db: Session = Depends(ge
     db_author.FirstName = author.FirstName if author.FirstName is not None else db_author.FirstName
     db_author.BirthDate = author.BirthDate if author.BirthDate is not None else db_author.BirthDate
     
-    db.commit()
-    db.refresh(db_author)
+    await db.commit()
+    await db.refresh(db_author)
+    # Books and loans embed the author, so their cached responses depend on "authors" too
+    response_cache.invalidate("authors")
     return db_author
 
 
 # Endpoint to delete an author
 @router.delete("/authors/{author_id}", response_model=AuthorResponse)
-def delete_author(author_id: int, db: Session = Depends(get_db)):
-    db_author = db.query(Author).filter(Author.AuthorID == author_id).first()
+async def delete_author(author_id: int, db: AsyncSession = Depends(get_async_db)):
+    # The books are loaded up front because deleting the author unlinks them
+    db_author = await db.get(Author, author_id, options=[selectinload(Author.books)])
     if db_author is None:
         raise HTTPException(status_code=404, detail="Author not found")
     
-    db.delete(db_author)
-    db.commit()
+    await db.delete(db_author)
+    await db.commit()
+    response_cache.invalidate("authors")
     return db_author
-
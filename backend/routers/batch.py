@@ -0,0 +1,110 @@
+"""
+Several create/update/delete operations across authors, books, members and
+loans in a single request and a single transaction.
+
+Operations run in order. Each one is validated with the schema of the
+matching single-row endpoint and flushed, so a later operation can use the
+ID of an earlier create through "$ref" (in ID and the *ID fields of Data).
+The first failing operation rolls the whole batch back and is reported by
+its index; otherwise everything is committed at once.
+"""
+from typing import Any, Dict
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from cache import response_cache
+from database.database import get_async_db
+from models.author import Author
+from models.book import Book
+from models.loan import Loan
+from models.member import Member
+from schemas.author import AuthorCreate, AuthorUpdate
+from schemas.batch import BatchOperation, BatchRequest, BatchResponse, BatchResult
+from schemas.book import BookCreate, BookUpdate
+from schemas.loan import LoanCreate, LoanUpdate
+from schemas.member import MemberCreate, MemberUpdate
+
+router = APIRouter()
+
+# Entity name -> (model, create schema, update schema, collections unlinked on delete)
+BATCH_ENTITIES = {
+    "authors": (Author, AuthorCreate, AuthorUpdate, (Author.books,)),
+    "books": (Book, BookCreate, BookUpdate, (Book.loans,)),
+    "members": (Member, MemberCreate, MemberUpdate, (Member.loans,)),
+    "loans": (Loan, LoanCreate, LoanUpdate, ()),
+}
+
+
+class BatchError(Exception):
+    def __init__(self, status_code: int, detail: Any):
+        self.status_code = status_code
+        self.detail = detail
+
+
+# Data fields that may hold a "$name" reference; everywhere else a leading "$" is plain text
+REFERENCE_FIELDS = {"AuthorID", "BookID", "MemberID"}
+
+
+def resolve(value: Any, refs: Dict[str, int]) -> Any:
+    """Replace a "$name" string with the ID created under that Ref"""
+    if isinstance(value, str) and value.startswith("$"):
+        if value[1:] not in refs:
+            raise BatchError(400, f"Unknown reference {value}")
+        return refs[value[1:]]
+    return value
+
+
+async def apply_operation(db: AsyncSession, operation: BatchOperation, refs: Dict[str, int]) -> int:
+    """Run one operation and return the ID of the row it touched"""
+    model, create_schema, update_schema, children = BATCH_ENTITIES[operation.Entity]
+    data = {key: resolve(value, refs) if key in REFERENCE_FIELDS else value for key, value in operation.Data.items()}
+    try:
+        if operation.Op == "create":
+            obj = model(**create_schema(**data).model_dump())
+            db.add(obj)
+        else:
+            if operation.ID is None:
+                raise BatchError(400, "ID is required")
+            row_id = resolve(operation.ID, refs)
+            options = [selectinload(child) for child in children] if operation.Op == "delete" else []
+            obj = await db.get(model, row_id, options=options)
+            if obj is None:
+                raise BatchError(404, f"{model.__name__} {row_id} not found")
+            if operation.Op == "update":
+                update = update_schema(**data)
+                values = update.model_dump(exclude_none=True)
+                for key in getattr(update_schema, "CLEARABLE_FIELDS", ()):
+                    if key in update.model_fields_set:
+                        values[key] = getattr(update, key)
+                for key, value in values.items():
+                    setattr(obj, key, value)
+            else:
+                await db.delete(obj)
+        await db.flush()
+    except ValidationError as exc:
+        raise BatchError(422, exc.errors(include_url=False, include_context=False))
+    except IntegrityError as exc:
+        raise BatchError(409, str(exc.orig))
+    return getattr(obj, model.__mapper__.primary_key[0].key)
+
+
+# Endpoint to run several writes in one transaction (all or nothing)
+@router.post("/batch", response_model=BatchResponse)
+async def run_batch(batch: BatchRequest, db: AsyncSession = Depends(get_async_db)):
+    refs: Dict[str, int] = {}
+    results = []
+    for index, operation in enumerate(batch.Operations):
+        try:
+            row_id = await apply_operation(db, operation, refs)
+        except BatchError as exc:
+            await db.rollback()
+            raise HTTPException(status_code=exc.status_code, detail={"Index": index, "Error": exc.detail})
+        if operation.Ref is not None:
+            refs[operation.Ref] = row_id
+        results.append(BatchResult(Index=index, Op=operation.Op, Entity=operation.Entity, ID=row_id, Ref=operation.Ref))
+
+    await db.commit()
+    response_cache.invalidate(*{operation.Entity for operation in batch.Operations})
+    return BatchResponse(Results=results)
@@ -1,38 +1,189 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from typing import List
-from database.database import get_db
+from datetime import date
+from operator import attrgetter, itemgetter
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, load_only, selectinload
+from typing import List, Literal, Optional
+from cache import etag_matches, response_cache
+from database.database import get_async_db, get_async_read_db
 from models.book import Book
+from schemas.author import AuthorResponse
 from schemas.book import BookResponse, BookCreateWithAuthor, BookUpdate
 from models.author import Author
+from fieldsets import parse_fieldset, sparse_model
+from covers import COVER_MAX_AGE_SECONDS, cover_source_url, get_cover_thumbnail
+from pagination import (
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+    keyset_order,
+)
+from serialization import ROW_SERIALIZATION, BookRecord, book_records, book_rows_statement, render_records
+from streaming import ndjson_response, wants_ndjson
 
 router = APIRouter()
 
-# Endpoint to read all books
+# Sort keys accepted by GET /books, mapped to the indexed column they order by
+# (None means the primary key alone)
+BOOK_SORT_COLUMNS = {
+    "id": None,
+    "title": Book.Title,
+    "published": Book.PublicationDate,
+}
+BookSort = Literal["id", "-id", "title", "-title", "published", "-published"]
+
+# Names accepted by ?fields= and ?expand= on GET /books
+BOOK_FIELDS = tuple(name for name in BookResponse.model_fields if name != "author")
+BOOK_EXPANSIONS = ("author",)
+
+
+def book_fieldset_options(fields, expansions, loader, *extra_columns):
+    """Load options and response model for a sparse book list"""
+    columns = [getattr(Book, name) for name in fields] + list(extra_columns)
+    relations = ()
+    options = []
+    if "author" in expansions:
+        columns.append(Book.AuthorID)
+        relations = (("author", AuthorResponse, False),)
+        options.append(loader(Book.author))
+    options.append(load_only(*columns))
+    return options, sparse_model(BookResponse, fields, relations=relations)
+
+
+async def get_book_with_author(db: AsyncSession, book_id: int, *options, refresh: bool = False):
+    """Load one book with its author eagerly loaded (no lazy loads under asyncio)"""
+    statement = select(Book).options(selectinload(Book.author), *options).where(Book.BookID == book_id)
+    if refresh:
+        statement = statement.execution_options(populate_existing=True)
+    return (await db.scalars(statement)).first()
+
+
+# Endpoint to read all books, optionally filtered, sorted and paginated by cursor
+# (?stream=1 or Accept: application/x-ndjson streams the whole result as JSON Lines;
+# ?fields= and ?expand=author trim the response and the query)
 @router.get("/books", response_model=List[BookResponse])
-def read_books(db: Session = Depends(get_db)):
-    books = db.query(Book).filter(Book.AuthorID.isnot(None)).options(joinedload(Book.author)).all()
-    return books
+async def read_books(
+    request: Request,
+    genre: Optional[str] = None,
+    available: Optional[bool] = None,
+    author_id: Optional[int] = None,
+    year_from: Optional[int] = Query(None, ge=1, le=9999),
+    year_to: Optional[int] = Query(None, ge=1, le=9999),
+    sort: BookSort = "id",
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    fieldset = parse_fieldset(fields, expand, BOOK_FIELDS, BOOK_EXPANSIONS)
+    query = select(Book).where(Book.AuthorID.isnot(None))
+    if genre is not None:
+        query = query.where(Book.Genre == genre)
+    if available is not None:
+        query = query.where(Book.Available == available)
+    if author_id is not None:
+        query = query.where(Book.AuthorID == author_id)
+    if year_from is not None:
+        query = query.where(Book.PublicationDate >= date(year_from, 1, 1))
+    if year_to is not None:
+        query = query.where(Book.PublicationDate <= date(year_to, 12, 31))
+
+    descending = sort.startswith("-")
+    sort_column = BOOK_SORT_COLUMNS[sort.lstrip("-")]
+    if cursor is not None:
+        last_value, last_id = decode_cursor(cursor, sort, sort_column)
+        query = query.where(keyset_filter(sort_column, Book.BookID, last_value, last_id, descending))
+    query = query.order_by(*keyset_order(sort_column, Book.BookID, descending))
+
+    # Streams use many-to-one joinedload to keep one round trip per yield_per batch
+    streaming = wants_ndjson(request, stream)
+    loader = joinedload if streaming else selectinload
+    if fieldset is None:
+        options, response_model = [loader(Book.author)], BookResponse
+    else:
+        # The sort column is read to build the next cursor
+        sort_columns = [sort_column] if sort_column is not None else []
+        options, response_model = book_fieldset_options(*fieldset, loader, *sort_columns)
+
+    if streaming:
+        statement = query.options(*options)
+        return ndjson_response(statement if limit is None else statement.limit(limit), response_model)
+
+    # Full responses are built from a column select and rendered with orjson (see serialization.py)
+    rows_mode = fieldset is None and ROW_SERIALIZATION
+    get = itemgetter if rows_mode else attrgetter
+
+    async def fetch(statement):
+        if rows_mode:
+            return book_records(await db.execute(book_rows_statement(statement)))
+        return (await db.scalars(statement.options(*options))).all()
+
+    async def build(headers):
+        # Fetch one extra row to find out whether another page follows
+        books = await fetch(query if limit is None else query.limit(limit + 1))
+        if limit is not None and len(books) > limit:
+            books = books[:limit]
+            last = books[-1]
+            last_value = get(sort_column.key)(last) if sort_column is not None else None
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(sort, last_value, get("BookID")(last))
+        return render_records(BookRecord, books) if rows_mode else books
+    return await response_cache.respond(request, ("books", "authors"), List[response_model], build)
 
 
 # Endpoint to read specific book by ID
 @router.get("/books/{book_id}", response_model=BookResponse)
-def read_book(book_id: int, db: Session = Depends(get_db)):
-    book = db.query(Book).options(joinedload(Book.author)).filter(Book.BookID == book_id).first()
+async def read_book(book_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    async def build(headers):
+        book = await get_book_with_author(db, book_id)
+        if book is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        return book
+    return await response_cache.respond(request, ("books", "authors"), BookResponse, build)
+
+
+# Endpoint to read a book's cover as a locally cached thumbnail
+@router.get("/books/{book_id}/cover", response_class=FileResponse)
+async def read_book_cover(
+    book_id: int,
+    request: Request,
+    size: Literal["small", "medium", "large"] = "medium",
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    book = (await db.execute(select(Book.CoverUrl, Book.Isbn).where(Book.BookID == book_id))).first()
     if book is None:
         raise HTTPException(status_code=404, detail="Book not found")
-    return book
+    source_url = cover_source_url(book.CoverUrl, book.Isbn)
+    # Downloading and resizing block, so they run off the event loop
+    path = await run_in_threadpool(get_cover_thumbnail, source_url, size) if source_url else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Cover not found")
+
+    # The file name is the source digest plus the size, so it identifies the image
+    headers = {
+        "ETag": '"{}"'.format(os.path.splitext(os.path.basename(path))[0]),
+        "Cache-Control": f"public, max-age={COVER_MAX_AGE_SECONDS}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
 
 
 # Endpoint to create a new book
 @router.post("/books", response_model=BookResponse)
-def create_book(book: BookCreateWithAuthor, db: Session = Depends(get_db)):
-    # If a new author is included, create it first
+async def create_book(book: BookCreateWithAuthor, db: AsyncSession = Depends(get_async_db)):
+    # If a new author is included, create it first (flushed, so both rows commit together)
     if book.NewAuthor is not None:
         new_author = Author(**book.NewAuthor.model_dump())    # formerly ".dict()" in Pydantic v2
         db.add(new_author)
-        db.commit()
-        db.refresh(new_author)
+        await db.flush()
         book.AuthorID = new_author.AuthorID  # associate new author
 
     # Create the book
@@ -46,15 +197,18 @@ def create_book(book: BookCreateWithAuthor, db: Session = Depends(get_db)):
         CoverUrl=book.CoverUrl
     )
     db.add(db_book)
-    db.commit()
-    db.refresh(db_book)
+    await db.commit()
+    db_book = await get_book_with_author(db, db_book.BookID, refresh=True)
+    if book.NewAuthor is not None:
+        response_cache.invalidate("authors")
+    response_cache.invalidate("books")
     return db_book
 
 
 # Endpoint to update an existing book
 @router.put("/books/{book_id}", response_model=BookResponse)
-def update_book(book_id: int, book: BookUpdate, db: Session = Depends(get_db)):
-    db_book = db.query(Book).options(joinedload(Book.author)).filter(Book.BookID == book_id).first()
+async def update_book(book_id: int, book: BookUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_book = await get_book_with_author(db, book_id)
     if db_book is None:
         raise HTTPException(status_code=404, detail="Book not found")
 
@@ -64,22 +218,26 @@ def update_book(book_id: int, book: BookUpdate, db: Session = Depends(get_db)):
     db_book.PublicationDate = book.PublicationDate if book.PublicationDate is not None else db_book.PublicationDate
     db_book.Genre = book.Genre if book.Genre is not None else db_book.Genre
     db_book.Available = book.Available if book.Available is not None else db_book.Available
-    db_book.CoverUrl = book.CoverUrl if book.CoverUrl is not None else db_book.CoverUrl
-
-    db.commit()
-    db.refresh(db_book)
+    # A CoverUrl sent as "" or null clears the cover; leaving the field out keeps it
+    if "CoverUrl" in book.model_fields_set:
+        db_book.CoverUrl = book.CoverUrl
+
+    await db.commit()
+    # Reload so a changed AuthorID brings the new author along
+    db_book = await get_book_with_author(db, book_id, refresh=True)
+    response_cache.invalidate("books")
     return db_book
 
 
 # Endpoint to delete a book
 @router.delete("/books/{book_id}", response_model=BookResponse)
-def delete_book(book_id: int, db: Session = Depends(get_db)):
-    db_book = db.query(Book).options(joinedload(Book.author)).filter(Book.BookID == book_id).first()
+async def delete_book(book_id: int, db: AsyncSession = Depends(get_async_db)):
+    # The loans are loaded up front because deleting the book unlinks them
+    db_book = await get_book_with_author(db, book_id, selectinload(Book.loans))
     if db_book is None:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    db.delete(db_book)
-    db.commit()
+    await db.delete(db_book)
+    await db.commit()
+    response_cache.invalidate("books")
     return db_book
-
-
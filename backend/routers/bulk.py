@@ -0,0 +1,379 @@
+"""
+Bulk import and export for books, authors and members.
+
+Imports read CSV (with a header row) or JSON Lines from the request body as
+a stream. Every row is validated with the same schemas as the single-row
+endpoints. Valid rows are inserted in batched transactions, and the
+response reports each duplicate or invalid row by its row number. Exports
+stream rows straight from the database cursor.
+
+CSV book rows may name the author with AuthorFirstName/AuthorLastName
+instead of an AuthorID; authors are matched by name (case-insensitive)
+and created once if they don't exist yet.
+"""
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Dict, Literal, Optional, Set, Tuple, Union
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from cache import dump_json, response_cache
+from database.database import get_async_db
+from models.author import Author
+from models.book import Book
+from models.member import Member
+from schemas.author import AuthorCreate, AuthorResponse
+from schemas.book import BookCreateWithAuthor, BookResponse
+from schemas.bulk import ImportReport, ImportRowIssue
+from schemas.member import MemberCreate, MemberResponse
+from streaming import CSV_MEDIA_TYPE, NDJSON_MEDIA_TYPE, csv_line, stream_query
+
+router = APIRouter()
+
+# Valid rows inserted per transaction
+IMPORT_BATCH_SIZE = 500
+# Issues listed individually in the import report (all are still counted)
+MAX_REPORTED_ISSUES = 1000
+
+BulkFormat = Literal["csv", "jsonl"]
+
+AUTHOR_COLUMNS = list(AuthorResponse.model_fields)
+BOOK_COLUMNS = [
+    "BookID", "Title", "AuthorID", "AuthorFirstName", "AuthorLastName",
+    "Isbn", "PublicationDate", "Genre", "Available", "CoverUrl",
+]
+MEMBER_COLUMNS = list(MemberResponse.model_fields)
+
+
+class DuplicateRow(Exception):
+    """Row duplicates an existing row or an earlier row of the same import"""
+
+
+class ImportRun:
+    def __init__(self):
+        self.report = ImportReport()
+
+    def issue(self, row: int, status: str, detail: str):
+        if status == "duplicate":
+            self.report.Skipped += 1
+        else:
+            self.report.Failed += 1
+        if len(self.report.Issues) < MAX_REPORTED_ISSUES:
+            self.report.Issues.append(ImportRowIssue(Row=row, Status=status, Detail=detail))
+
+
+class AuthorIndex:
+    """Existing authors by ID and normalized name, plus authors created during the import"""
+
+    def __init__(self, rows):
+        self.ids: Set[int] = set()
+        self.by_name: Dict[Tuple[str, str], Union[int, Author]] = {}
+        for author_id, last_name, first_name in rows:
+            self.ids.add(author_id)
+            self.by_name.setdefault(self.key(last_name, first_name), author_id)
+
+    @staticmethod
+    def key(last_name: Optional[str], first_name: Optional[str]) -> Tuple[str, str]:
+        return ((last_name or "").strip().casefold(), (first_name or "").strip().casefold())
+
+    def find(self, author: AuthorCreate) -> Union[int, Author, None]:
+        return self.by_name.get(self.key(author.LastName, author.FirstName))
+
+    def resolve(self, author: AuthorCreate) -> Union[int, Author]:
+        """Return the ID of a matching author, or a new (pending) Author registered under its name"""
+        found = self.find(author)
+        if found is None:
+            found = Author(**author.model_dump())
+            self.by_name[self.key(author.LastName, author.FirstName)] = found
+        return found
+
+
+async def load_author_index(db: AsyncSession) -> AuthorIndex:
+    rows = await db.execute(select(Author.AuthorID, Author.LastName, Author.FirstName))
+    return AuthorIndex(rows.all())
+
+
+def describe_error(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+            for error in exc.errors()
+        )
+    return str(exc)
+
+
+def detect_format(request: Request, fmt: Optional[str]) -> str:
+    if fmt is not None:
+        return fmt
+    return "jsonl" if "json" in request.headers.get("content-type", "") else "csv"
+
+
+async def iter_lines(request: Request) -> AsyncIterator[str]:
+    """Decode the request body incrementally and yield it line by line"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+async def iter_records(request: Request, fmt: str) -> AsyncIterator[Tuple[int, Union[dict, Exception]]]:
+    """Yield (row number, field dict) per record, or (row number, error) for unparseable rows"""
+    row = 0
+    if fmt == "jsonl":
+        async for line in iter_lines(request):
+            if not line.strip():
+                continue
+            row += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield row, ValueError(f"Invalid JSON: {exc.msg}")
+                continue
+            if not isinstance(record, dict):
+                yield row, ValueError("Each line must be a JSON object")
+                continue
+            yield row, record
+        return
+
+    header = None
+    pending = ""
+    async for line in iter_lines(request):
+        pending += line
+        # An odd number of quotes means a quoted field continues on the next line
+        if pending.count('"') % 2:
+            continue
+        fields = next(csv.reader([pending]), [])
+        pending = ""
+        if not any(field.strip() for field in fields):
+            continue
+        if header is None:
+            header = [field.strip() for field in fields]
+            continue
+        row += 1
+        # Empty cells mean "not given", so optional fields fall back to their defaults
+        yield row, {name: value for name, value in zip(header, fields) if value != ""}
+    if pending.strip():
+        yield row + 1, ValueError("Unterminated quoted field")
+
+
+async def write_batch(db: AsyncSession, batch, run: ImportRun, unique_column=None):
+    """Insert (row, obj) pairs in one transaction, skipping rows whose unique key already exists"""
+    if not batch:
+        return
+    if unique_column is not None:
+        keys = [getattr(obj, unique_column.key) for _, obj in batch]
+        existing = set((await db.scalars(select(unique_column).where(unique_column.in_(keys)))).all())
+        for row, obj in batch:
+            if getattr(obj, unique_column.key) in existing:
+                run.issue(row, "duplicate", f"{unique_column.key} {getattr(obj, unique_column.key)} already exists")
+        batch = [(row, obj) for row, obj in batch if getattr(obj, unique_column.key) not in existing]
+
+    db.add_all(obj for _, obj in batch)
+    try:
+        await db.commit()
+        run.report.Imported += len(batch)
+        return
+    except IntegrityError:
+        await db.rollback()
+
+    # A concurrent write or an unexpected constraint hit the batch: retry row by row
+    for row, obj in batch:
+        db.add(obj)
+        try:
+            await db.commit()
+            run.report.Imported += 1
+        except IntegrityError as exc:
+            await db.rollback()
+            run.issue(row, "invalid", f"Rejected by the database: {exc.orig}")
+
+
+async def run_import(records, db: AsyncSession, prepare, unique_column=None) -> ImportReport:
+    """Validate records with `prepare(data) -> ORM object` and insert them in batches"""
+    run = ImportRun()
+    batch = []
+    async for row, data in records:
+        try:
+            if isinstance(data, Exception):
+                raise data
+            batch.append((row, prepare(data)))
+        except DuplicateRow as exc:
+            run.issue(row, "duplicate", str(exc))
+            continue
+        except ValueError as exc:  # includes pydantic's ValidationError
+            run.issue(row, "invalid", describe_error(exc))
+            continue
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await write_batch(db, batch, run, unique_column)
+            batch = []
+    await write_batch(db, batch, run, unique_column)
+    return run.report
+
+
+def export_response(body, fmt: str, name: str) -> StreamingResponse:
+    media_type = NDJSON_MEDIA_TYPE if fmt == "jsonl" else CSV_MEDIA_TYPE
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+# Endpoint to import authors from CSV or JSON Lines
+@router.post("/authors/import", response_model=ImportReport)
+async def import_authors(
+    request: Request,
+    fmt: Optional[BulkFormat] = Query(None, alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    authors = await load_author_index(db)
+
+    def prepare(data):
+        author = AuthorCreate.model_validate(data)
+        if authors.find(author) is not None:
+            raise DuplicateRow(f"Author {author.FirstName.strip()} {author.LastName.strip()} already exists")
+        return authors.resolve(author)
+
+    report = await run_import(iter_records(request, detect_format(request, fmt)), db, prepare)
+    if report.Imported:
+        response_cache.invalidate("authors")
+    return report
+
+
+# Endpoint to import books from CSV or JSON Lines, creating missing authors by name
+@router.post("/books/import", response_model=ImportReport)
+async def import_books(
+    request: Request,
+    fmt: Optional[BulkFormat] = Query(None, alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    authors = await load_author_index(db)
+    known_authors = len(authors.by_name)
+    seen_isbns: Set[str] = set()
+
+    def prepare(data):
+        # Flat CSV author columns (or the nested author of a JSON export) name the author
+        first_name = data.pop("AuthorFirstName", None)
+        last_name = data.pop("AuthorLastName", None)
+        nested = data.pop("author", None)
+        if isinstance(nested, dict):
+            first_name = first_name or nested.get("FirstName")
+            last_name = last_name or nested.get("LastName")
+        if data.get("NewAuthor") is None and (first_name or last_name):
+            data["NewAuthor"] = {"FirstName": first_name or "", "LastName": last_name or ""}
+
+        book = BookCreateWithAuthor.model_validate(data)
+        if book.Isbn in seen_isbns:
+            raise DuplicateRow(f"Isbn {book.Isbn} appears earlier in the file")
+
+        db_book = Book(
+            Title=book.Title,
+            Isbn=book.Isbn,
+            PublicationDate=book.PublicationDate,
+            Genre=book.Genre,
+            Available=book.Available,
+            CoverUrl=book.CoverUrl,
+        )
+        if book.AuthorID is not None and book.AuthorID in authors.ids:
+            db_book.AuthorID = book.AuthorID
+        elif book.NewAuthor is not None:
+            author = authors.resolve(book.NewAuthor)
+            if isinstance(author, Author):
+                db_book.author = author
+            else:
+                db_book.AuthorID = author
+        elif book.AuthorID is not None:
+            raise ValueError(f"AuthorID {book.AuthorID} does not exist")
+        else:
+            raise ValueError("AuthorID or the author's name is required")
+        seen_isbns.add(book.Isbn)
+        return db_book
+
+    report = await run_import(iter_records(request, detect_format(request, fmt)), db, prepare, Book.Isbn)
+    if len(authors.by_name) > known_authors:
+        response_cache.invalidate("authors")
+    if report.Imported:
+        response_cache.invalidate("books")
+    return report
+
+
+# Endpoint to import members from CSV or JSON Lines
+@router.post("/members/import", response_model=ImportReport)
+async def import_members(
+    request: Request,
+    fmt: Optional[BulkFormat] = Query(None, alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    seen_emails: Set[str] = set()
+
+    def prepare(data):
+        member = MemberCreate.model_validate(data)
+        if member.Email in seen_emails:
+            raise DuplicateRow(f"Email {member.Email} appears earlier in the file")
+        seen_emails.add(member.Email)
+        return Member(**member.model_dump())
+
+    report = await run_import(iter_records(request, detect_format(request, fmt)), db, prepare, Member.Email)
+    if report.Imported:
+        response_cache.invalidate("members")
+    return report
+
+
+# Endpoint to export all authors as CSV or JSON Lines
+@router.get("/authors/export")
+async def export_authors(fmt: BulkFormat = Query("csv", alias="format")):
+    statement = select(Author).order_by(Author.AuthorID)
+    if fmt == "jsonl":
+        body = stream_query(statement, lambda author: dump_json(AuthorResponse, author) + b"\n")
+    else:
+        body = stream_query(
+            statement,
+            lambda author: csv_line(getattr(author, column) for column in AUTHOR_COLUMNS),
+            header=csv_line(AUTHOR_COLUMNS),
+        )
+    return export_response(body, fmt, "authors")
+
+
+def book_csv_line(book: Book) -> bytes:
+    author = book.author
+    return csv_line([
+        book.BookID, book.Title, book.AuthorID,
+        author.FirstName if author else None, author.LastName if author else None,
+        book.Isbn, book.PublicationDate, book.Genre, book.Available, book.CoverUrl,
+    ])
+
+
+# Endpoint to export all books (with author names) as CSV or JSON Lines
+@router.get("/books/export")
+async def export_books(fmt: BulkFormat = Query("csv", alias="format")):
+    statement = select(Book).options(joinedload(Book.author)).order_by(Book.BookID)
+    if fmt == "jsonl":
+        body = stream_query(statement, lambda book: dump_json(BookResponse, book) + b"\n")
+    else:
+        body = stream_query(statement, book_csv_line, header=csv_line(BOOK_COLUMNS))
+    return export_response(body, fmt, "books")
+
+
+# Endpoint to export all members as CSV or JSON Lines
+@router.get("/members/export")
+async def export_members(fmt: BulkFormat = Query("csv", alias="format")):
+    statement = select(Member).order_by(Member.MemberID)
+    if fmt == "jsonl":
+        body = stream_query(statement, lambda member: dump_json(MemberResponse, member) + b"\n")
+    else:
+        body = stream_query(
+            statement,
+            lambda member: csv_line(getattr(member, column) for column in MEMBER_COLUMNS),
+            header=csv_line(MEMBER_COLUMNS),
+        )
+    return export_response(body, fmt, "members")
@@ -2,37 +2,169 @@
 Instagram feed endpoint using Instagram Graph API.
 Requires INSTAGRAM_ACCESS_TOKEN and INSTAGRAM_USER_ID in environment.
 See: https://developers.facebook.com/docs/instagram-platform/instagram-graph-api
+
+A background refresher keeps a pre-serialized copy of the feed in memory,
+optionally persisted to INSTAGRAM_CACHE_PATH so it survives restarts, and
+the endpoint answers from that copy. Only while there is no copy yet (a
+cold start without a persisted one) does a request wait for the first
+fetch, instead of answering with an empty feed.
+- stale-while-revalidate: a request that finds the copy older than
+  INSTAGRAM_REFRESH_SECONDS still gets it, and starts a refresh
+- request coalescing: concurrent triggers share one upstream call
+- failed refreshes keep the last good feed
+
+INSTAGRAM_API_BASE points the fetcher at another server, e.g. a local stub.
+
+app.py imports this module on the first feed request, and that request
+starts the refresher thread, so instances that never serve the feed make
+no Instagram calls.
 """
+import json
+import logging
 import os
-import urllib.request
+import tempfile
+import threading
+import time
 import urllib.error
-import json
-from fastapi import APIRouter
+import urllib.request
+from typing import Optional
+from fastapi import APIRouter, Response
+from fastapi.concurrency import run_in_threadpool
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 GRAPH_API_BASE = "https://graph.instagram.com"
 API_VERSION = "v21.0"
+FEED_FIELDS = "id,caption,media_url,permalink,thumbnail_url,media_type"
+EMPTY_FEED = b'{"data":[]}'
+
+
+class FeedCache:
+    def __init__(
+        self,
+        api_base: str = GRAPH_API_BASE,
+        refresh_seconds: float = 600,
+        retry_seconds: float = 60,
+        timeout: float = 10,
+        path: Optional[str] = None,
+    ):
+        self.api_base = api_base.rstrip("/")
+        self.refresh_seconds = refresh_seconds
+        self.retry_seconds = retry_seconds
+        self.timeout = timeout
+        self.path = path
+        self.body = EMPTY_FEED
+        self.fetched_at = 0.0
+        self.next_refresh_at = 0.0
+        self._refreshing = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._load()
+
+    def feed_url(self) -> Optional[str]:
+        token = os.environ.get("INSTAGRAM_ACCESS_TOKEN")
+        user_id = os.environ.get("INSTAGRAM_USER_ID")
+        if not token or not user_id:
+            return None
+        return f"{self.api_base}/{API_VERSION}/{user_id}/media?fields={FEED_FIELDS}&limit=12&access_token={token}"
+
+    def get(self) -> bytes:
+        """Return the cached feed at once, starting a background refresh when it is due"""
+        if time.time() >= self.next_refresh_at and not self._refreshing.locked():
+            # Push the deadline out first so a burst of requests starts one refresh
+            self.next_refresh_at = time.time() + self.retry_seconds
+            threading.Thread(target=self.refresh, name="instagram-refresh", daemon=True).start()
+        return self.body
+
+    def prime(self):
+        """Fetch the feed while the caller waits if there is no copy yet, joining a fetch
+        that is already running; a failed attempt is not repeated before retry_seconds"""
+        if self.fetched_at or self.feed_url() is None:
+            return
+        if self._refreshing.acquire(timeout=self.timeout + 1):
+            self._refreshing.release()
+        if not self.fetched_at and time.time() >= self.next_refresh_at:
+            self.refresh()
+
+    def refresh(self) -> bool:
+        """Fetch the feed unless a fetch is already running; returns True if the cache was updated"""
+        if not self._refreshing.acquire(blocking=False):
+            return False
+        try:
+            url = self.feed_url()
+            if url is None:
+                self.next_refresh_at = time.time() + self.refresh_seconds
+                return False
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url), timeout=self.timeout) as resp:
+                    data = json.loads(resp.read().decode())
+            except (urllib.error.HTTPError, urllib.error.URLError, OSError, json.JSONDecodeError) as exc:
+                logger.warning("Instagram feed refresh failed: %s", exc)
+                self.next_refresh_at = time.time() + self.retry_seconds
+                return False
+            self.body = json.dumps(data, separators=(",", ":")).encode()
+            self.fetched_at = time.time()
+            self.next_refresh_at = self.fetched_at + self.refresh_seconds
+            self._save()
+            return True
+        finally:
+            self._refreshing.release()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as handle:
+                stored = json.loads(handle.read())
+            self.body = json.dumps(stored["data"], separators=(",", ":")).encode()
+            self.fetched_at = stored["fetched_at"]
+            self.next_refresh_at = self.fetched_at + self.refresh_seconds
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("Ignoring unreadable Instagram cache %s: %s", self.path, exc)
+
+    def _save(self):
+        if not self.path:
+            return
+        # Write to a temporary file and rename, so readers never see a partial file
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile("wb", dir=directory, delete=False) as handle:
+            handle.write(b'{"fetched_at":%r,"data":%s}' % (self.fetched_at, self.body))
+        os.replace(handle.name, self.path)
+
+    def _run(self):
+        while not self._stop.is_set():
+            if time.time() >= self.next_refresh_at:
+                self.refresh()
+            self._stop.wait(max(1.0, self.next_refresh_at - time.time()))
+
+    def start(self):
+        """Keep the feed fresh from a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="instagram-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+
+
+feed_cache = FeedCache(
+    api_base=os.environ.get("INSTAGRAM_API_BASE", GRAPH_API_BASE),
+    refresh_seconds=float(os.environ.get("INSTAGRAM_REFRESH_SECONDS", 600)),
+    path=os.environ.get("INSTAGRAM_CACHE_PATH") or None,
+)
 
 
 @router.get("/instagram-feed")
-def get_instagram_feed():
+async def get_instagram_feed():
     """
     Returns recent Instagram media for display on the website.
     Configure INSTAGRAM_ACCESS_TOKEN and INSTAGRAM_USER_ID in backend .env.
     """
-    token = os.environ.get("INSTAGRAM_ACCESS_TOKEN")
-    user_id = os.environ.get("INSTAGRAM_USER_ID")
-    if not token or not user_id:
-        return {"data": []}
-
-    fields = "id,caption,media_url,permalink,thumbnail_url,media_type"
-    url = f"{GRAPH_API_BASE}/{API_VERSION}/{user_id}/media?fields={fields}&limit=12&access_token={token}"
-
-    try:
-        req = urllib.request.Request(url)
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            body = json.loads(resp.read().decode())
-        return body
-    except (urllib.error.HTTPError, urllib.error.URLError, json.JSONDecodeError):
-        return {"data": []}
+    feed_cache.start()
+    if not feed_cache.fetched_at:
+        await run_in_threadpool(feed_cache.prime)
+    return Response(content=feed_cache.get(), media_type="application/json")
@@ -1,38 +1,259 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from typing import List
-from database.database import get_db
+from datetime import date, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, load_only, selectinload, with_parent
+from typing import List, Literal, Optional
+from cache import response_cache
+from database.database import get_async_db, get_async_read_db
 from models.loan import Loan
 from models.book import Book
-from schemas.loan import LoanResponse, LoanCreate, LoanUpdate
+from models.member import Member
+from schemas.book import BookResponse
+from schemas.loan import LoanResponse, LoanCreate, LoanUpdate, LoanCheckout, LoanBatchCheckout, LoanReturn
+from schemas.member import MemberResponse
+from fieldsets import parse_fieldset, sparse_model
+from circulation import checkout_books, return_loan
+from pagination import (
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+    keyset_order,
+)
+from serialization import ROW_SERIALIZATION, LoanRecord, loan_records, loan_rows_statement, render_records
+from streaming import ndjson_response, wants_ndjson
 
 router = APIRouter()
 
+# Loan responses embed the book, its author and the member
+LOAN_CACHE_DEPENDENCIES = ("loans", "books", "authors", "members")
+
+# Eager loads for everything LoanResponse serializes
+LOAN_RESPONSE_OPTIONS = (
+    selectinload(Loan.book).selectinload(Book.author),
+    selectinload(Loan.member),
+)
+
+# Same relations as LOAN_RESPONSE_OPTIONS, joined into the row so each
+# yield_per batch of a streamed response needs no extra queries
+LOAN_STREAM_OPTIONS = (
+    joinedload(Loan.book).joinedload(Book.author),
+    joinedload(Loan.member),
+)
+
+# Names accepted by ?fields= and ?expand= on GET /loans ("author" implies "book")
+LOAN_FIELDS = (
+    tuple(name for name in LoanResponse.model_fields if name not in ("book", "member"))
+    + tuple(LoanResponse.model_computed_fields)
+)
+LOAN_EXPANSIONS = ("book", "member", "author")
+# Loan columns behind response fields whose names differ (BorrowerName comes from the member)
+LOAN_FIELD_COLUMNS = {"LoanDate": Loan.IssueDate, "Returned": Loan.ReturnDate, "BorrowerName": Loan.MemberID}
+
+# ?status= on the loan histories of a member or a book
+LoanStatus = Literal["active", "returned", "overdue"]
+# Loan histories are paged by IssueDate (newest first by default), ties broken by LoanID
+LoanHistorySort = Literal["-issued", "issued"]
+HISTORY_PAGE_SIZE = 50
+
+
+def loan_fieldset_options(fields, expansions, loader):
+    """Load options and response model for a sparse loan list"""
+    columns = [LOAN_FIELD_COLUMNS.get(name) or getattr(Loan, name) for name in fields]
+    hidden = ("ReturnDate",) if "Returned" in fields else ()
+    options = []
+    relations = []
+    if "book" in expansions or "author" in expansions:
+        columns.append(Loan.BookID)
+        if "author" in expansions:
+            options.append(loader(Loan.book).options(loader(Book.author)))
+            relations.append(("book", BookResponse, False))
+        else:
+            options.append(loader(Loan.book))
+            book_fields = tuple(name for name in BookResponse.model_fields if name != "author")
+            relations.append(("book", sparse_model(BookResponse, book_fields), False))
+    if "member" in expansions:
+        columns.append(Loan.MemberID)
+        options.append(loader(Loan.member))
+        relations.append(("member", MemberResponse, False))
+    elif "BorrowerName" in fields:
+        # Only the name columns, and the member itself stays out of the response
+        options.append(loader(Loan.member).load_only(Member.FirstName, Member.LastName))
+        relations.append(("member", sparse_model(MemberResponse, ("FirstName", "LastName")), True))
+    options.append(load_only(*columns))
+    return options, sparse_model(LoanResponse, fields, hidden, tuple(relations))
+
+
+async def get_loan_with_relations(db: AsyncSession, loan_id: int, refresh: bool = False):
+    """Load one loan with its book, author and member eagerly loaded"""
+    statement = select(Loan).options(*LOAN_RESPONSE_OPTIONS).where(Loan.LoanID == loan_id)
+    if refresh:
+        statement = statement.execution_options(populate_existing=True)
+    return (await db.scalars(statement)).first()
+
+
 # Endpoint to read all loans
+# (?stream=1 or Accept: application/x-ndjson streams them as JSON Lines;
+# ?fields= and ?expand=book,member,author trim the response and the query)
 @router.get("/loans", response_model=List[LoanResponse])
-def read_loans(db: Session = Depends(get_db)):
-    loans = db.query(Loan).options(
-        joinedload(Loan.book).joinedload(Book.author),
-        joinedload(Loan.member)
-    ).all()
-    return loans
+async def read_loans(
+    request: Request,
+    stream: bool = False,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    fieldset = parse_fieldset(fields, expand, LOAN_FIELDS, LOAN_EXPANSIONS)
+    streaming = wants_ndjson(request, stream)
+    if fieldset is None:
+        options = LOAN_STREAM_OPTIONS if streaming else LOAN_RESPONSE_OPTIONS
+        response_model = LoanResponse
+    else:
+        options, response_model = loan_fieldset_options(*fieldset, joinedload if streaming else selectinload)
+    query = select(Loan).options(*options)
+
+    if streaming:
+        return ndjson_response(query.order_by(Loan.LoanID), response_model)
+
+    async def build(headers):
+        if fieldset is None and ROW_SERIALIZATION:
+            # One joined column select rendered with orjson (see serialization.py)
+            return render_records(LoanRecord, loan_records(await db.execute(loan_rows_statement())))
+        return (await db.scalars(query)).all()
+    return await response_cache.respond(request, LOAN_CACHE_DEPENDENCIES, List[response_model], build)
+
+
+def loan_status_filter(loan_status: LoanStatus):
+    """WHERE clause for ?status= (overdue: still open and past the DueDate)"""
+    if loan_status == "active":
+        return Loan.ReturnDate.is_(None)
+    if loan_status == "returned":
+        return Loan.ReturnDate.isnot(None)
+    return Loan.ReturnDate.is_(None) & (Loan.DueDate < date.today())
+
+
+async def loan_history(
+    request: Request,
+    response: Response,
+    db: AsyncSession,
+    parent_type,
+    parent_id: int,
+    collection,
+    loan_status: Optional[LoanStatus],
+    sort: LoanHistorySort,
+    limit: int,
+    cursor: Optional[str],
+):
+    """One keyset page of the loans in `collection` (Member.loans or Book.loans) of one parent.
+
+    The page is selected with with_parent instead of loading the collection, so
+    it reads the (MemberID|BookID, IssueDate, LoanID) index from the cursor on.
+    """
+    descending = sort.startswith("-")
+    if cursor is not None:
+        last_issued, last_id = decode_cursor(cursor, sort, Loan.IssueDate)
+
+    async def build(headers):
+        parent = await db.get(parent_type, parent_id)
+        if parent is None:
+            raise HTTPException(status_code=404, detail=f"{parent_type.__name__} not found")
+        query = select(Loan).where(with_parent(parent, collection))
+        if loan_status is not None:
+            query = query.where(loan_status_filter(loan_status))
+        if cursor is not None:
+            query = query.where(keyset_filter(Loan.IssueDate, Loan.LoanID, last_issued, last_id, descending))
+        query = query.order_by(*keyset_order(Loan.IssueDate, Loan.LoanID, descending)).limit(limit + 1)
+
+        # One extra row tells whether another page follows
+        loans = (await db.scalars(query.options(*LOAN_RESPONSE_OPTIONS))).all()
+        if len(loans) > limit:
+            loans = loans[:limit]
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(sort, loans[-1].IssueDate, loans[-1].LoanID)
+        return loans
+
+    if loan_status == "overdue":
+        # Depends on today's date, which no write invalidates (like GET /loans/overdue)
+        headers = {}
+        loans = await build(headers)
+        response.headers.update(headers)
+        return loans
+    return await response_cache.respond(request, LOAN_CACHE_DEPENDENCIES, List[LoanResponse], build)
+
+
+# Endpoint to read one member's loans, paged by IssueDate
+# (?status=active|returned|overdue; the X-Next-Cursor header holds the next page's ?cursor=)
+@router.get("/members/{member_id}/loans", response_model=List[LoanResponse])
+async def read_member_loans(
+    member_id: int,
+    request: Request,
+    response: Response,
+    status: Optional[LoanStatus] = None,
+    sort: LoanHistorySort = "-issued",
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    return await loan_history(
+        request, response, db, Member, member_id, Member.loans, status, sort, limit, cursor
+    )
+
+
+# Endpoint to read one book's circulation history, paged by IssueDate
+# (same parameters as /members/{member_id}/loans)
+@router.get("/books/{book_id}/loans", response_model=List[LoanResponse])
+async def read_book_loans(
+    book_id: int,
+    request: Request,
+    response: Response,
+    status: Optional[LoanStatus] = None,
+    sort: LoanHistorySort = "-issued",
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    return await loan_history(
+        request, response, db, Book, book_id, Book.loans, status, sort, limit, cursor
+    )
+
+
+# Endpoint to read open loans past their DueDate, most overdue first
+# (due_within=N also includes loans due in the next N days); declared before
+# /loans/{loan_id} and served from the partial index on open loans' DueDate
+@router.get("/loans/overdue", response_model=List[LoanResponse])
+async def read_overdue_loans(
+    due_within: int = Query(0, ge=0, le=365),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    cutoff = date.today() + timedelta(days=due_within)
+    query = (
+        select(Loan)
+        .options(*LOAN_RESPONSE_OPTIONS)
+        .where(Loan.ReturnDate.is_(None))
+        .where(Loan.DueDate <= cutoff if due_within else Loan.DueDate < cutoff)
+        .order_by(Loan.DueDate, Loan.LoanID)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return (await db.scalars(query)).all()
 
 
 # Endpoint to read specific loan by ID
 @router.get("/loans/{loan_id}", response_model=LoanResponse)
-def read_loan(loan_id: int, db: Session = Depends(get_db)):
-    loan = db.query(Loan).options(
-        joinedload(Loan.book).joinedload(Book.author),
-        joinedload(Loan.member)
-    ).filter(Loan.LoanID == loan_id).first()
-    if loan is None:
-        raise HTTPException(status_code=404, detail="Loan not found")
-    return loan
+async def read_loan(loan_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    async def build(headers):
+        loan = await get_loan_with_relations(db, loan_id)
+        if loan is None:
+            raise HTTPException(status_code=404, detail="Loan not found")
+        return loan
+    return await response_cache.respond(request, LOAN_CACHE_DEPENDENCIES, LoanResponse, build)
 
 
 # Endpoint to create new loan
 @router.post("/loans", response_model=LoanResponse)
-def create_loan(loan: LoanCreate, db: Session = Depends(get_db)):
+async def create_loan(loan: LoanCreate, db: AsyncSession = Depends(get_async_db)):
     db_loan = Loan(
         MemberID=loan.MemberID, 
         BookID=loan.BookID, 
@@ -41,20 +262,41 @@ def create_loan(loan: LoanCreate, db: Session = Depends(get_db)):
         ReturnDate=loan.ReturnDate
     )
     db.add(db_loan)
-    db.commit()
-    db.refresh(db_loan)
+    await db.commit()
+    response_cache.invalidate("loans")
     # Reload with relationships
-    db_loan = db.query(Loan).options(
-        joinedload(Loan.book).joinedload(Book.author),
-        joinedload(Loan.member)
-    ).filter(Loan.LoanID == db_loan.LoanID).first()
+    db_loan = await get_loan_with_relations(db, db_loan.LoanID, refresh=True)
     return db_loan
 
 
+# Endpoint to check out one book: marks it unavailable and creates the loan atomically
+@router.post("/loans/checkout", response_model=LoanResponse)
+async def checkout_loan(checkout: LoanCheckout, db: AsyncSession = Depends(get_async_db)):
+    loans = await checkout_books(db, checkout.MemberID, [checkout.BookID], checkout.LoanDate, checkout.DueDate)
+    response_cache.invalidate("loans", "books")
+    return loans[0]
+
+
+# Endpoint to check out several books to one member at once (all or none)
+@router.post("/loans/checkout/batch", response_model=List[LoanResponse])
+async def checkout_loans(checkout: LoanBatchCheckout, db: AsyncSession = Depends(get_async_db)):
+    loans = await checkout_books(db, checkout.MemberID, checkout.BookIDs, checkout.LoanDate, checkout.DueDate)
+    response_cache.invalidate("loans", "books")
+    return loans
+
+
+# Endpoint to return a loan: sets ReturnDate and makes the book available again
+@router.post("/loans/{loan_id}/return", response_model=LoanResponse)
+async def return_book(loan_id: int, loan_return: Optional[LoanReturn] = None, db: AsyncSession = Depends(get_async_db)):
+    loan = await return_loan(db, loan_id, loan_return.ReturnDate if loan_return else None)
+    response_cache.invalidate("loans", "books")
+    return loan
+
+
 # Endpoint to update an existing loan
 @router.put("/loans/{loan_id}", response_model=LoanResponse)
-def update_loan(loan_id: int, loan: LoanUpdate, db: Session = Depends(get_db)):
-    db_loan = db.query(Loan).filter(Loan.LoanID == loan_id).first()
+async def update_loan(loan_id: int, loan: LoanUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_loan = await db.get(Loan, loan_id)
     if db_loan is None:
         raise HTTPException(status_code=404, detail="Loan not found")
     
@@ -64,28 +306,23 @@ def update_loan(loan_id: int, loan: LoanUpdate, db: Session = Depends(get_db)):
     db_loan.DueDate = loan.DueDate if loan.DueDate is not None else db_loan.DueDate
     db_loan.ReturnDate = loan.ReturnDate if loan.ReturnDate is not None else db_loan.ReturnDate
     
-    db.commit()
+    await db.commit()
+    response_cache.invalidate("loans")
     # Reload with relationships
-    db_loan = db.query(Loan).options(
-        joinedload(Loan.book).joinedload(Book.author),
-        joinedload(Loan.member)
-    ).filter(Loan.LoanID == loan_id).first()
+    db_loan = await get_loan_with_relations(db, loan_id, refresh=True)
     return db_loan
 
 
 # Endpoint to delete a loan
 @router.delete("/loans/{loan_id}", response_model=LoanResponse)
-def delete_loan(loan_id: int, db: Session = Depends(get_db)):
-    db_loan = db.query(Loan).options(
-        joinedload(Loan.book).joinedload(Book.author),
-        joinedload(Loan.member)
-    ).filter(Loan.LoanID == loan_id).first()
+async def delete_loan(loan_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_loan = await get_loan_with_relations(db, loan_id)
     if db_loan is None:
         raise HTTPException(status_code=404, detail="Loan not found")
     
     # Store the loan data before deletion
     loan_data = db_loan
-    db.delete(db_loan)
-    db.commit()
+    await db.delete(db_loan)
+    await db.commit()
+    response_cache.invalidate("loans")
     return loan_data
-
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List
-from database.database import get_db
+from cache import response_cache
+from database.database import get_async_db, get_async_read_db
 from models.member import Member
 from schemas.member import MemberResponse, MemberCreate, MemberUpdate
 
@@ -9,22 +12,25 @@ router = APIRouter()
 
 # Endpoint to read all members
 @router.get("/members", response_model=List[MemberResponse])
-def read_members(db: Session = Depends(get_db)):
-    members = db.query(Member).all()
-    return members
+async def read_members(request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    async def build(headers):
+        return (await db.scalars(select(Member))).all()
+    return await response_cache.respond(request, ("members",), List[MemberResponse], build)
 
 # Endpoint to read specific member by ID
 @router.get("/members/{member_id}", response_model=MemberResponse)
-def read_member(member_id: int, db: Session = Depends(get_db)):
-    member = db.query(Member).filter(Member.MemberID == member_id).first()
-    if member is None:
-        raise HTTPException(status_code=404, detail="Member not found")
-    return member
+async def read_member(member_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    async def build(headers):
+        member = await db.get(Member, member_id)
+        if member is None:
+            raise HTTPException(status_code=404, detail="Member not found")
+        return member
+    return await response_cache.respond(request, ("members",), MemberResponse, build)
 
 
 # Endpoint to create a new member
 @router.post("/members", response_model=MemberResponse)
-def create_member(member: MemberCreate, db: Session = Depends(get_db)):
+async def create_member(member: MemberCreate, db: AsyncSession = Depends(get_async_db)):
     db_member = Member(
         LastName=member.LastName,
         FirstName=member.FirstName,
@@ -36,15 +42,16 @@ def create_member(member: MemberCreate, db: Session = Depends(get_db)):
         MembershipStatus=member.MembershipStatus
     )
     db.add(db_member)
-    db.commit()
-    db.refresh(db_member)
+    await db.commit()
+    await db.refresh(db_member)
+    response_cache.invalidate("members")
     return db_member
 
 
 # Endpoint to update an existing member
 @router.put("/members/{member_id}", response_model=MemberResponse)
-def update_member(member_id: int, member: MemberUpdate, db: Session = Depends(get_db)):
-    db_member = db.query(Member).filter(Member.MemberID == member_id).first()
+async def update_member(member_id: int, member: MemberUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_member = await db.get(Member, member_id)
     if db_member is None:
         raise HTTPException(status_code=404, detail="Member not found")
 
@@ -57,18 +64,21 @@ def update_member(member_id: int, member: MemberUpdate, db: Session = Depends(ge
     db_member.JoinDate = member.JoinDate if member.JoinDate is not None else db_member.JoinDate
     db_member.MembershipStatus = member.MembershipStatus if member.MembershipStatus is not None else db_member.MembershipStatus
 
-    db.commit()
-    db.refresh(db_member)
+    await db.commit()
+    await db.refresh(db_member)
+    response_cache.invalidate("members")
     return db_member
 
 
 # Endpoint to delete a member
 @router.delete("/members/{member_id}", response_model=MemberResponse)
-def delete_member(member_id: int, db: Session = Depends(get_db)):
-    db_member = db.query(Member).filter(Member.MemberID == member_id).first()
+async def delete_member(member_id: int, db: AsyncSession = Depends(get_async_db)):
+    # The loans are loaded up front because deleting the member unlinks them
+    db_member = await db.get(Member, member_id, options=[selectinload(Member.loans)])
     if db_member is None:
         raise HTTPException(status_code=404, detail="Member not found")
 
-    db.delete(db_member)
-    db.commit()
-    return db_member
\ No newline at end of file
+    await db.delete(db_member)
+    await db.commit()
+    response_cache.invalidate("members")
+    return db_member
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from metrics import registry
+
+router = APIRouter()
+
+
+# Endpoint to expose request and query metrics for Prometheus
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import List
+from database.database import get_async_read_db
+from database.search import search_book_ids
+from models.book import Book
+from schemas.book import BookResponse
+
+router = APIRouter()
+
+# Endpoint to search the catalogue by title, genre, ISBN and author name
+@router.get("/search", response_model=List[BookResponse])
+async def search_books(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    book_ids = await search_book_ids(db, q, limit)
+    if not book_ids:
+        return []
+
+    books = (await db.scalars(
+        select(Book).options(selectinload(Book.author)).where(Book.BookID.in_(book_ids))
+    )).all()
+    # Keep the bm25 ranking order from the FTS query
+    books_by_id = {book.BookID: book for book in books}
+    return [books_by_id[book_id] for book_id in book_ids if book_id in books_by_id]
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from datetime import date
+from fastapi import APIRouter, Depends
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import get_async_read_db
+from models.author import Author
+from models.book import Book
+from models.loan import Loan
+from models.member import Member
+from schemas.stats import StatsResponse
+
+router = APIRouter()
+
+# How long computed statistics are served before the counts are re-run
+STATS_TTL_SECONDS = 10
+
+_stats_lock = asyncio.Lock()
+_stats_cache = {"expires_at": 0.0, "value": None}
+
+
+def _count(model, *criteria):
+    return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+
+
+async def compute_stats(db: AsyncSession) -> StatsResponse:
+    """Run the dashboard COUNT queries (one round trip plus one GROUP BY)"""
+    active = Loan.ReturnDate.is_(None)
+    # Same rows as GET /books, which leaves out books without an author
+    listed = Book.AuthorID.isnot(None)
+    counts = (await db.execute(select(
+        _count(Book, listed),
+        _count(Book, listed, Book.Available.is_(True)),
+        _count(Author),
+        _count(Member),
+        _count(Loan),
+        _count(Loan, active),
+        _count(Loan, active, Loan.DueDate < date.today()),
+    ))).one()
+    by_status = (await db.execute(
+        select(Member.MembershipStatus, func.count()).group_by(Member.MembershipStatus)
+    )).all()
+
+    return StatsResponse(
+        TotalBooks=counts[0],
+        AvailableBooks=counts[1],
+        TotalAuthors=counts[2],
+        TotalMembers=counts[3],
+        MembersByStatus={status or "Unknown": count for status, count in by_status},
+        TotalLoans=counts[4],
+        ActiveLoans=counts[5],
+        OverdueLoans=counts[6],
+    )
+
+
+# Endpoint to read aggregated dashboard statistics (cached for STATS_TTL_SECONDS)
+@router.get("/stats", response_model=StatsResponse)
+async def read_stats(db: AsyncSession = Depends(get_async_read_db)):
+    now = time.monotonic()
+    cached = _stats_cache["value"]
+    if cached is not None and now < _stats_cache["expires_at"]:
+        return cached
+
+    async with _stats_lock:
+        # Another request may have refreshed the counts while we waited
+        if _stats_cache["value"] is not None and time.monotonic() < _stats_cache["expires_at"]:
+            return _stats_cache["value"]
+        stats = await compute_stats(db)
+        _stats_cache["value"] = stats
+        _stats_cache["expires_at"] = time.monotonic() + STATS_TTL_SECONDS
+        return stats
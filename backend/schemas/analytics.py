@@ -0,0 +1,41 @@
+from typing import Optional
+from pydantic import BaseModel
+
+# Rows of the /analytics reports; months are "YYYY-MM"
+
+
+class TopBookRow(BaseModel):
+    Month: str
+    Rank: int
+    BookID: int
+    Title: Optional[str] = None
+    Genre: Optional[str] = None
+    Loans: int
+
+
+class TopGenreRow(BaseModel):
+    Month: str
+    Rank: int
+    Genre: Optional[str] = None  # None collects books without a genre
+    Loans: int
+
+
+class LoanDurationBucket(BaseModel):
+    FromDays: int
+    ToDays: int
+    Loans: int
+
+
+class ActiveMembersRow(BaseModel):
+    Month: str
+    ActiveMembers: int
+    Loans: int
+
+
+class GenreTurnoverRow(BaseModel):
+    Month: str
+    Genre: Optional[str] = None
+    Loans: int
+    Books: int  # current stock of the genre
+    Turnover: Optional[float] = None  # Loans per book
+    AverageLoanDays: Optional[float] = None  # of the loans returned that month
@@ -0,0 +1,34 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional, Union
+
+BatchEntity = Literal["authors", "books", "members", "loans"]
+
+
+# Pydantic model for one operation of a batch.
+# ID and the AuthorID, BookID and MemberID values in Data may be "$name" to
+# use the ID created by the earlier operation that declared Ref="name".
+class BatchOperation(BaseModel):
+    Op: Literal["create", "update", "delete"]
+    Entity: BatchEntity
+    ID: Optional[Union[int, str]] = None
+    Ref: Optional[str] = None
+    Data: Dict[str, Any] = {}
+
+
+# Pydantic model for a batch request
+class BatchRequest(BaseModel):
+    Operations: List[BatchOperation] = Field(min_length=1, max_length=200)
+
+
+# Pydantic model for the result of one operation
+class BatchResult(BaseModel):
+    Index: int
+    Op: str
+    Entity: BatchEntity
+    ID: int
+    Ref: Optional[str] = None
+
+
+# Pydantic model for a batch response
+class BatchResponse(BaseModel):
+    Results: List[BatchResult]
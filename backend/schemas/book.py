@@ -1,8 +1,22 @@
 from datetime import date
-from typing import Optional
-from pydantic import BaseModel
+from typing import ClassVar, Optional, Tuple
+from urllib.parse import urlsplit
+from pydantic import BaseModel, field_validator
 from schemas.author import AuthorResponse, AuthorCreate
 
+
+def normalize_cover_url(value: Optional[str]) -> Optional[str]:
+    # The server downloads this URL for /books/{id}/cover (see covers.py), so only web URLs are accepted
+    if value is None:
+        return None
+    trimmed = value.strip()
+    if not trimmed:
+        return None
+    parts = urlsplit(trimmed)
+    if parts.scheme.lower() not in ("http", "https") or not parts.hostname:
+        raise ValueError("CoverUrl must be an http or https URL")
+    return trimmed
+
 # Pydantic model for response
 class BookResponse(BaseModel):
     BookID: int
@@ -29,6 +43,11 @@ class BookCreate(BaseModel):
     Available: bool = True
     CoverUrl: Optional[str] = None
 
+    @field_validator("CoverUrl")
+    @classmethod
+    def validate_cover_url(cls, value):
+        return normalize_cover_url(value)
+
 
 # Pydantic model for creating a new book with optional new author
 class BookCreateWithAuthor(BaseModel):
@@ -41,9 +60,17 @@ class BookCreateWithAuthor(BaseModel):
     CoverUrl: Optional[str] = None
     NewAuthor: Optional[AuthorCreate] = None
 
+    @field_validator("CoverUrl")
+    @classmethod
+    def validate_cover_url(cls, value):
+        return normalize_cover_url(value)
+
 
 # Pydantic model for updating existing book
 class BookUpdate(BaseModel):
+    # Fields where an explicit "" or null clears the value instead of leaving it unchanged
+    CLEARABLE_FIELDS: ClassVar[Tuple[str, ...]] = ("CoverUrl",)
+
     Title: Optional[str] = None
     AuthorID: Optional[int] = None
     Isbn: Optional[str] = None
@@ -52,3 +79,8 @@ class BookUpdate(BaseModel):
     Available: Optional[bool] = None
     CoverUrl: Optional[str] = None
 
+    @field_validator("CoverUrl")
+    @classmethod
+    def validate_cover_url(cls, value):
+        return normalize_cover_url(value)
+
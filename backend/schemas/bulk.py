@@ -0,0 +1,16 @@
+from typing import List, Literal
+from pydantic import BaseModel
+
+# One row of an import that was not inserted
+class ImportRowIssue(BaseModel):
+    Row: int  # 1-based data row number (the CSV header is not counted)
+    Status: Literal["duplicate", "invalid"]
+    Detail: str
+
+
+# Pydantic model for the result of a bulk import
+class ImportReport(BaseModel):
+    Imported: int = 0
+    Skipped: int = 0  # duplicates of existing rows or of earlier rows in the file
+    Failed: int = 0
+    Issues: List[ImportRowIssue] = []  # capped, see MAX_REPORTED_ISSUES
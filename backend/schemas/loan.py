@@ -1,6 +1,6 @@
 from datetime import date
-from pydantic import BaseModel, computed_field
-from typing import Optional
+from pydantic import BaseModel, Field, computed_field
+from typing import List, Optional
 from schemas.book import BookResponse
 from schemas.member import MemberResponse
 
@@ -48,3 +48,24 @@ class LoanUpdate(BaseModel):
     DueDate: Optional[date] = None
     ReturnDate: Optional[date] = None
 
+
+
+# Pydantic model for checking out one book (dates default to today + the loan period)
+class LoanCheckout(BaseModel):
+    MemberID: int
+    BookID: int
+    LoanDate: Optional[date] = None
+    DueDate: Optional[date] = None
+
+
+# Pydantic model for checking out several books to one member at once
+class LoanBatchCheckout(BaseModel):
+    MemberID: int
+    BookIDs: List[int] = Field(min_length=1, max_length=50)
+    LoanDate: Optional[date] = None
+    DueDate: Optional[date] = None
+
+
+# Pydantic model for returning a loan (ReturnDate defaults to today)
+class LoanReturn(BaseModel):
+    ReturnDate: Optional[date] = None
@@ -0,0 +1,13 @@
+from typing import Dict
+from pydantic import BaseModel
+
+# Pydantic model for dashboard statistics response
+class StatsResponse(BaseModel):
+    TotalBooks: int
+    AvailableBooks: int
+    TotalAuthors: int
+    TotalMembers: int
+    MembersByStatus: Dict[str, int]  # e.g. {"Member": 40, "Admin": 2}
+    TotalLoans: int
+    ActiveLoans: int
+    OverdueLoans: int
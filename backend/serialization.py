@@ -0,0 +1,187 @@
+"""
+Column-select serialization for the large list responses.
+
+The ORM path loads full objects and validates them against the response
+models with from_attributes. That runs the field validators (the BirthDate
+regexes in schemas/author.py) and the computed fields (schemas/loan.py)
+once per row. Here the list routes instead:
+- select plain columns in one joined query
+- build a dict per row shaped like the response model, with the
+  validators and computed fields applied in Python, once per distinct
+  author, member or book
+- validate the list with a cached TypeAdapter over TypedDicts that carry
+  no Python validators
+- render it with orjson
+
+The JSON is byte-identical to the ORM path. SERIALIZATION_MODE=orm
+switches the list routes back to the ORM path, e.g. to compare the two.
+"""
+import os
+from datetime import date
+from functools import lru_cache
+from typing import Dict, List, Optional
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from typing_extensions import TypedDict
+from models.author import Author
+from models.book import Book
+from models.loan import Loan
+from models.member import Member
+from schemas.author import normalize_birth_date
+
+ROW_SERIALIZATION = os.environ.get("SERIALIZATION_MODE", "rows").lower() != "orm"
+
+
+# Field order matches the response models, so the JSON keys come out in the same order
+
+class AuthorRecord(TypedDict):
+    AuthorID: int
+    LastName: str
+    FirstName: str
+    BirthDate: Optional[str]
+
+
+class BookRecord(TypedDict):
+    BookID: int
+    Title: Optional[str]
+    AuthorID: Optional[int]
+    Isbn: Optional[str]
+    PublicationDate: Optional[date]
+    Genre: Optional[str]
+    Available: Optional[bool]
+    CoverUrl: Optional[str]
+    author: Optional[AuthorRecord]
+
+
+class MemberRecord(TypedDict):
+    MemberID: int
+    LastName: str
+    FirstName: str
+    Address: str
+    Email: str
+    Phone: str
+    BirthDate: date
+    JoinDate: date
+    MembershipStatus: str
+
+
+class LoanRecord(TypedDict):
+    LoanID: int
+    MemberID: int
+    BookID: int
+    LoanDate: date
+    DueDate: date
+    ReturnDate: Optional[date]
+    book: Optional[BookRecord]
+    member: Optional[MemberRecord]
+    BorrowerName: str
+    Returned: bool
+
+
+AUTHOR_COLUMNS = (Author.AuthorID, Author.LastName, Author.FirstName, Author.BirthDate)
+BOOK_COLUMNS = (
+    Book.BookID, Book.Title, Book.AuthorID, Book.Isbn, Book.PublicationDate, Book.Genre, Book.Available,
+    Book.CoverUrl,
+)
+MEMBER_COLUMNS = (
+    Member.MemberID, Member.LastName, Member.FirstName, Member.Address, Member.Email, Member.Phone,
+    Member.BirthDate, Member.JoinDate, Member.MembershipStatus,
+)
+LOAN_COLUMNS = (Loan.LoanID, Loan.MemberID, Loan.BookID, Loan.IssueDate, Loan.DueDate, Loan.ReturnDate)
+
+BOOK_KEYS = tuple(BookRecord.__annotations__)[:len(BOOK_COLUMNS)]
+MEMBER_KEYS = tuple(MemberRecord.__annotations__)
+LOAN_KEYS = tuple(LoanRecord.__annotations__)[:len(LOAN_COLUMNS)]
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(record_type) -> TypeAdapter:
+    return TypeAdapter(List[record_type])
+
+
+def render_records(record_type, records: list) -> bytes:
+    """Validate records against `record_type` and render them as a JSON array"""
+    return orjson.dumps(_list_adapter(record_type).validate_python(records))
+
+
+class _Authors:
+    """Author records by AuthorID, each built (and its BirthDate normalized) once"""
+
+    def __init__(self):
+        self.records: Dict[int, AuthorRecord] = {}
+
+    def get(self, author_id, last_name, first_name, birth_date) -> Optional[AuthorRecord]:
+        if author_id is None:
+            return None
+        record = self.records.get(author_id)
+        if record is None:
+            record = self.records[author_id] = {
+                "AuthorID": author_id,
+                "LastName": last_name,
+                "FirstName": first_name,
+                "BirthDate": normalize_birth_date(birth_date),
+            }
+        return record
+
+
+def book_rows_statement(query):
+    """Turn a select(Book) with its filters, order and limit into a column select joined to the author"""
+    return query.with_only_columns(*BOOK_COLUMNS, *AUTHOR_COLUMNS).outerjoin(
+        Author, Book.AuthorID == Author.AuthorID
+    )
+
+
+def book_records(rows) -> List[BookRecord]:
+    """BookResponse-shaped dicts from the rows of book_rows_statement"""
+    authors = _Authors()
+    split = len(BOOK_COLUMNS)
+    records = []
+    for row in rows:
+        record = dict(zip(BOOK_KEYS, row[:split]))
+        record["author"] = authors.get(*row[split:])
+        records.append(record)
+    return records
+
+
+def loan_rows_statement():
+    """Every loan with its book, the book's author and the member, as one joined column select"""
+    return (
+        select(*LOAN_COLUMNS, *BOOK_COLUMNS, *AUTHOR_COLUMNS, *MEMBER_COLUMNS)
+        .select_from(Loan)
+        .outerjoin(Book, Loan.BookID == Book.BookID)
+        .outerjoin(Author, Book.AuthorID == Author.AuthorID)
+        .outerjoin(Member, Loan.MemberID == Member.MemberID)
+        .order_by(Loan.LoanID)
+    )
+
+
+def loan_records(rows) -> List[LoanRecord]:
+    """LoanResponse-shaped dicts (with BorrowerName and Returned) from the rows of loan_rows_statement"""
+    authors = _Authors()
+    books: Dict[int, BookRecord] = {}
+    members: Dict[int, MemberRecord] = {}
+    book_start = len(LOAN_COLUMNS)
+    author_start = book_start + len(BOOK_COLUMNS)
+    member_start = author_start + len(AUTHOR_COLUMNS)
+    records = []
+    for row in rows:
+        record = dict(zip(LOAN_KEYS, row[:book_start]))
+
+        book_id = row[book_start]
+        book = books.get(book_id)
+        if book is None and book_id is not None:
+            book = books[book_id] = dict(zip(BOOK_KEYS, row[book_start:author_start]))
+            book["author"] = authors.get(*row[author_start:member_start])
+
+        member_id = row[member_start]
+        member = members.get(member_id)
+        if member is None and member_id is not None:
+            member = members[member_id] = dict(zip(MEMBER_KEYS, row[member_start:]))
+
+        record["book"] = book
+        record["member"] = member
+        record["BorrowerName"] = f"{member['FirstName']} {member['LastName']}" if member else ""
+        record["Returned"] = record["ReturnDate"] is not None
+        records.append(record)
+    return records
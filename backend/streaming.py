@@ -0,0 +1,58 @@
+"""
+Helpers for streaming large result sets without materializing them.
+
+Rows are pulled from the database with `yield_per`, encoded one at a time
+and written to the client chunk by chunk, so memory stays flat no matter
+how many rows the query returns.
+"""
+import csv
+import io
+from typing import AsyncIterator, Callable, Iterable, Optional
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from cache import dump_json
+from database.database import AsyncReadSessionLocal
+
+# Rows fetched from the database cursor per round trip
+STREAM_BATCH_SIZE = 500
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+
+
+async def stream_query(
+    statement,
+    encode: Callable[[object], bytes],
+    header: Optional[bytes] = None,
+) -> AsyncIterator[bytes]:
+    """Yield `header` and then `encode(obj)` for every ORM object returned by `statement`.
+
+    The session is opened inside the generator: a StreamingResponse body
+    runs after the route (and its dependencies) have returned.
+    """
+    if header:
+        yield header
+    async with AsyncReadSessionLocal() as db:
+        result = await db.stream_scalars(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for chunk in result.partitions():
+            yield b"".join(encode(obj) for obj in chunk)
+
+
+def csv_line(values: Iterable) -> bytes:
+    """Render one CSV record (None becomes an empty field)"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(["" if value is None else value for value in values])
+    return buffer.getvalue().encode()
+
+
+def wants_ndjson(request: Request, stream: bool = False) -> bool:
+    """True if the client asked for a streamed list via ?stream=1 or Accept: application/x-ndjson"""
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(statement, response_type) -> StreamingResponse:
+    """Stream the objects returned by `statement` as JSON Lines, each validated against `response_type`"""
+    return StreamingResponse(
+        stream_query(statement, lambda obj: dump_json(response_type, obj) + b"\n"),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
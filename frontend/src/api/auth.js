@@ -57,8 +57,15 @@ export function setToken(token, username, role) {
     localStorage.setItem('role', role);
 }
 
-// Remove token (logout)
+// Remove token (logout); the server is told to revoke it, without waiting for the answer
 export function removeToken() {
+    const token = getToken();
+    if (token) {
+        fetch(`${API_URL}/logout`, {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${token}` },
+        }).catch(() => {});
+    }
     localStorage.removeItem('access_token');
     localStorage.removeItem('username');
     localStorage.removeItem('role');
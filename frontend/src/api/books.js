@@ -34,6 +34,17 @@ export async function fetchBookById(id) {
 }
 
 
+// Full-text search over title, genre, ISBN and author name (ranked, prefix matching)
+export async function searchBooks(query, limit = 20) {
+    const params = new URLSearchParams({ q: query, limit: String(limit) });
+    const response = await fetch(`${API_URL}/search?${params}`);
+    if (!response.ok) {
+        throw new Error('Failed to search books');
+    }
+    return response.json();
+}
+
+
 // Create a new book
 export async function createBook(book) {
     console.log('Creating book:', book);
@@ -78,3 +89,9 @@ export async function deleteBook(id) {
     return response.json();
 }
 
+
+
+// URL of a book's cover thumbnail served by the backend ("small", "medium" or "large")
+export function bookCoverUrl(bookId, size = 'medium') {
+    return `${API_URL}/books/${bookId}/cover?size=${size}`;
+}
@@ -77,3 +77,70 @@ export async function deleteLoan(id) {
     return response.json();
 }
 
+
+// Check out a book (marks it unavailable); dates default to today + loan period
+export async function checkoutLoan(memberId, bookId, dueDate = null) {
+    const response = await fetch(`${API_URL}/loans/checkout`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ MemberID: memberId, BookID: bookId, DueDate: dueDate }),
+    });
+    if (!response.ok) {
+        throw new Error(`Failed to check out book: ${response.status}`);
+    }
+    return response.json();
+}
+
+
+// Check out several books to one member at once (all or none)
+export async function checkoutBooks(memberId, bookIds, dueDate = null) {
+    const response = await fetch(`${API_URL}/loans/checkout/batch`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ MemberID: memberId, BookIDs: bookIds, DueDate: dueDate }),
+    });
+    if (!response.ok) {
+        throw new Error(`Failed to check out books: ${response.status}`);
+    }
+    return response.json();
+}
+
+
+// Return a loan (makes the book available again)
+export async function returnLoan(id) {
+    const response = await fetch(`${API_URL}/loans/${id}/return`, {
+        method: 'POST',
+    });
+    if (!response.ok) {
+        throw new Error(`Failed to return loan: ${response.status}`);
+    }
+    return response.json();
+}
+
+
+// Fetch one page of a member's or a book's loans, newest first
+// (status: "active", "returned" or "overdue"; pass the returned nextCursor to get the next page)
+async function fetchLoanHistory(path, { status = null, cursor = null, limit = 50 } = {}) {
+    const params = new URLSearchParams({ limit });
+    if (status) params.set('status', status);
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`${API_URL}/${path}/loans?${params}`);
+    if (!response.ok) {
+        throw new Error(`Failed to fetch loan history: ${response.status}`);
+    }
+    return { loans: await response.json(), nextCursor: response.headers.get('X-Next-Cursor') };
+}
+
+
+export function fetchMemberLoans(memberId, options) {
+    return fetchLoanHistory(`members/${memberId}`, options);
+}
+
+
+export function fetchBookLoans(bookId, options) {
+    return fetchLoanHistory(`books/${bookId}`, options);
+}
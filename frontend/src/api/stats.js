@@ -0,0 +1,10 @@
+const API_URL = import.meta.env.VITE_API_URL;
+
+// Fetch aggregated dashboard statistics (counts only, no rows)
+export async function fetchStats() {
+    const response = await fetch(`${API_URL}/stats`);
+    if (!response.ok) {
+        throw new Error(`Failed to fetch stats: ${response.status}`);
+    }
+    return response.json();
+}
@@ -1,19 +1,15 @@
 import React from "react";
 import { Edit, Trash2, CheckCircle2, XCircle } from "lucide-react";
-import { deleteBook } from "../../api/books";
+import { bookCoverUrl, deleteBook } from "../../api/books";
 
 // BookList component to display a list of books
 export default function BookList({ books, onBookDeleted, onBookUpdate }) {
     const normalizeIsbn = (isbn) => isbn.replace(/[^0-9X]/gi, "").toUpperCase();
 
-    const getOpenLibraryCover = (isbn) => {
-        const normalized = normalizeIsbn(isbn || "");
-        if (!normalized) return "";
-        return `https://covers.openlibrary.org/b/isbn/${normalized}-S.jpg?default=false`;
-    };
-
+    // Thumbnails come from the backend cover cache (CoverUrl or Open Library by ISBN)
     const getCoverUrl = (book) => {
-        return book.CoverUrl || getOpenLibraryCover(book.Isbn);
+        if (!book.CoverUrl && !normalizeIsbn(book.Isbn || "")) return "";
+        return bookCoverUrl(book.BookID, "small");
     };
 
     // Handle book deletion
@@ -85,6 +81,7 @@ export default function BookList({ books, onBookDeleted, onBookUpdate }) {
                                     {getCoverUrl(book) ? (
                                         <img
                                             src={getCoverUrl(book)}
+                                            loading="lazy"
                                             alt={`Cover for ${book.Title || "book"}`}
                                             className="h-12 w-9 rounded object-cover border border-gray-200 dark:border-slate-600"
                                             onError={(event) => {
@@ -1,13 +1,7 @@
 import React from "react";
-import { fetchBooks } from "../api/books";
+import { bookCoverUrl, fetchBooks } from "../api/books";
 
-const normalizeIsbn = (isbn) => (isbn || "").replace(/[^0-9X]/gi, "").toUpperCase();
-
-const getOpenLibraryCover = (isbn) => {
-    const normalized = normalizeIsbn(isbn);
-    if (!normalized) return "";
-    return `https://covers.openlibrary.org/b/isbn/${normalized}-L.jpg?default=false`;
-};
+const hasCoverSource = (book) => Boolean(book.CoverUrl || (book.Isbn || "").replace(/[^0-9X]/gi, ""));
 
 export default function BuecherPage() {
     const [books, setBooks] = React.useState([]);
@@ -50,7 +44,7 @@ export default function BuecherPage() {
             {!loading && !error && (
                 <div className="mt-10 grid gap-6 sm:grid-cols-2 md:grid-cols-3 lg:grid-cols-4">
                     {books.map((book) => {
-                        const coverUrl = book.CoverUrl || getOpenLibraryCover(book.Isbn);
+                        const coverUrl = hasCoverSource(book) ? bookCoverUrl(book.BookID, "medium") : "";
                         return (
                             <article
                                 key={book.BookID}
@@ -60,6 +54,8 @@ export default function BuecherPage() {
                                     {coverUrl ? (
                                         <img
                                             src={coverUrl}
+                                            srcSet={`${coverUrl} 1x, ${bookCoverUrl(book.BookID, "large")} 2x`}
+                                            loading="lazy"
                                             alt={`Cover von ${book.Title || "Buch"}`}
                                             className="h-full w-full object-contain"
                                             onError={(event) => {
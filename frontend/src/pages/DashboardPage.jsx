@@ -1,9 +1,6 @@
 import React from "react";
 import { BookOpen, Users, FileText, Library } from "lucide-react";
-import { fetchBooks } from "../api/books";
-import { fetchAuthors } from "../api/authors";
-import { fetchMembers } from "../api/members";
-import { fetchLoans } from "../api/loans";
+import { fetchStats } from "../api/stats";
 
 // Basic Card component
 function Card({ children, className = "" }) {
@@ -23,17 +20,12 @@ export default function DashboardPage() {
     async function loadCounts() {
       try {
         setLoading(true);
-        const [books, authors, members, loans] = await Promise.all([
-          fetchBooks(),
-          fetchAuthors(),
-          fetchMembers(),
-          fetchLoans()
-        ]);
-        
-        setBooksCount(books.length);
-        setAuthorsCount(authors.length);
-        setMembersCount(members.length);
-        setLoansCount(loans.length);
+        const stats = await fetchStats();
+
+        setBooksCount(stats.TotalBooks);
+        setAuthorsCount(stats.TotalAuthors);
+        setMembersCount(stats.TotalMembers);
+        setLoansCount(stats.TotalLoans);
         setError(null);
       } catch (err) {
         console.error('Error loading dashboard data:', err);